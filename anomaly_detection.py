@@ -1,42 +1,38 @@
-from elasticsearch import Elasticsearch
 import numpy as np
+import instrumentation
+from baseline_store import load_baselines
+from index_partitioning import range_query, search_target
+from storage_backend import get_backend
 
-es = Elasticsearch(["http://localhost:9200"])
-
-def calculate_baselines():
-    query = {
-        "size": 0,
-        "aggs": {
-            "job_types": {
-                "terms": {"field": "job_type"},
-                "aggs": {
-                    "configs": {
-                        "terms": {"field": "system_config"},
-                        "aggs": {
-                            "runtime_stats": {"extended_stats": {"field": "runtime_minutes"}},
-                            "cpu_stats": {"extended_stats": {"field": "cpu_usage_percent"}},
-                            "memory_stats": {"extended_stats": {"field": "memory_usage_percent"}}
-                        }
-                    }
-                }
-            }
-        }
+@instrumentation.timed("aggregate.baselines")
+def calculate_baselines(backend=None, start=None, end=None):
+    backend = backend or get_backend()
+    
+    # Only partitions overlapping the window are searched
+    index = search_target(backend, "historical_performance", start, end)
+    if index is None:
+        return {}
+    
+    aggs = {
+        "runtime_stats": {"extended_stats": {"field": "runtime_minutes"}},
+        "cpu_stats": {"extended_stats": {"field": "cpu_usage_percent"}},
+        "memory_stats": {"extended_stats": {"field": "memory_usage_percent"}}
     }
     
-    results = es.search(index="historical_performance", body=query)
+    # Composite paging returns every (job_type, system_config) group, not just the top 10 terms
     baselines = {}
-    
-    for job_type in results["aggregations"]["job_types"]["buckets"]:
-        for config in job_type["configs"]["buckets"]:
-            key = (job_type["key"], config["key"])
-            baselines[key] = {
-                "runtime": (config["runtime_stats"]["avg"], config["runtime_stats"]["std_deviation"]),
-                "cpu_usage": (config["cpu_stats"]["avg"], config["cpu_stats"]["std_deviation"]),
-                "memory_usage": (config["memory_stats"]["avg"], config["memory_stats"]["std_deviation"])
-            }
+    for bucket in backend.aggregate(index, ["job_type", "system_config"], aggs=aggs,
+                                    query=range_query("timestamp", start, end)):
+        key = (bucket["key"]["job_type"], bucket["key"]["system_config"])
+        baselines[key] = {
+            "runtime": (bucket["runtime_stats"]["avg"], bucket["runtime_stats"]["std_deviation"]),
+            "cpu_usage": (bucket["cpu_stats"]["avg"], bucket["cpu_stats"]["std_deviation"]),
+            "memory_usage": (bucket["memory_stats"]["avg"], bucket["memory_stats"]["std_deviation"])
+        }
     
     return baselines
 
+@instrumentation.timed("score.record")
 def detect_anomaly(job, baselines, threshold=3):
     key = (job["job_type"], job["system_config"])
     if key not in baselines:
@@ -58,18 +54,111 @@ def detect_anomaly(job, baselines, threshold=3):
     
     return is_anomaly, details
 
-# Usage
-baselines = calculate_baselines()
-
-# Example job run
-new_job = {
-    "job_type": "ETL",
-    "system_config": "Standard",
-    "runtime_minutes": 100,
-    "cpu_usage_percent": 80,
-    "memory_usage_percent": 70
-}
-
-is_anomaly, details = detect_anomaly(new_job, baselines)
-print(f"Anomaly detected: {is_anomaly}")
-print(f"Details: {details}")
\ No newline at end of file
+# Metrics scored by the batch detector, in the same order as detect_anomaly
+METRICS = ["runtime", "cpu_usage", "memory_usage"]
+METRIC_FIELDS = [f"{metric}_minutes" if metric == "runtime" else f"{metric}_percent" for metric in METRICS]
+NO_BASELINE_DETAILS = "No baseline for this job type and system configuration"
+
+def build_baseline_index(baselines):
+    # Integer-code every (job_type, system_config) key so lookups become array indexing
+    keys = list(baselines.keys())
+    means = np.zeros((len(keys), len(METRICS)))
+    stds = np.zeros((len(keys), len(METRICS)))
+    for code, key in enumerate(keys):
+        for m, metric in enumerate(METRICS):
+            means[code, m], stds[code, m] = baselines[key][metric]
+
+    return {
+        "keys": keys,
+        "codes": {key: code for code, key in enumerate(keys)},
+        "means": means,
+        "stds": stds
+    }
+
+def encode_baseline_keys(job_types, system_configs, baseline_index):
+    # Factorize both key columns, then resolve the (few) distinct pairs through the code table
+    job_type_values, job_type_codes = np.unique(np.asarray(job_types), return_inverse=True)
+    config_values, config_codes = np.unique(np.asarray(system_configs), return_inverse=True)
+
+    lookup = np.full((len(job_type_values), len(config_values)), -1, dtype=np.int64)
+    for i, job_type in enumerate(job_type_values):
+        for j, config in enumerate(config_values):
+            lookup[i, j] = baseline_index["codes"].get((str(job_type), str(config)), -1)
+
+    return lookup[job_type_codes.ravel(), config_codes.ravel()]
+
+def jobs_to_block(jobs):
+    # Convert a list of job dicts into the columnar block accepted by detect_anomalies_batch
+    block = {
+        "job_type": np.array([job["job_type"] for job in jobs]),
+        "system_config": np.array([job["system_config"] for job in jobs])
+    }
+    for field in METRIC_FIELDS:
+        block[field] = np.array([job[field] for job in jobs], dtype=float)
+    return block
+
+@instrumentation.timed("score.batch")
+def detect_anomalies_batch(block, baselines, threshold=3, baseline_index=None):
+    # block is a dict of equal-length arrays or a record array with job_type, system_config
+    # and the metric fields; results match detect_anomaly row by row
+    if baseline_index is None:
+        baseline_index = build_baseline_index(baselines)
+
+    codes = encode_baseline_keys(block["job_type"], block["system_config"], baseline_index)
+    has_baseline = codes >= 0
+    safe_codes = np.where(has_baseline, codes, 0)
+
+    values = np.column_stack([np.asarray(block[field], dtype=float) for field in METRIC_FIELDS])
+    if len(baseline_index["keys"]) > 0:
+        means = baseline_index["means"][safe_codes]
+        stds = baseline_index["stds"][safe_codes]
+    else:
+        means = np.zeros_like(values)
+        stds = np.zeros_like(values)
+
+    usable = (stds > 0) & has_baseline[:, None]
+    z_scores = np.zeros_like(values)
+    np.divide(values - means, stds, out=z_scores, where=usable)
+
+    flags = np.abs(z_scores) > threshold
+    instrumentation.count("score.rows", len(codes))
+
+    return {
+        "z_scores": z_scores,
+        "flags": flags,
+        "is_anomaly": flags.any(axis=1),
+        "has_baseline": has_baseline
+    }
+
+def batch_details(result):
+    # Expand batch results into the detect_anomaly details strings, formatting flagged rows only
+    details = np.full(len(result["is_anomaly"]), "No anomalies detected", dtype=object)
+    details[~result["has_baseline"]] = NO_BASELINE_DETAILS
+
+    labels = [metric.replace('_', ' ').title() for metric in METRICS]
+    for row in np.flatnonzero(result["is_anomaly"]):
+        details[row] = ", ".join(
+            f"{labels[m]} (Z-score: {result['z_scores'][row, m]:.2f})"
+            for m in np.flatnonzero(result["flags"][row])
+        )
+
+    return details.tolist()
+
+if __name__ == "__main__":
+    # Usage
+    # Cached baselines are refreshed with new historical_performance documents only;
+    # calculate_baselines() still recomputes them from the full index
+    baselines = load_baselines(get_backend())
+
+    # Example job run
+    new_job = {
+        "job_type": "ETL",
+        "system_config": "Standard",
+        "runtime_minutes": 100,
+        "cpu_usage_percent": 80,
+        "memory_usage_percent": 70
+    }
+
+    is_anomaly, details = detect_anomaly(new_job, baselines)
+    print(f"Anomaly detected: {is_anomaly}")
+    print(f"Details: {details}")
@@ -0,0 +1,312 @@
+import asyncio
+import json
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+import instrumentation
+from anomaly_detection import METRIC_FIELDS, batch_details, build_baseline_index, detect_anomalies_batch, jobs_to_block
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Rows scored per detect_anomalies_batch call, and how long the first request of a batch
+# may wait for company; under load batches fill without waiting at all
+DEFAULT_MAX_BATCH = 1024
+DEFAULT_MAX_WAIT_MS = 1.0
+DEFAULT_REFRESH_SECONDS = 60
+DEFAULT_P99_TARGET_MS = 10.0
+# Request latencies kept for percentile reporting
+LATENCY_WINDOW = 10000
+# Largest accepted request body
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+KEY_FIELDS = ["job_type", "system_config"]
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+               500: "Internal Server Error"}
+
+def job_errors(job):
+    # Problems that would make jobs_to_block fail; checked per request so one bad job is
+    # rejected on its own instead of failing the micro-batch it lands in
+    if not isinstance(job, dict):
+        return ["not an object"]
+    errors = [f"{field} must be a string" for field in KEY_FIELDS if not isinstance(job.get(field), str)]
+    for field in METRIC_FIELDS:
+        value = job.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            errors.append(f"{field} must be a finite number")
+    return errors
+
+class LatencyTracker:
+    def __init__(self, size=LATENCY_WINDOW):
+        self.latencies = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds):
+        self.latencies.append(seconds)
+        self.count += 1
+        instrumentation.observe("service.request", seconds)
+
+    def percentiles(self):
+        if not self.latencies:
+            return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+        values = np.fromiter(self.latencies, dtype=float, count=len(self.latencies)) * 1000
+        p50, p99 = np.percentile(values, [50, 99])
+        return {"p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3), "max_ms": round(float(values.max()), 3)}
+
+class AnomalyService:
+    # Scores job runs against in-memory baselines. Pass baselines (the calculate_baselines
+    # dict) to run without Elasticsearch, or a BaselineStore plus backend to have the store
+    # refreshed incrementally in the background.
+    def __init__(self, baselines=None, store=None, backend=None, threshold=3, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, refresh_seconds=DEFAULT_REFRESH_SECONDS,
+                 p99_target_ms=DEFAULT_P99_TARGET_MS):
+        self.store = store
+        self.backend = backend
+        self.threshold = threshold
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.refresh_seconds = refresh_seconds
+        self.p99_target_ms = p99_target_ms
+        self.latency = LatencyTracker()
+        self.batches = 0
+        self.rows_scored = 0
+        self.refreshed_at = None
+        self.refresh_error = None
+        self.queue = None
+        self.tasks = []
+        self.set_baselines(baselines if baselines is not None else (store.baselines() if store else {}))
+
+    def set_baselines(self, baselines):
+        # Swapped as one tuple so a batch never sees baselines and index from different refreshes
+        self.current = (baselines, build_baseline_index(baselines))
+
+    def refresh(self):
+        # Blocking; run in an executor. Only documents past the store's high-water mark are read.
+        new_docs = self.store.refresh(self.backend)
+        if new_docs:
+            self.store.save()
+            self.set_baselines(self.store.baselines())
+        self.refreshed_at = time.time()
+        return new_docs
+
+    async def refresh_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await loop.run_in_executor(None, self.refresh)
+                self.refresh_error = None
+            except Exception as error:
+                # Keep serving the last good baselines
+                self.refresh_error = repr(error)
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.tasks.append(asyncio.create_task(self.batch_loop()))
+        if self.store is not None and self.backend is not None:
+            self.tasks.append(asyncio.create_task(self.refresh_loop()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def score(self, jobs):
+        # Queue jobs for the next micro-batch and wait for their results
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((jobs, future))
+        return await future
+
+    async def next_batch(self):
+        # Block for the first request, then take whatever else is queued, waiting at most
+        # max_wait for more while the batch is below max_batch
+        batch = [await self.queue.get()]
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    async def batch_loop(self):
+        while True:
+            batch = await self.next_batch()
+            try:
+                results = self.score_now([job for jobs, _ in batch for job in jobs])
+            except Exception:
+                # Score the requests one by one so a single bad one only fails itself
+                for jobs, future in batch:
+                    if future.done():
+                        continue
+                    try:
+                        future.set_result(self.score_now(jobs))
+                    except Exception as error:
+                        future.set_exception(error)
+                continue
+
+            start = 0
+            for jobs, future in batch:
+                if not future.done():
+                    future.set_result(results[start:start + len(jobs)])
+                start += len(jobs)
+
+    def score_now(self, jobs):
+        # One vectorized pass; details strings match detect_anomaly row by row
+        baselines, baseline_index = self.current
+        result = detect_anomalies_batch(jobs_to_block(jobs), baselines, self.threshold, baseline_index)
+        details = batch_details(result)
+        self.batches += 1
+        self.rows_scored += len(jobs)
+
+        is_anomaly = result["is_anomaly"].tolist()
+        z_scores = result["z_scores"].round(4).tolist()
+        return [
+            {
+                "job_id": job.get("job_id"),
+                "is_anomaly": is_anomaly[row],
+                "details": details[row],
+                "z_scores": dict(zip(METRIC_FIELDS, z_scores[row]))
+            }
+            for row, job in enumerate(jobs)
+        ]
+
+    def stats(self):
+        stats = {
+            "requests": self.latency.count,
+            "batches": self.batches,
+            "rows_scored": self.rows_scored,
+            "mean_batch_rows": round(self.rows_scored / self.batches, 2) if self.batches else None,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "baseline_keys": len(self.current[0]),
+            "refreshed_at": self.refreshed_at,
+            "refresh_error": self.refresh_error,
+            "p99_target_ms": self.p99_target_ms
+        }
+        stats.update(self.latency.percentiles())
+        stats["within_target"] = stats["p99_ms"] is None or stats["p99_ms"] <= self.p99_target_ms
+        return stats
+
+    async def handle_request(self, method, path, body):
+        # Returns (status, payload)
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, self.stats()
+        if path == "/refresh":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            if self.store is None or self.backend is None:
+                return 400, {"error": "service was started with static baselines"}
+            new_docs = await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+            return 200, {"new_docs": new_docs}
+        if path != "/score":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        # A single job object, a list of jobs, or {"jobs": [...]}
+        try:
+            payload = json.loads(body)
+        except ValueError as error:
+            return 400, {"error": f"invalid JSON: {error}"}
+        single = isinstance(payload, dict) and "jobs" not in payload
+        jobs = [payload] if single else payload["jobs"] if isinstance(payload, dict) else payload
+        if not isinstance(jobs, list) or not jobs:
+            return 400, {"error": "expected a job, a list of jobs or {\"jobs\": [...]}"}
+        for position, job in enumerate(jobs):
+            errors = job_errors(job)
+            if errors:
+                return 400, {"error": f"job {position}: {', '.join(errors)}"}
+
+        results = await self.score(jobs)
+        return 200, results[0] if single else {"results": results}
+
+    async def handle_connection(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: request line, headers, Content-Length body
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                started = time.perf_counter()
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    status, payload = 413, {"error": f"body larger than {MAX_BODY_BYTES} bytes"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    try:
+                        status, payload = await self.handle_request(method, path.split("?", 1)[0], body)
+                    except Exception as error:
+                        # Answer instead of dropping the connection without a response
+                        status, payload = 500, {"error": repr(error)}
+                    keep_alive = headers.get("connection", "").lower() != "close"
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if path.startswith("/score"):
+                    self.latency.record(time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutdown; close quietly instead of logging every idle connection
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        # TCP on host:port, or a Unix domain socket when path is given
+        await self.start()
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+if __name__ == "__main__":
+    from baseline_store import BaselineStore
+    from storage_backend import get_backend
+
+    store = BaselineStore.load()
+    backend = get_backend()
+    store.refresh(backend)
+    store.save()
+
+    service = AnomalyService(store=store, backend=backend)
+    print(f"Scoring job runs on http://{DEFAULT_HOST}:{DEFAULT_PORT}/score")
+    asyncio.run(service.serve())
@@ -0,0 +1,125 @@
+import json
+import math
+import os
+
+from incremental_refresh import next_window
+
+# Default location of the on-disk baseline cache
+DEFAULT_BASELINE_PATH = "baselines_cache.json"
+
+# Baseline metric name -> field in historical_performance
+BASELINE_METRICS = {
+    "runtime": "runtime_minutes",
+    "cpu_usage": "cpu_usage_percent",
+    "memory_usage": "memory_usage_percent"
+}
+
+def merge_moments(a, b):
+    # Chan et al. parallel update of (count, mean, M2) triples
+    count_a, mean_a, m2_a = a
+    count_b, mean_b, m2_b = b
+    count = count_a + count_b
+    if count == 0:
+        return 0, 0.0, 0.0
+
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+    return count, mean, m2
+
+class BaselineStore:
+    def __init__(self, path=DEFAULT_BASELINE_PATH):
+        self.path = path
+        # (job_type, system_config) -> {metric: (count, mean, M2)}
+        self.moments = {}
+        # Latest historical_performance timestamp (epoch millis) folded into the store, and
+        # the _ids of the documents at exactly that timestamp (see next_window)
+        self.high_water_mark = None
+        self.boundary_ids = []
+
+    @classmethod
+    def load(cls, path=DEFAULT_BASELINE_PATH):
+        store = cls(path)
+        if not os.path.exists(path):
+            return store
+
+        with open(path) as f:
+            data = json.load(f)
+
+        store.high_water_mark = data["high_water_mark"]
+        store.boundary_ids = data.get("boundary_ids", [])
+        for group in data["groups"]:
+            key = (group["job_type"], group["system_config"])
+            store.moments[key] = {
+                metric: (stats["count"], stats["mean"], stats["m2"])
+                for metric, stats in group["metrics"].items()
+            }
+        return store
+
+    def save(self):
+        data = {
+            "high_water_mark": self.high_water_mark,
+            "boundary_ids": self.boundary_ids,
+            "groups": [
+                {
+                    "job_type": job_type,
+                    "system_config": system_config,
+                    "metrics": {
+                        metric: {"count": count, "mean": mean, "m2": m2}
+                        for metric, (count, mean, m2) in metrics.items()
+                    }
+                }
+                for (job_type, system_config), metrics in self.moments.items()
+            ]
+        }
+
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def merge(self, key, metric, count, mean, m2):
+        metrics = self.moments.setdefault(key, {})
+        metrics[metric] = merge_moments(metrics.get(metric, (0, 0.0, 0.0)), (count, mean, m2))
+
+    def refresh(self, backend, index="historical_performance"):
+        # Aggregate only documents not folded in yet (see next_window) and merge them into the store
+        window = next_window(backend, index, self.high_water_mark, self.boundary_ids)
+        if window is None:
+            return 0
+
+        aggs = {f"{metric}_stats": {"extended_stats": {"field": field}} for metric, field in BASELINE_METRICS.items()}
+
+        new_docs = 0
+        for bucket in backend.aggregate(window["target"], ["job_type", "system_config"], aggs=aggs,
+                                        query=window["query"]):
+            key = (bucket["key"]["job_type"], bucket["key"]["system_config"])
+            for metric in BASELINE_METRICS:
+                stats = bucket[f"{metric}_stats"]
+                if stats["count"] == 0:
+                    continue
+                # extended_stats reports the population variance, so M2 = variance * count
+                self.merge(key, metric, stats["count"], stats["avg"], stats["variance"] * stats["count"])
+            new_docs += bucket["doc_count"]
+
+        self.high_water_mark, self.boundary_ids = window["mark"], window["boundary_ids"]
+        return new_docs
+
+    def baselines(self):
+        # Same shape as calculate_baselines: {key: {metric: (mean, std_deviation)}}
+        return {
+            key: {
+                metric: (mean, math.sqrt(m2 / count) if count > 0 else 0.0)
+                for metric, (count, mean, m2) in metrics.items()
+            }
+            for key, metrics in self.moments.items()
+        }
+
+def load_baselines(backend, path=DEFAULT_BASELINE_PATH, refresh=True):
+    # Load cached baselines and, optionally, fold in anything indexed since the last refresh
+    store = BaselineStore.load(path)
+    if refresh:
+        if store.refresh(backend) > 0 or not os.path.exists(path):
+            store.save()
+    return store.baselines()
@@ -0,0 +1,251 @@
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+import numpy as np
+
+import anomaly_detection as detector
+from ingestion import ingest
+from sharded_generation import seed_generators
+from storage_backend import ColumnarBackend
+
+# Dataset sizes every benchmark is run at, smallest first
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000, 10000000)
+DEFAULT_SEED = 0
+# A size is skipped when extrapolating from the previous size says it would take longer than this
+DEFAULT_MAX_SECONDS = 120
+DEFAULT_RESULTS_PATH = "benchmark_results.json"
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+# Relative slowdown against the baseline run that counts as a regression
+DEFAULT_TOLERANCE = 0.10
+# Distinct documents kept in memory for ingestion and scoring; larger runs cycle through them
+POOL_SIZE = 100000
+# Timed repetitions for latency benchmarks; the median is reported
+LATENCY_REPEATS = 3
+# Fixed anchor so generated timestamps do not depend on when the suite runs
+ANCHOR_DATE = datetime(2024, 1, 1)
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def throughput(records, seconds, **extra):
+    return dict({
+        "records": records,
+        "seconds": round(seconds, 4),
+        "records_per_second": round(records / seconds, 1) if seconds > 0 else None
+    }, **extra)
+
+def consume(records, size):
+    count = 0
+    for _ in islice(records, size):
+        count += 1
+    return count
+
+def performance_pool(size, seed):
+    # Seeded historical_performance documents shared by the ingestion and detection benchmarks
+    import historical_performance_data_generator as module
+
+    seed_generators(seed, module)
+    days = max(1, size // 50)
+    return list(islice(module.generate_performance_data(ANCHOR_DATE, ANCHOR_DATE + timedelta(days=days)), size))
+
+def cycle(pool, size):
+    for i in range(size):
+        yield pool[i % len(pool)]
+
+# Generators: records per second from the public generate_* functions
+
+def bench_generate_job_runs(size, seed):
+    import job_run_data_generator as module
+
+    seed_generators(seed, module)
+    count, seconds = timed(consume, module.generate_job_runs(size, ANCHOR_DATE), size)
+    return throughput(count, seconds)
+
+def bench_generate_performance_data(size, seed):
+    import historical_performance_data_generator as module
+
+    seed_generators(seed, module)
+    # 50-100 records per day; the range is long enough for any size and cut off at size
+    end = ANCHOR_DATE + timedelta(days=size // 50 + 1)
+    count, seconds = timed(consume, module.generate_performance_data(ANCHOR_DATE, end), size)
+    return throughput(count, seconds)
+
+def bench_generate_system_metrics(size, seed):
+    import system_metrics_generator as module
+
+    seed_generators(seed, module)
+    end = ANCHOR_DATE + timedelta(seconds=(size - 1) * module.DEFAULT_RESOLUTION_SECONDS)
+    count, seconds = timed(consume, module.generate_system_metrics(ANCHOR_DATE, end), size)
+    return throughput(count, seconds)
+
+def bench_generate_compliant_job_runs(size, seed):
+    import compliance_policies_generator as module
+
+    seed_generators(seed, module)
+    count, seconds = timed(consume, module.generate_compliant_job_runs(size, ANCHOR_DATE), size)
+    return throughput(count, seconds)
+
+# Ingestion: bulk path into a fresh in-process backend, so only client-side costs are measured
+
+def bench_ingest(size, seed):
+    pool = performance_pool(min(size, POOL_SIZE), seed)
+    backend = ColumnarBackend()
+    backend.create_index("historical_performance")
+    actions = ({"_index": "historical_performance", "_source": doc} for doc in cycle(pool, size))
+    stats = ingest(actions, backend)
+    return throughput(stats.success, stats.elapsed, failed=stats.failed, bytes=stats.bytes,
+                      mb_per_second=round(stats.mb_per_second(), 3))
+
+# Aggregation: baseline computation latency over an index of size documents
+
+def populated_backend(size, seed):
+    backend = ColumnarBackend()
+    backend.create_index("historical_performance")
+    pool = performance_pool(min(size, POOL_SIZE), seed)
+    ingest(({"_index": "historical_performance", "_source": doc} for doc in cycle(pool, size)), backend)
+    return backend, pool
+
+def bench_calculate_baselines(size, seed):
+    backend, _ = populated_backend(size, seed)
+    latencies = [timed(detector.calculate_baselines, backend)[1] for _ in range(LATENCY_REPEATS)]
+    latency = statistics.median(latencies)
+    return throughput(size, latency, latency_ms=round(latency * 1000, 3))
+
+# Detection: per-record detect_anomaly against the vectorized batch scorer
+
+def scoring_setup(size, seed):
+    pool = performance_pool(min(size, POOL_SIZE), seed)
+    backend = ColumnarBackend()
+    backend.create_index("historical_performance")
+    ingest(({"_index": "historical_performance", "_source": doc} for doc in pool), backend)
+    return detector.calculate_baselines(backend), pool
+
+def bench_detect_anomaly(size, seed):
+    baselines, pool = scoring_setup(size, seed)
+
+    def score():
+        flagged = 0
+        for job in cycle(pool, size):
+            flagged += detector.detect_anomaly(job, baselines)[0]
+        return flagged
+
+    flagged, seconds = timed(score)
+    return throughput(size, seconds, flagged=flagged)
+
+def bench_detect_anomalies_batch(size, seed):
+    baselines, pool = scoring_setup(size, seed)
+    pool_block = detector.jobs_to_block(pool)
+    rows = np.arange(size) % len(pool)
+    block = {field: column[rows] for field, column in pool_block.items()}
+    baseline_index = detector.build_baseline_index(baselines)
+
+    result, seconds = timed(detector.detect_anomalies_batch, block, baselines, baseline_index=baseline_index)
+    return throughput(size, seconds, flagged=int(result["is_anomaly"].sum()))
+
+BENCHMARKS = {
+    "generate_job_runs": bench_generate_job_runs,
+    "generate_performance_data": bench_generate_performance_data,
+    "generate_system_metrics": bench_generate_system_metrics,
+    "generate_compliant_job_runs": bench_generate_compliant_job_runs,
+    "ingest": bench_ingest,
+    "calculate_baselines": bench_calculate_baselines,
+    "detect_anomaly": bench_detect_anomaly,
+    "detect_anomalies_batch": bench_detect_anomalies_batch
+}
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+def run_suite(sizes=DEFAULT_SIZES, seed=DEFAULT_SEED, benchmarks=None, max_seconds=DEFAULT_MAX_SECONDS):
+    # {"meta": ..., "results": {benchmark: {size: metrics}}}; sizes are JSON keys, so strings
+    results = {}
+    for name in benchmarks or BENCHMARKS:
+        results[name] = {}
+        previous = None
+        for size in sorted(sizes):
+            # Extrapolate from the wall time of the previous size, setup included
+            if previous is not None:
+                estimate = previous[1] * size / previous[0]
+                if estimate > max_seconds:
+                    results[name][str(size)] = {"skipped": f"estimated {estimate:.0f}s exceeds {max_seconds}s"}
+                    continue
+            metrics, wall_seconds = timed(BENCHMARKS[name], size, seed)
+            previous = (size, wall_seconds)
+            results[name][str(size)] = metrics
+            print(f"{name} @ {size}: {metrics}")
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "seed": seed,
+            "sizes": sorted(sizes),
+            "environment": environment()
+        },
+        "results": results
+    }
+
+def save_results(results, path=DEFAULT_RESULTS_PATH):
+    # Write to a temporary file first so a crash never leaves a truncated file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def compare_results(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Throughput must not drop, and latency must not grow, by more than tolerance
+    comparisons = []
+    for name, sizes in current["results"].items():
+        for size, metrics in sizes.items():
+            reference = baseline["results"].get(name, {}).get(size)
+            if not reference or "skipped" in metrics or "skipped" in reference:
+                continue
+
+            if "latency_ms" in metrics:
+                metric, ratio = "latency_ms", reference["latency_ms"] / metrics["latency_ms"]
+            else:
+                metric, ratio = "records_per_second", metrics["records_per_second"] / reference["records_per_second"]
+            comparisons.append({
+                "benchmark": name,
+                "size": int(size),
+                "metric": metric,
+                "baseline": reference[metric],
+                "current": metrics[metric],
+                # > 1 is faster than the baseline
+                "speedup": round(ratio, 3),
+                "regression": ratio < 1 - tolerance
+            })
+    return comparisons
+
+def regressions(comparisons):
+    return [comparison for comparison in comparisons if comparison["regression"]]
+
+if __name__ == "__main__":
+    results = run_suite()
+    save_results(results)
+
+    if os.path.exists(DEFAULT_BASELINE_PATH):
+        comparisons = compare_results(results, load_results(DEFAULT_BASELINE_PATH))
+        for comparison in comparisons:
+            marker = "REGRESSION" if comparison["regression"] else "ok"
+            print(f"{marker:>10}  {comparison['benchmark']} @ {comparison['size']}: "
+                  f"{comparison['speedup']}x ({comparison['metric']})")
+        print(f"{len(regressions(comparisons))} regressions out of {len(comparisons)} comparisons")
+    else:
+        save_results(results, DEFAULT_BASELINE_PATH)
+        print(f"No baseline found; saved this run as {DEFAULT_BASELINE_PATH}")
@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+
+from storage_backend import DEFAULT_KEEP_ALIVE, DEFAULT_SCAN_PAGE_SIZE, get_backend
+
+# Parallel readers per export; each reads one slice of the same point-in-time snapshot
+DEFAULT_SLICES = 4
+# Indices the export is sized for; any index name works
+EXPORT_INDICES = ("job_runs", "historical_performance", "system_metrics", "compliant_job_runs")
+
+class ExportStats:
+    def __init__(self, slices):
+        self.docs = 0
+        self.pages = 0
+        self.slice_docs = [0] * slices
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, slice_id, count):
+        with self.lock:
+            self.docs += count
+            self.pages += 1
+            self.slice_docs[slice_id] += count
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def docs_per_second(self):
+        return self.docs / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return {
+            "docs": self.docs,
+            "pages": self.pages,
+            "slice_docs": list(self.slice_docs),
+            "seconds": round(self.elapsed, 3),
+            "docs_per_second": round(self.docs_per_second(), 1)
+        }
+
+def iter_export_batches(index, fields=None, query=None, slices=DEFAULT_SLICES, page_size=DEFAULT_SCAN_PAGE_SIZE,
+                        keep_alive=DEFAULT_KEEP_ALIVE, backend=None, stats=None):
+    # One reader thread per slice feeds a queue of at most 2 * slices pages, so memory stays
+    # constant however large the index is. Batches arrive in no particular order.
+    backend = backend or get_backend()
+    stats = stats or ExportStats(slices)
+    pages = queue.Queue(maxsize=2 * slices)
+    stop = threading.Event()
+    done = object()
+
+    def read_slice(snapshot, slice_id):
+        try:
+            for hits in backend.scan(snapshot, query, fields, slice_id, slices, page_size):
+                if stop.is_set():
+                    return
+                stats.record(slice_id, len(hits))
+                pages.put([hit["_source"] for hit in hits])
+        except Exception as error:
+            pages.put(error)
+        finally:
+            pages.put(done)
+
+    snapshot = backend.open_scan(index, keep_alive)
+    readers = [threading.Thread(target=read_slice, args=(snapshot, slice_id), daemon=True) for slice_id in range(slices)]
+    try:
+        for reader in readers:
+            reader.start()
+
+        running = slices
+        while running:
+            page = pages.get()
+            if page is done:
+                running -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        # Unblock readers stuck on a full queue if the consumer stopped early
+        stop.set()
+        while any(reader.is_alive() for reader in readers):
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        backend.close_scan(snapshot)
+        stats.finish()
+
+def export_index(index, on_batch, fields=None, query=None, slices=DEFAULT_SLICES, page_size=DEFAULT_SCAN_PAGE_SIZE,
+                 keep_alive=DEFAULT_KEEP_ALIVE, backend=None):
+    # Stream every document of index into on_batch(list of _source dicts); the callback runs
+    # on the calling thread, one batch at a time
+    stats = ExportStats(slices)
+    for batch in iter_export_batches(index, fields, query, slices, page_size, keep_alive, backend, stats):
+        on_batch(batch)
+    return stats
+
+def export_index_to_files(index, base_dir, fields=None, query=None, format="parquet", granularity="month",
+                          slices=DEFAULT_SLICES, page_size=DEFAULT_SCAN_PAGE_SIZE, keep_alive=DEFAULT_KEEP_ALIVE,
+                          backend=None):
+    # Write the export as partitioned columnar files typed by the generator's mappings
+    import importlib
+
+    from columnar_export import DATASETS, arrow_schema, records_to_table, write_tables
+
+    spec = DATASETS[index]
+    mappings = getattr(importlib.import_module(spec["module"]), spec["mappings"])
+    if fields is not None:
+        # Partition keys are always fetched so every row lands in a partition
+        fields = list(dict.fromkeys(list(fields) + [spec["date_field"]] + spec["partition_by"]))
+        properties = mappings["mappings"]["properties"]
+        mappings = {"mappings": {"properties": {name: properties[name] for name in fields}}}
+
+    stats = ExportStats(slices)
+    batches = iter_export_batches(index, fields, query, slices, page_size, keep_alive, backend, stats)
+    write_tables((records_to_table(batch, mappings) for batch in batches), base_dir, arrow_schema(mappings),
+                 spec["date_field"], spec["partition_by"], format, granularity)
+    return stats
+
+if __name__ == "__main__":
+    for index in EXPORT_INDICES:
+        stats = export_index_to_files(index, f"exports/{index}")
+        print(f"Exported {index}: {stats.summary()}")
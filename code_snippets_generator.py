@@ -1,15 +1,12 @@
 import random
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import faker
 import uuid
+from ingestion import ingest
+from storage_backend import get_backend
 
 # Initialize Faker for generating realistic data
 fake = faker.Faker()
 
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
-
 # Define job types and their corresponding code snippets
 JOB_TYPES = {
     "ETL": {
@@ -119,7 +116,9 @@ def generate_code_snippet():
 def generate_code_snippets(count=200):
     return [generate_code_snippet() for _ in range(count)]
 
-def index_code_snippets(snippets):
+def index_code_snippets(snippets, backend=None, **ingest_options):
+    backend = backend or get_backend()
+    
     # Create index with appropriate mappings
     index_mappings = {
         "mappings": {
@@ -141,11 +140,11 @@ def index_code_snippets(snippets):
         }
     }
     
-    es.indices.create(index="code_snippets", body=index_mappings, ignore=400)
+    backend.create_index("code_snippets", index_mappings)
     
     # Bulk index the code snippets
-    success, failed = bulk(es, ({"_index": "code_snippets", "_source": snippet} for snippet in snippets))
-    print(f"Indexed {success} code snippets. Failed: {failed}")
+    stats = ingest(({"_index": "code_snippets", "_source": snippet} for snippet in snippets), backend, **ingest_options)
+    print(f"Indexed {stats.success} code snippets. Failed: {stats.failed}")
 
 if __name__ == "__main__":
     snippets = generate_code_snippets(200)
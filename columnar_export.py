@@ -0,0 +1,196 @@
+import importlib
+from itertools import islice
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from sharded_generation import generate_sharded
+
+# Records converted to Arrow per write; bounds memory regardless of dataset size
+DEFAULT_BATCH_SIZE = 100000
+# Partitions one batch may touch: Arrow's default of 1024 is too few for a year of daily
+# partitions times the partition_by values
+MAX_PARTITIONS = 1000000
+# Writers kept open at once; below the usual 1024 file descriptor limit. Streams arrive in
+# date order, so closing the least recently used writer rarely splits a partition
+MAX_OPEN_FILES = 512
+
+# ES field type -> Arrow type; dates are stored as microsecond timestamps
+ES_TO_ARROW = {
+    "keyword": pa.string(),
+    "text": pa.string(),
+    "date": pa.timestamp("us"),
+    "float": pa.float32(),
+    "double": pa.float64(),
+    "integer": pa.int32(),
+    "long": pa.int64(),
+    "boolean": pa.bool_()
+}
+
+# Exportable datasets: generator function, its ES mappings, and how files are partitioned
+DATASETS = {
+    "job_runs": {
+        "module": "job_run_data_generator", "function": "generate_job_runs",
+        "mappings": "JOB_RUNS_MAPPINGS", "date_field": "start_time", "partition_by": []
+    },
+    "historical_performance": {
+        "module": "historical_performance_data_generator", "function": "generate_performance_data",
+        "mappings": "HISTORICAL_PERFORMANCE_MAPPINGS", "date_field": "timestamp", "partition_by": ["job_type"]
+    },
+    "system_metrics": {
+        "module": "system_metrics_generator", "function": "generate_system_metrics",
+        "mappings": "SYSTEM_METRICS_MAPPINGS", "date_field": "timestamp", "partition_by": []
+    },
+    "job_schedules": {
+        "module": "job_schedule_generator", "function": "generate_schedules",
+        "mappings": "JOB_SCHEDULES_MAPPINGS", "date_field": "created_at", "partition_by": []
+    },
+    "compliant_job_runs": {
+        "module": "compliance_policies_generator", "function": "generate_compliant_job_runs",
+        "mappings": "COMPLIANT_JOB_RUNS_MAPPINGS", "date_field": "start_time", "partition_by": ["job_type"]
+    },
+    "user_interactions": {
+        "module": "user_interaction_logs_generator", "function": "generate_sessions",
+        "mappings": "USER_INTERACTIONS_MAPPINGS", "date_field": "start_time", "partition_by": []
+    }
+}
+
+# Export format -> (pyarrow.dataset format, file extension). Uncompressed Arrow IPC files
+# can be memory-mapped and read zero-copy; Parquet is smaller but always decoded.
+FORMATS = {"parquet": ("parquet", "parquet"), "arrow": ("ipc", "arrow")}
+
+def arrow_type(field, as_strings=False):
+    # Objects (properties without a type) become structs, nested fields lists of structs
+    if "properties" in field:
+        struct = pa.struct([
+            (name, arrow_type(child, as_strings)) for name, child in field["properties"].items()
+        ])
+        return pa.list_(struct) if field.get("type") == "nested" else struct
+    if as_strings and field["type"] == "date":
+        return pa.string()
+    return ES_TO_ARROW[field["type"]]
+
+def arrow_schema(mappings, as_strings=False):
+    # Schema matching an index_* mappings body; as_strings keeps dates as the ISO strings
+    # the generators emit, which are then cast to timestamps in one vectorized step
+    properties = mappings["mappings"]["properties"]
+    return pa.schema([(name, arrow_type(field, as_strings)) for name, field in properties.items()])
+
+def dataset_schema(name):
+    spec = DATASETS[name]
+    return arrow_schema(getattr(importlib.import_module(spec["module"]), spec["mappings"]))
+
+def records_to_table(records, mappings):
+    raw = pa.Table.from_pylist(records, schema=arrow_schema(mappings, as_strings=True))
+    return raw.cast(arrow_schema(mappings))
+
+def add_date_column(table, date_field, granularity="month"):
+    # Hive partition key derived from date_field; other partition keys are plain columns
+    date_format = "%Y-%m" if granularity == "month" else "%Y-%m-%d"
+    return table.append_column("date", pc.strftime(table[date_field], format=date_format))
+
+def partitioning(partition_by):
+    return ds.partitioning(pa.schema([("date", pa.string())] + [(name, pa.string()) for name in partition_by]),
+                           flavor="hive")
+
+def iter_record_tables(records, mappings, batch_size=DEFAULT_BATCH_SIZE):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield records_to_table(batch, mappings)
+
+def write_tables(tables, base_dir, schema, date_field, partition_by, format="parquet", granularity="month",
+                 basename="part", max_partitions=MAX_PARTITIONS, max_open_files=MAX_OPEN_FILES):
+    # Stream tables into one hive-partitioned dataset; open files are reused across batches.
+    # Partitions that are written are cleared first, so files from earlier exports don't linger.
+    file_format, extension = FORMATS[format]
+    full_schema = schema.append(pa.field("date", pa.string()))
+
+    def batches():
+        for table in tables:
+            yield from add_date_column(table, date_field, granularity).to_batches()
+
+    ds.write_dataset(
+        batches(),
+        base_dir,
+        schema=full_schema,
+        format=file_format,
+        partitioning=partitioning(partition_by),
+        basename_template=f"{basename}-{{i}}.{extension}",
+        existing_data_behavior="delete_matching",
+        max_partitions=max_partitions,
+        max_open_files=max_open_files
+    )
+
+def system_metrics_tables(start, end, resolution_seconds, hosts=None):
+    # Build Arrow columns straight from the generator's NumPy blocks, skipping dicts entirely
+    from system_metrics_generator import METRICS, SYSTEM_METRICS_MAPPINGS, iter_metric_blocks
+
+    schema = arrow_schema(SYSTEM_METRICS_MAPPINGS)
+    names = [metric["name"] for metric in METRICS]
+    for timestamps, host, values in iter_metric_blocks(start, end, resolution_seconds, hosts):
+        metrics = pa.StructArray.from_arrays([pa.array(values[name], pa.float32()) for name in names], names=names)
+        hosts_column = pa.nulls(len(timestamps), pa.string()) if host is None else pa.array([host] * len(timestamps))
+        yield pa.table({
+            "timestamp": pa.array(timestamps.astype("datetime64[us]")),
+            "host": hosts_column,
+            "metrics": metrics
+        }).select(schema.names).cast(schema)
+
+def export_dataset(name, base_dir, shard_args=((),), format="parquet", granularity="month",
+                   master_seed=None, workers=1, batch_size=DEFAULT_BATCH_SIZE):
+    # Generate a dataset through the sharded generator and write it as partitioned columnar files
+    spec = DATASETS[name]
+    module = importlib.import_module(spec["module"])
+    mappings = getattr(module, spec["mappings"])
+
+    records = generate_sharded(spec["module"], spec["function"], shard_args, master_seed, workers)
+    write_tables(iter_record_tables(records, mappings, batch_size), base_dir, arrow_schema(mappings),
+                 spec["date_field"], spec["partition_by"], format, granularity)
+
+def export_system_metrics(base_dir, start, end, resolution_seconds=300, hosts=None, format="parquet",
+                          granularity="month"):
+    spec = DATASETS["system_metrics"]
+    write_tables(system_metrics_tables(start, end, resolution_seconds, hosts), base_dir, dataset_schema("system_metrics"),
+                 spec["date_field"], spec["partition_by"], format, granularity)
+
+def open_dataset(base_dir, format="parquet"):
+    # Memory-mapped local filesystem: Arrow IPC columns are then read without copying
+    return ds.dataset(base_dir, format=FORMATS[format][0], partitioning="hive",
+                      filesystem=fs.LocalFileSystem(use_mmap=True))
+
+def read_dataset(base_dir, columns=None, filter=None, format="parquet"):
+    return open_dataset(base_dir, format).to_table(columns=columns, filter=filter)
+
+def table_to_block(table, columns=None):
+    # Dict of NumPy arrays (struct fields flattened to "parent.child"), the shape
+    # detect_anomalies_batch and the other vectorized paths take
+    table = table.flatten()
+    while any(pa.types.is_struct(field.type) for field in table.schema):
+        table = table.flatten()
+
+    block = {}
+    for name in columns or table.column_names:
+        column = table[name].combine_chunks()
+        if pa.types.is_timestamp(column.type):
+            block[name] = column.to_numpy(zero_copy_only=False).astype("datetime64[us]")
+        else:
+            block[name] = column.to_numpy(zero_copy_only=False)
+    return block
+
+if __name__ == "__main__":
+    from datetime import datetime, timedelta
+
+    end = datetime.now()
+    export_dataset("historical_performance", "exports/historical_performance",
+                   shard_args=[(end - timedelta(days=365), end)], master_seed=0)
+    export_system_metrics("exports/system_metrics", end - timedelta(days=365), end, format="arrow")
+
+    table = read_dataset("exports/system_metrics", format="arrow")
+    block = table_to_block(table)
+    print(f"Read {table.num_rows} system metric rows; mean cpu {np.mean(block['metrics.cpu_usage']):.2f}")
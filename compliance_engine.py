@@ -0,0 +1,148 @@
+import operator
+
+import numpy as np
+
+# Declarative policy rules, compiled once into predicates over columnar batches:
+#   {"field": "duration_minutes", "op": "<=", "value": 60}
+#   {"field": "job_type", "op": "in", "value": ["Backup", "ETL"]}
+#   {"field": "audit_log", "op": "exists"}
+#   {"all": [rule, ...]}, {"any": [rule, ...]}, {"not": rule}
+#   {"random": 0.5}  (compliant with probability 0.5, for simulated checks)
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge
+}
+
+def records_to_block(records, fields):
+    # Columnar batch of the fields rules read; missing values become None in object columns
+    block = {"size": len(records)}
+    for field in fields:
+        values = [record.get(field) for record in records]
+        if any(value is None for value in values):
+            block[field] = np.array(values, dtype=object)
+        else:
+            block[field] = np.array(values)
+    return block
+
+def present(column):
+    if column.dtype == object:
+        return np.fromiter((value is not None for value in column), dtype=bool, count=len(column))
+    if column.dtype.kind == "f":
+        return ~np.isnan(column)
+    return np.ones(len(column), dtype=bool)
+
+def compare(column, compare_op, value):
+    # Missing values never satisfy a comparison
+    mask = present(column)
+    if mask.all():
+        return np.asarray(compare_op(column, value), dtype=bool)
+    result = np.zeros(len(column), dtype=bool)
+    result[mask] = compare_op(np.array(column[mask].tolist()), value)
+    return result
+
+def rule_fields(rule):
+    if "field" in rule:
+        return {rule["field"]}
+    children = rule["all"] if "all" in rule else rule["any"] if "any" in rule else [rule["not"]] if "not" in rule else []
+    return set().union(*(rule_fields(child) for child in children))
+
+def compile_rule(rule):
+    # Returns predicate(block, rng) -> boolean array with one entry per row
+    if "all" in rule or "any" in rule:
+        is_all = "all" in rule
+        children = [compile_rule(child) for child in (rule["all"] if is_all else rule["any"])]
+        combine = np.logical_and if is_all else np.logical_or
+
+        def combined(block, rng):
+            # An empty all() holds for every row and an empty any() for none, as in Python
+            if not children:
+                return np.full(block["size"], is_all)
+            result = children[0](block, rng)
+            for child in children[1:]:
+                result = combine(result, child(block, rng))
+            return result
+        return combined
+
+    if "not" in rule:
+        child = compile_rule(rule["not"])
+        return lambda block, rng: ~child(block, rng)
+
+    if "random" in rule:
+        probability = rule["random"]
+        return lambda block, rng: rng.random(block["size"]) < probability
+
+    field, op, value = rule["field"], rule["op"], rule.get("value")
+    if op == "exists":
+        return lambda block, rng: present(block[field])
+    if op in ("in", "not_in"):
+        values = np.array(list(value))
+        negate = op == "not_in"
+        # Missing values match neither in nor not_in
+        return lambda block, rng: (np.isin(block[field], values) != negate) & present(block[field])
+    if op in COMPARISONS:
+        compare_op = COMPARISONS[op]
+        return lambda block, rng: compare(block[field], compare_op, value)
+    raise ValueError(f"Unsupported rule operator: {op}")
+
+class PolicyEngine:
+    def __init__(self, policies):
+        self.policies = list(policies)
+        self.policy_ids = [policy["id"] for policy in self.policies]
+        self.predicates = [compile_rule(policy["rule"]) for policy in self.policies]
+        self.fields = sorted(set().union(*(rule_fields(policy["rule"]) for policy in self.policies)))
+        # Detail strings are fixed per policy and outcome, so expansion never formats text
+        self.details = [
+            (f"Non-compliant with {policy['name']}", f"Compliant with {policy['name']}")
+            for policy in self.policies
+        ]
+
+    def evaluate(self, block, rng=np.random):
+        # (policies, rows) boolean matrix; policy-major so each predicate fills contiguous memory
+        matrix = np.empty((len(self.predicates), block["size"]), dtype=bool)
+        for i, predicate in enumerate(self.predicates):
+            matrix[i] = predicate(block, rng)
+        return matrix
+
+    def evaluate_records(self, records, rng=np.random):
+        return self.evaluate(records_to_block(records, self.fields), rng)
+
+    def bitmap(self, matrix):
+        # (rows, ceil(policies / 8)) bytes: bit i of a job's bytes (little-endian) is policy i
+        return np.ascontiguousarray(np.packbits(matrix, axis=0, bitorder="little").T)
+
+    def unpack(self, bitmap):
+        # Back to the (policies, rows) matrix
+        return np.unpackbits(bitmap.T, axis=0, count=len(self.policies), bitorder="little").astype(bool)
+
+    def expand(self, column):
+        # The nested compliance_results list for one job, from its matrix column or bitmap row
+        if column.dtype == np.uint8:
+            column = self.unpack(column[None, :])[:, 0]
+        return [
+            {"policy_id": policy_id, "is_compliant": is_compliant, "details": details[is_compliant]}
+            for policy_id, is_compliant, details in zip(self.policy_ids, column.tolist(), self.details)
+        ]
+
+    def violation_counts(self, matrix):
+        # Non-compliant jobs per policy without expanding anything
+        return dict(zip(self.policy_ids, (matrix.shape[1] - matrix.sum(axis=1)).tolist()))
+
+if __name__ == "__main__":
+    import time
+    from datetime import datetime
+
+    from compliance_policies_generator import COMPLIANCE_POLICIES, generate_job_run
+
+    engine = PolicyEngine(COMPLIANCE_POLICIES)
+    jobs = [generate_job_run(datetime.now()) for _ in range(100000)]
+    block = records_to_block(jobs, engine.fields)
+
+    started = time.perf_counter()
+    matrix = engine.evaluate(block)
+    elapsed = time.perf_counter() - started
+    print(f"Evaluated {len(engine.policies)} policies over {len(jobs)} jobs in {elapsed * 1000:.1f} ms")
+    print(f"Bitmap: {engine.bitmap(matrix).nbytes} bytes; violations: {engine.violation_counts(matrix)}")
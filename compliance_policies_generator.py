@@ -1,121 +1,155 @@
 import random
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import faker
-import uuid
+from compliance_engine import PolicyEngine
+from ingestion import ingest
+from sharded_generation import anchor_date, generate_sharded, random_uuid, split_count
+from storage_backend import get_backend
 
 # Initialize Faker for generating realistic data
 fake = faker.Faker()
 
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
-
-# Define compliance policies
+# Define compliance policies; rules are declarative and compiled by compliance_engine
 COMPLIANCE_POLICIES = [
     {
         "id": "POL001",
         "name": "Data Encryption at Rest",
         "description": "All data must be encrypted when stored in the database.",
         "category": "Data Security",
-        "check": lambda job: random.choice([True, False])  # Simplified check
+        "rule": {"random": 0.5}  # Simplified check
     },
     {
         "id": "POL002",
         "name": "Access Control",
         "description": "Only authorized personnel should have access to sensitive data.",
         "category": "Access Management",
-        "check": lambda job: random.choice([True, False])  # Simplified check
+        "rule": {"random": 0.5}  # Simplified check
     },
     {
         "id": "POL003",
         "name": "Data Retention",
         "description": "Personal data must not be kept for longer than necessary.",
         "category": "Data Privacy",
-        "check": lambda job: job["duration_minutes"] <= 60  # Example check
+        "rule": {"field": "duration_minutes", "op": "<=", "value": 60}  # Example check
     },
     {
         "id": "POL004",
         "name": "Audit Logging",
         "description": "All data access and modifications must be logged.",
         "category": "Auditing",
-        "check": lambda job: "audit_log" in job  # Example check
+        "rule": {"field": "audit_log", "op": "exists"}  # Example check
     },
     {
         "id": "POL005",
         "name": "Data Backup",
         "description": "Critical data must be backed up daily.",
         "category": "Data Protection",
-        "check": lambda job: job["job_type"] == "Backup"  # Example check
+        "rule": {"field": "job_type", "op": "==", "value": "Backup"}  # Example check
     }
 ]
 
-def generate_job_run():
+def generate_job_run(now=None):
     job_types = ["ETL", "Data Processing", "Reporting", "Backup", "Data Access"]
+    # Anchoring "now" lets sharded runs reproduce the same timestamps
+    now = now or datetime.now()
     return {
-        "job_id": str(uuid.uuid4()),
+        "job_id": str(random_uuid()),
         "job_type": random.choice(job_types),
-        "start_time": fake.date_time_this_year().isoformat(),
+        "start_time": fake.date_time_between(start_date=datetime(now.year, 1, 1), end_date=now).isoformat(),
         "duration_minutes": random.randint(5, 120),
         "user": fake.user_name(),
         "audit_log": random.choice([True, False])
     }
 
+policy_engine = PolicyEngine(COMPLIANCE_POLICIES)
+
 def check_compliance(job):
-    compliance_results = []
-    for policy in COMPLIANCE_POLICIES:
-        is_compliant = policy["check"](job)
-        compliance_results.append({
-            "policy_id": policy["id"],
-            "is_compliant": is_compliant,
-            "details": f"{'Compliant' if is_compliant else 'Non-compliant'} with {policy['name']}"
-        })
-    return compliance_results
+    return policy_engine.expand(policy_engine.evaluate_records([job])[:, 0])
 
-def generate_compliant_job_runs(count=5000):
-    for _ in range(count):
-        job = generate_job_run()
-        compliance_results = check_compliance(job)
-        job["compliance_results"] = compliance_results
+def generate_compliant_job_runs(count=5000, now=None):
+    # Evaluate every policy over the whole batch at once, then expand to compliance_results
+    jobs = [generate_job_run(now) for _ in range(count)]
+    matrix = policy_engine.evaluate_records(jobs)
+    for job, column in zip(jobs, matrix.T):
+        job["compliance_results"] = policy_engine.expand(column)
         yield job
 
-def index_compliance_data():
+COMPLIANT_JOB_RUNS_MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "job_id": {"type": "keyword"},
+            "job_type": {"type": "keyword"},
+            "start_time": {"type": "date"},
+            "duration_minutes": {"type": "integer"},
+            "user": {"type": "keyword"},
+            "audit_log": {"type": "boolean"},
+            "compliance_results": {
+                "type": "nested",
+                "properties": {
+                    "policy_id": {"type": "keyword"},
+                    "is_compliant": {"type": "boolean"},
+                    "details": {"type": "text"}
+                }
+            }
+        }
+    }
+}
+
+def index_compliance_data(count=5000, master_seed=None, workers=1, rollup=None, backend=None, now=None,
+                          **ingest_options):
+    backend = backend or get_backend()
+    # Ordinal ids follow the seed, so a re-run addresses the same documents
+    ingest_options.setdefault("id_seed", master_seed)
+    
     # Index compliance policies
-    for policy in COMPLIANCE_POLICIES:
-        es.index(index="compliance_policies", id=policy["id"], body={
+    ingest(({
+        "_index": "compliance_policies",
+        "_id": policy["id"],
+        "_source": {
             "name": policy["name"],
             "description": policy["description"],
             "category": policy["category"]
-        })
+        }
+    } for policy in COMPLIANCE_POLICIES), backend, **ingest_options)
     print(f"Indexed {len(COMPLIANCE_POLICIES)} compliance policies.")
 
-    # Create index with appropriate mappings for job runs
-    job_runs_mapping = {
-        "mappings": {
-            "properties": {
-                "job_id": {"type": "keyword"},
-                "job_type": {"type": "keyword"},
-                "start_time": {"type": "date"},
-                "duration_minutes": {"type": "integer"},
-                "user": {"type": "keyword"},
-                "audit_log": {"type": "boolean"},
-                "compliance_results": {
-                    "type": "nested",
-                    "properties": {
-                        "policy_id": {"type": "keyword"},
-                        "is_compliant": {"type": "boolean"},
-                        "details": {"type": "text"}
-                    }
-                }
-            }
-        }
-    }
-    
-    es.indices.create(index="compliant_job_runs", body=job_runs_mapping, ignore=400)
+    backend.create_index("compliant_job_runs", COMPLIANT_JOB_RUNS_MAPPINGS)
     
     # Bulk index the job runs
-    success, failed = bulk(es, ({"_index": "compliant_job_runs", "_source": job} for job in generate_compliant_job_runs()))
-    print(f"Indexed {success} compliant job runs. Failed: {failed}")
+    # A seeded run anchors on a fixed date, so it regenerates the same documents
+    now = anchor_date(master_seed, now)
+    shards = [(shard_count, now) for shard_count, in split_count(count)]
+    jobs = generate_sharded("compliance_policies_generator", "generate_compliant_job_runs", shards, master_seed, workers)
+
+    def generate_actions():
+        # job_id is the document id, so re-ingesting a run overwrites it instead of duplicating it
+        batch = []
+        for job in jobs:
+            batch.append(job)
+            if len(batch) >= 5000:
+                yield from flush(batch)
+                batch = []
+        yield from flush(batch)
+
+    def flush(batch):
+        # The rollup looks up what it must back out for re-ingested runs before they are sent,
+        # and counts them once their chunk is acknowledged
+        if rollup is not None:
+            rollup.prepare(batch, backend)
+        for job in batch:
+            yield {"_index": "compliant_job_runs", "_id": job["job_id"], "_source": job}
+
+    try:
+        stats = ingest(generate_actions(), backend,
+                       on_indexed=rollup.acknowledge if rollup is not None else None, **ingest_options)
+    finally:
+        if rollup is not None:
+            rollup.settle()
+    print(f"Indexed {stats.success} compliant job runs. Failed: {stats.failed}")
+
+    if rollup is not None:
+        written = rollup.write(backend, **ingest_options)
+        print(f"Wrote {written} compliance rollup buckets.")
 
 if __name__ == "__main__":
     index_compliance_data()
@@ -0,0 +1,230 @@
+import json
+import os
+
+import numpy as np
+
+from ingestion import ingest
+from storage_backend import get_backend
+
+# Default location of the on-disk rollup state
+DEFAULT_COMPLIANCE_ROLLUP_PATH = "compliance_rollup_cache.json"
+COMPLIANCE_ROLLUP_INDEX = "compliance_rollup"
+
+COMPLIANCE_ROLLUP_MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "policy_id": {"type": "keyword"},
+            "job_type": {"type": "keyword"},
+            "user": {"type": "keyword"},
+            "day": {"type": "date"},
+            "compliant": {"type": "long"},
+            "non_compliant": {"type": "long"}
+        }
+    }
+}
+
+def results_matrix(jobs, policy_ids):
+    # (jobs, policies) outcomes from the nested compliance_results of each job
+    position = {policy_id: i for i, policy_id in enumerate(policy_ids)}
+    matrix = np.zeros((len(jobs), len(policy_ids)), dtype=bool)
+    for row, job in enumerate(jobs):
+        for result in job["compliance_results"]:
+            matrix[row, position[result["policy_id"]]] = result["is_compliant"]
+    return matrix
+
+def contributions(jobs, matrix, policy_ids):
+    # (job_type, user, day, packed outcome bits) per job: what one run adds to the buckets
+    bits = np.packbits(matrix, axis=1, bitorder="little")
+    return [(job["job_type"], job["user"], job["start_time"][:10], bits[row].tobytes().hex())
+            for row, job in enumerate(jobs)]
+
+class ComplianceRollup:
+    def __init__(self, policy_ids, path=DEFAULT_COMPLIANCE_ROLLUP_PATH):
+        self.path = path
+        self.policy_ids = list(policy_ids)
+        # (policy_id, job_type, user, day) -> [compliant, non_compliant]
+        self.counts = {}
+        # job_id -> [contribution currently counted (None if none), copies not yet acknowledged];
+        # only runs in flight are kept, so state stays bounded by the ingestion window
+        self.in_flight = {}
+        self.dirty = set()
+
+    @classmethod
+    def load(cls, policy_ids, path=DEFAULT_COMPLIANCE_ROLLUP_PATH):
+        rollup = cls(policy_ids, path)
+        if not os.path.exists(path):
+            return rollup
+
+        with open(path) as f:
+            data = json.load(f)
+
+        rollup.policy_ids = data["policy_ids"]
+        rollup.counts = {tuple(bucket["key"]): bucket["counts"] for bucket in data["buckets"]}
+        return rollup
+
+    def save(self):
+        data = {
+            "policy_ids": self.policy_ids,
+            "buckets": [{"key": list(key), "counts": counts} for key, counts in self.counts.items()]
+        }
+
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _apply(self, contribution, sign):
+        job_type, user, day, bits = contribution
+        outcomes = np.unpackbits(np.frombuffer(bytes.fromhex(bits), dtype=np.uint8),
+                                 count=len(self.policy_ids), bitorder="little")
+        for policy_id, compliant in zip(self.policy_ids, outcomes.tolist()):
+            key = (policy_id, job_type, user, day)
+            counts = self.counts.setdefault(key, [0, 0])
+            counts[0 if compliant else 1] += sign
+            self.dirty.add(key)
+
+    def update(self, jobs, matrix=None):
+        # Add a batch of compliant_job_runs documents to the counters; returns their contributions
+        if not jobs:
+            return []
+        if matrix is None:
+            matrix = results_matrix(jobs, self.policy_ids)
+
+        # Count the batch per (job_type, user, day) group with array ops, then touch each bucket once
+        groups = [(job["job_type"], job["user"], job["start_time"][:10]) for job in jobs]
+        unique_groups = sorted(set(groups))
+        group_code = {group: code for code, group in enumerate(unique_groups)}
+        codes = np.array([group_code[group] for group in groups], dtype=np.int64)
+        compliant = np.zeros((len(unique_groups), len(self.policy_ids)), dtype=np.int64)
+        np.add.at(compliant, codes, matrix.astype(np.int64))
+        totals = np.bincount(codes, minlength=len(unique_groups))
+
+        for code, (job_type, user, day) in enumerate(unique_groups):
+            for i, policy_id in enumerate(self.policy_ids):
+                key = (policy_id, job_type, user, day)
+                counts = self.counts.setdefault(key, [0, 0])
+                counts[0] += int(compliant[code, i])
+                counts[1] += int(totals[code] - compliant[code, i])
+                self.dirty.add(key)
+
+        return contributions(jobs, matrix, self.policy_ids)
+
+    def prepare(self, jobs, backend, index="compliant_job_runs"):
+        # Call before a batch is sent: reads (by _id, in realtime) what the index holds for
+        # runs that are not already in flight, so a re-ingested run can be backed out
+        wanted = list(dict.fromkeys(job["job_id"] for job in jobs if job["job_id"] not in self.in_flight))
+        stored = backend.mget(index, wanted, source=["job_type", "user", "start_time", "compliance_results"])
+        previous = dict(zip(stored, contributions(list(stored.values()),
+                                                  results_matrix(list(stored.values()), self.policy_ids),
+                                                  self.policy_ids)))
+        for job in jobs:
+            entry = self.in_flight.setdefault(job["job_id"], [previous.get(job["job_id"]), 0])
+            entry[1] += 1
+
+    def acknowledge(self, actions, errors=()):
+        # ingest's on_indexed hook: count only what the bulk call accepted, replacing the
+        # previously counted version of each run
+        failed = {item.get("_id") for error in errors for item in error.values()}
+        last_row = {}
+        for row, action in enumerate(actions):
+            if action["_id"] not in failed:
+                last_row[action["_id"]] = row
+
+        # A run repeated inside the chunk keeps its last copy
+        for job_id in last_row:
+            entry = self.in_flight.get(job_id)
+            if entry is not None and entry[0] is not None:
+                self._apply(entry[0], -1)
+        jobs = [actions[row]["_source"] for row in last_row.values()]
+        for job_id, contribution in zip(last_row, self.update(jobs)):
+            if job_id in self.in_flight:
+                self.in_flight[job_id][0] = contribution
+
+        for action in actions:
+            entry = self.in_flight.get(action["_id"])
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self.in_flight[action["_id"]]
+
+    def settle(self):
+        # After ingest returns: runs still listed were skipped (e.g. by a HashCache) or failed
+        self.in_flight = {}
+
+    def counts_for(self, policy_id, start_day=None, end_day=None, job_type=None, user=None):
+        # Sum over buckets only; days are ISO dates compared as strings
+        compliant = non_compliant = 0
+        for (bucket_policy, bucket_type, bucket_user, day), (ok, bad) in self.counts.items():
+            if bucket_policy != policy_id:
+                continue
+            if (start_day and day < start_day) or (end_day and day > end_day):
+                continue
+            if (job_type and bucket_type != job_type) or (user and bucket_user != user):
+                continue
+            compliant += ok
+            non_compliant += bad
+        return {"compliant": compliant, "non_compliant": non_compliant}
+
+    def documents(self, keys):
+        for key in sorted(keys):
+            policy_id, job_type, user, day = key
+            compliant, non_compliant = self.counts[key]
+            # Stable ids make every rewrite of a bucket an overwrite
+            yield "|".join(key), {
+                "policy_id": policy_id,
+                "job_type": job_type,
+                "user": user,
+                "day": day,
+                "compliant": compliant,
+                "non_compliant": non_compliant
+            }
+
+    def write(self, backend=None, **ingest_options):
+        # Upsert every bucket changed since the last write
+        backend = backend or get_backend()
+        if not self.dirty:
+            return 0
+        backend.create_index(COMPLIANCE_ROLLUP_INDEX, COMPLIANCE_ROLLUP_MAPPINGS)
+        stats = ingest(({"_index": COMPLIANCE_ROLLUP_INDEX, "_id": doc_id, "_source": doc}
+                        for doc_id, doc in self.documents(self.dirty)), backend, **ingest_options)
+        # On failures everything stays dirty so the next write retries it
+        if not stats.failed:
+            self.dirty = set()
+        return stats.success
+
+def query_violations(policy_id, start_day, end_day, job_type=None, user=None, backend=None):
+    # "How many runs violated POL003 this week" as a sum over rollup buckets
+    backend = backend or get_backend()
+    filters = [
+        {"term": {"policy_id": policy_id}},
+        {"range": {"day": {"gte": start_day, "lte": end_day}}}
+    ]
+    if job_type is not None:
+        filters.append({"term": {"job_type": job_type}})
+    if user is not None:
+        filters.append({"term": {"user": user}})
+
+    results = backend.search(COMPLIANCE_ROLLUP_INDEX, {
+        "size": 0,
+        "query": {"bool": {"filter": filters}},
+        "aggs": {
+            "compliant": {"sum": {"field": "compliant"}},
+            "non_compliant": {"sum": {"field": "non_compliant"}}
+        }
+    })
+    aggregations = results["aggregations"]
+    return {"compliant": int(aggregations["compliant"]["value"]), "non_compliant": int(aggregations["non_compliant"]["value"])}
+
+if __name__ == "__main__":
+    from datetime import datetime, timedelta
+
+    from compliance_policies_generator import COMPLIANCE_POLICIES, index_compliance_data
+
+    rollup = ComplianceRollup.load([policy["id"] for policy in COMPLIANCE_POLICIES])
+    index_compliance_data(rollup=rollup)
+    rollup.save()
+
+    today = datetime.now().date()
+    week_start = (today - timedelta(days=today.weekday())).isoformat()
+    print(f"POL003 this week: {query_violations('POL003', week_start, today.isoformat())}")
@@ -0,0 +1,37 @@
+import instrumentation
+
+# Default number of buckets requested per composite page
+DEFAULT_PAGE_SIZE = 1000
+
+def composite_sources(sources):
+    # Accept plain field names (terms sources) or {name: source_definition} dicts
+    return [
+        {source: {"terms": {"field": source}}} if isinstance(source, str) else source
+        for source in sources
+    ]
+
+def iter_composite_buckets(es, index, sources, aggs=None, query=None, page_size=DEFAULT_PAGE_SIZE):
+    # Page through every bucket of a composite aggregation with after_key, so memory
+    # on both sides stays bounded by page_size no matter how many groups exist
+    composite = {"size": page_size, "sources": composite_sources(sources)}
+    group_agg = {"composite": composite}
+    if aggs:
+        group_agg["aggs"] = aggs
+
+    body = {"size": 0, "aggs": {"groups": group_agg}}
+    if query is not None:
+        body["query"] = query
+
+    while True:
+        with instrumentation.timer("aggregate.page"):
+            results = es.search(index=index, body=body)
+        groups = results["aggregations"]["groups"]
+        instrumentation.count("aggregate.buckets", len(groups["buckets"]))
+
+        for bucket in groups["buckets"]:
+            yield bucket
+
+        after_key = groups.get("after_key")
+        if not groups["buckets"] or after_key is None:
+            break
+        composite["after"] = after_key
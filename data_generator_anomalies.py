@@ -1,11 +1,8 @@
 import random
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import uuid
-
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
+from ingestion import ingest
+from storage_backend import get_backend
 
 # Define job types and system configurations
 JOB_TYPES = ["ETL", "ML Training", "Data Validation", "Report Generation", "Backup"]
@@ -58,7 +55,9 @@ def generate_dataset(total_jobs=1000, num_anomalies=10):
     random.shuffle(all_jobs)
     return all_jobs
 
-def index_jobs(jobs):
+def index_jobs(jobs, backend=None, **ingest_options):
+    backend = backend or get_backend()
+    
     # Create index with appropriate mappings
     index_mappings = {
         "mappings": {
@@ -77,11 +76,11 @@ def index_jobs(jobs):
         }
     }
     
-    es.indices.create(index="job_runs_with_anomalies", body=index_mappings, ignore=400)
+    backend.create_index("job_runs_with_anomalies", index_mappings)
     
     # Bulk index the jobs
-    success, failed = bulk(es, ({"_index": "job_runs_with_anomalies", "_source": job} for job in jobs))
-    print(f"Indexed {success} jobs. Failed: {failed}")
+    stats = ingest(({"_index": "job_runs_with_anomalies", "_source": job} for job in jobs), backend, **ingest_options)
+    print(f"Indexed {stats.success} jobs. Failed: {stats.failed}")
 
 def main():
     total_jobs = 1000
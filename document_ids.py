@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+# Default location of the local "already indexed" hash cache
+DEFAULT_HASH_CACHE_PATH = "document_hashes.json"
+# Namespace for seed + ordinal ids; any fixed UUID works as long as it never changes
+ORDINAL_NAMESPACE = uuid.UUID("6f1c2b8e-3d4a-5e6f-8a9b-0c1d2e3f4a5b")
+
+def canonical_json(source):
+    return json.dumps(source, sort_keys=True, separators=(",", ":"), default=str)
+
+def content_hash(source, digest_size=8):
+    return hashlib.blake2b(canonical_json(source).encode(), digest_size=digest_size).hexdigest()
+
+def content_id(source):
+    # 128-bit content address: identical documents always get the same _id
+    return content_hash(source, digest_size=16)
+
+def ordinal_id(index, seed, ordinal):
+    # Record `ordinal` of a run seeded with `seed` gets the same _id every time
+    return str(uuid.uuid5(ORDINAL_NAMESPACE, f"{index}/{seed}/{ordinal}"))
+
+def assign_ids(actions, mode, seed=None):
+    # mode "content": hash of _source; "ordinal": seed + position within each index;
+    # any other string: that _source field (a natural key such as job_id).
+    # Actions that already carry an _id keep it.
+    ordinals = {}
+    for action in actions:
+        if "_id" in action:
+            yield action
+            continue
+
+        source = action.get("_source", action)
+        index = action.get("_index")
+        if mode == "content":
+            doc_id = content_id(source)
+        elif mode == "ordinal":
+            ordinal = ordinals.get(index, 0)
+            ordinals[index] = ordinal + 1
+            doc_id = ordinal_id(index, seed, ordinal)
+        else:
+            doc_id = str(source[mode])
+        yield dict(action, _id=doc_id)
+
+class HashCache:
+    def __init__(self, path=DEFAULT_HASH_CACHE_PATH):
+        self.path = path
+        # index -> {_id: content hash} of documents known to be indexed
+        self.hashes = {}
+        # Hashes sent in the current ingest, committed once the bulk results are known
+        self.pending = {}
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=DEFAULT_HASH_CACHE_PATH):
+        cache = cls(path)
+        if os.path.exists(path):
+            with open(path) as f:
+                cache.hashes = json.load(f)
+        return cache
+
+    def save(self):
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.hashes, f)
+        os.replace(tmp_path, self.path)
+
+    def filter(self, actions):
+        # Drop actions whose _id is already indexed with identical content
+        for action in actions:
+            index, doc_id = action.get("_index"), action.get("_id")
+            if doc_id is None:
+                yield action
+                continue
+
+            digest = content_hash(action.get("_source", action))
+            if self.hashes.get(index, {}).get(doc_id) == digest:
+                self.skipped += 1
+                continue
+            with self.lock:
+                self.pending[(index, doc_id)] = digest
+            yield action
+
+    def commit(self, errors=()):
+        # Remember everything that was sent except the documents the bulk call rejected
+        failed = set()
+        for error in errors:
+            item = next(iter(error.values()))
+            failed.add((item.get("_index"), item.get("_id")))
+
+        with self.lock:
+            for (index, doc_id), digest in self.pending.items():
+                if (index, doc_id) not in failed:
+                    self.hashes.setdefault(index, {})[doc_id] = digest
+            self.pending = {}
+
+    def discard(self):
+        # Ingestion failed part-way; forget what was sent so it is compared again next time
+        with self.lock:
+            self.pending = {}
+
+    def forget(self, index):
+        # Call after deleting an index so its documents are sent again next time
+        self.hashes.pop(index, None)
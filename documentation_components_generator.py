@@ -1,16 +1,13 @@
 import random
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import faker
 import uuid
 from datetime import datetime, timedelta
+from ingestion import ingest
+from storage_backend import get_backend
 
 # Initialize Faker for generating realistic data
 fake = faker.Faker()
 
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
-
 # Define system components
 SYSTEM_COMPONENTS = [
     {
@@ -85,7 +82,9 @@ def generate_documentation_components():
         usage_stats.append(generate_usage_statistics(component["name"]))
     return components, usage_stats
 
-def index_documentation_data(components, usage_stats):
+def index_documentation_data(components, usage_stats, backend=None, **ingest_options):
+    backend = backend or get_backend()
+    
     # Create index with appropriate mappings for components
     component_mappings = {
         "mappings": {
@@ -102,11 +101,11 @@ def index_documentation_data(components, usage_stats):
         }
     }
     
-    es.indices.create(index="documentation_components", body=component_mappings, ignore=400)
+    backend.create_index("documentation_components", component_mappings)
     
     # Bulk index the components
-    success, failed = bulk(es, ({"_index": "documentation_components", "_source": component} for component in components))
-    print(f"Indexed {success} documentation components. Failed: {failed}")
+    stats = ingest(({"_index": "documentation_components", "_source": component} for component in components), backend, **ingest_options)
+    print(f"Indexed {stats.success} documentation components. Failed: {stats.failed}")
 
     # Create index with appropriate mappings for usage statistics
     usage_stats_mappings = {
@@ -126,11 +125,11 @@ def index_documentation_data(components, usage_stats):
         }
     }
     
-    es.indices.create(index="documentation_usage_stats", body=usage_stats_mappings, ignore=400)
+    backend.create_index("documentation_usage_stats", usage_stats_mappings)
     
     # Bulk index the usage statistics
-    success, failed = bulk(es, ({"_index": "documentation_usage_stats", "_source": stat} for stat in usage_stats))
-    print(f"Indexed {success} documentation usage statistics. Failed: {failed}")
+    stats = ingest(({"_index": "documentation_usage_stats", "_source": stat} for stat in usage_stats), backend, **ingest_options)
+    print(f"Indexed {stats.success} documentation usage statistics. Failed: {stats.failed}")
 
 if __name__ == "__main__":
     components, usage_stats = generate_documentation_components()
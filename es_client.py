@@ -0,0 +1,89 @@
+import os
+import socket
+import threading
+
+from elasticsearch import Elasticsearch
+from elasticsearch.connection import Urllib3HttpConnection
+from urllib3.connection import HTTPConnection
+
+# Settings for the one client shared by every generator, detector and service in the process.
+# Each can be overridden with configure() or the ES_* environment variable in ENV_OPTIONS.
+DEFAULT_CLIENT_OPTIONS = {
+    "hosts": ["http://localhost:9200"],
+    # Connections kept open per node; at least the ingestion workers plus concurrent readers
+    "pool_size": 25,
+    # TCP keep-alive on pooled sockets so idle connections in long-lived services stay usable
+    "keep_alive": True,
+    # gzip request bodies; bulk payloads are highly compressible JSON
+    "compress": True,
+    "timeout": 30,
+    "max_retries": 3,
+    "retry_on_timeout": True,
+    # 429 is left to ingestion, which backs off instead of retrying immediately
+    "retry_on_status": (502, 503, 504)
+}
+
+ENV_OPTIONS = {
+    "ES_HOSTS": ("hosts", lambda value: value.split(",")),
+    "ES_POOL_SIZE": ("pool_size", int),
+    "ES_KEEP_ALIVE": ("keep_alive", lambda value: value not in ("0", "false")),
+    "ES_HTTP_COMPRESS": ("compress", lambda value: value not in ("0", "false")),
+    "ES_TIMEOUT": ("timeout", float),
+    "ES_MAX_RETRIES": ("max_retries", int)
+}
+
+_client = None
+_overrides = {}
+_lock = threading.Lock()
+
+class KeepAliveConnection(Urllib3HttpConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool.conn_kw["socket_options"] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        ]
+
+def client_options():
+    options = dict(DEFAULT_CLIENT_OPTIONS)
+    for variable, (name, parse) in ENV_OPTIONS.items():
+        if variable in os.environ:
+            options[name] = parse(os.environ[variable])
+    options.update(_overrides)
+    return options
+
+def build_client(options):
+    # Constructing the client does no I/O; the first request opens the first connection
+    return Elasticsearch(
+        options["hosts"],
+        connection_class=KeepAliveConnection if options["keep_alive"] else Urllib3HttpConnection,
+        maxsize=options["pool_size"],
+        http_compress=options["compress"],
+        timeout=options["timeout"],
+        max_retries=options["max_retries"],
+        retry_on_timeout=options["retry_on_timeout"],
+        retry_on_status=tuple(options["retry_on_status"])
+    )
+
+def get_client():
+    # Built on first use and then shared, so every module reuses the same connection pool
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = build_client(client_options())
+    return _client
+
+def configure(**options):
+    # Override client options; an existing client is closed and rebuilt on next use
+    unknown = set(options) - set(DEFAULT_CLIENT_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown client options: {sorted(unknown)}")
+    _overrides.update(options)
+    close_client()
+
+def close_client():
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
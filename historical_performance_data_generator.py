@@ -1,11 +1,9 @@
 import random
-from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
-import uuid
-
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
+from datetime import timedelta
+from index_partitioning import prepare_index, range_query, route_actions, search_target
+from ingestion import ingest
+from sharded_generation import anchor_date, generate_sharded, random_uuid, split_date_range
+from storage_backend import get_backend
 
 # Define job types
 JOB_TYPES = ["ETL", "ML Training", "Data Validation", "Report Generation", "Backup"]
@@ -39,7 +37,7 @@ def generate_performance_data(start_date, end_date):
             memory_usage *= time_factor
             
             yield {
-                "job_id": str(uuid.uuid4()),
+                "job_id": str(random_uuid()),
                 "job_type": job_type,
                 "system_config": config["name"],
                 "timestamp": current_date.isoformat(),
@@ -52,77 +50,78 @@ def generate_performance_data(start_date, end_date):
         
         current_date += timedelta(days=1)
 
-def index_performance_data():
-    # Create index with appropriate mappings
-    index_mappings = {
-        "mappings": {
-            "properties": {
-                "job_id": {"type": "keyword"},
-                "job_type": {"type": "keyword"},
-                "system_config": {"type": "keyword"},
-                "timestamp": {"type": "date"},
-                "runtime_minutes": {"type": "float"},
-                "cpu_usage_percent": {"type": "float"},
-                "memory_usage_percent": {"type": "float"},
-                "io_operations": {"type": "long"},
-                "status": {"type": "keyword"}
-            }
+HISTORICAL_PERFORMANCE_MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "job_id": {"type": "keyword"},
+            "job_type": {"type": "keyword"},
+            "system_config": {"type": "keyword"},
+            "timestamp": {"type": "date"},
+            "runtime_minutes": {"type": "float"},
+            "cpu_usage_percent": {"type": "float"},
+            "memory_usage_percent": {"type": "float"},
+            "io_operations": {"type": "long"},
+            "status": {"type": "keyword"}
         }
     }
+}
+
+def index_performance_data(master_seed=None, workers=1, partitioned=False, backend=None, end_date=None,
+                           **ingest_options):
+    backend = backend or get_backend()
+    # Ordinal ids follow the seed, so a re-run addresses the same documents
+    ingest_options.setdefault("id_seed", master_seed)
     
-    es.indices.create(index="historical_performance", body=index_mappings, ignore=400)
+    prepare_index(backend, "historical_performance", HISTORICAL_PERFORMANCE_MAPPINGS, partitioned)
     
-    # Generate and index performance data for the last 12 months
-    end_date = datetime.now()
+    # Generate and index performance data for the last 12 months (before a fixed date when seeded)
+    end_date = anchor_date(master_seed, end_date)
     start_date = end_date - timedelta(days=365)
     
     # Bulk index the performance data
-    success, failed = bulk(es, ({"_index": "historical_performance", "_source": data} 
-                                for data in generate_performance_data(start_date, end_date)))
-    print(f"Indexed {success} performance records. Failed: {failed}")
+    # Split the date range into shards generated in parallel and seeded from master_seed
+    records = generate_sharded("historical_performance_data_generator", "generate_performance_data",
+                               split_date_range(start_date, end_date), master_seed, workers)
+    actions = ({"_index": "historical_performance", "_source": data} for data in records)
+    stats = ingest(route_actions(actions) if partitioned else actions, backend, **ingest_options)
+    print(f"Indexed {stats.success} performance records. Failed: {stats.failed}")
 
-def generate_performance_summary():
+def generate_performance_summary(backend=None, start=None, end=None, **ingest_options):
+    backend = backend or get_backend()
+    
+    # Only partitions overlapping the window are searched
+    index = search_target(backend, "historical_performance", start, end)
+    if index is None:
+        print("No performance data in the requested window.")
+        return
+    
     # Aggregate performance data by job type and system config
-    agg_query = {
-        "size": 0,
-        "aggs": {
-            "job_types": {
-                "terms": {"field": "job_type"},
-                "aggs": {
-                    "configs": {
-                        "terms": {"field": "system_config"},
-                        "aggs": {
-                            "avg_runtime": {"avg": {"field": "runtime_minutes"}},
-                            "avg_cpu_usage": {"avg": {"field": "cpu_usage_percent"}},
-                            "avg_memory_usage": {"avg": {"field": "memory_usage_percent"}},
-                            "success_count": {"filter": {"term": {"status": "completed"}}},
-                            "total_count": {"value_count": {"field": "job_id"}}
-                        }
-                    }
-                }
-            }
-        }
+    aggs = {
+        "avg_runtime": {"avg": {"field": "runtime_minutes"}},
+        "avg_cpu_usage": {"avg": {"field": "cpu_usage_percent"}},
+        "avg_memory_usage": {"avg": {"field": "memory_usage_percent"}},
+        "success_count": {"filter": {"term": {"status": "completed"}}},
+        "total_count": {"value_count": {"field": "job_id"}}
     }
     
-    results = es.search(index="historical_performance", body=agg_query)
-    
+    # Composite paging returns every (job_type, system_config) group, not just the top 10 terms
     summaries = []
-    for job_type in results["aggregations"]["job_types"]["buckets"]:
-        for config in job_type["configs"]["buckets"]:
-            success_rate = (config["success_count"]["doc_count"] / config["total_count"]["value"]) * 100 if config["total_count"]["value"] > 0 else 0
-            summaries.append({
-                "job_type": job_type["key"],
-                "system_config": config["key"],
-                "avg_runtime_minutes": round(config["avg_runtime"]["value"], 2),
-                "avg_cpu_usage_percent": round(config["avg_cpu_usage"]["value"], 2),
-                "avg_memory_usage_percent": round(config["avg_memory_usage"]["value"], 2),
-                "success_rate_percent": round(success_rate, 2)
-            })
+    for bucket in backend.aggregate(index, ["job_type", "system_config"], aggs=aggs,
+                                  query=range_query("timestamp", start, end)):
+        success_rate = (bucket["success_count"]["doc_count"] / bucket["total_count"]["value"]) * 100 if bucket["total_count"]["value"] > 0 else 0
+        summaries.append({
+            "job_type": bucket["key"]["job_type"],
+            "system_config": bucket["key"]["system_config"],
+            "avg_runtime_minutes": round(bucket["avg_runtime"]["value"], 2),
+            "avg_cpu_usage_percent": round(bucket["avg_cpu_usage"]["value"], 2),
+            "avg_memory_usage_percent": round(bucket["avg_memory_usage"]["value"], 2),
+            "success_rate_percent": round(success_rate, 2)
+        })
     
     # Index performance summaries
-    es.indices.create(index="performance_summaries", ignore=400)
-    success, failed = bulk(es, ({"_index": "performance_summaries", "_source": summary} for summary in summaries))
-    print(f"Indexed {success} performance summaries. Failed: {failed}")
+    backend.create_index("performance_summaries")
+    stats = ingest(({"_index": "performance_summaries", "_source": summary} for summary in summaries), backend, **ingest_options)
+    print(f"Indexed {stats.success} performance summaries. Failed: {stats.failed}")
 
 if __name__ == "__main__":
     index_performance_data()
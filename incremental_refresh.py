@@ -0,0 +1,57 @@
+from index_partitioning import search_target
+
+def unseen_filters(field, mark, boundary_ids):
+    # Documents at or after the mark, except those at the mark that were already folded in
+    filters = []
+    if mark is not None:
+        filters.append({"range": {field: {"gte": mark, "format": "epoch_millis"}}})
+    must_not = [{"ids": {"values": list(boundary_ids)}}] if boundary_ids else []
+    return filters, must_not
+
+def ids_at(backend, target, field, timestamp):
+    ids = set()
+    snapshot = backend.open_scan(target)
+    try:
+        query = {"range": {field: {"gte": timestamp, "lte": timestamp, "format": "epoch_millis"}}}
+        for hits in backend.scan(snapshot, query, source=[field]):
+            ids.update(hit["_id"] for hit in hits)
+    finally:
+        backend.close_scan(snapshot)
+    return ids
+
+def next_window(backend, index, mark=None, boundary_ids=(), field="timestamp"):
+    # The documents an incremental store has not folded in yet, as {"target", "query",
+    # "mark", "boundary_ids"}, or None when there are none. Save mark and boundary_ids
+    # after folding the window in.
+    #
+    # The mark is the latest timestamp folded in so far, and boundary_ids the _ids of the
+    # documents at exactly that timestamp: documents that arrive later with the same
+    # timestamp are still picked up, without counting the others twice. Backfilled
+    # documents with a timestamp below the mark are not picked up.
+    target = search_target(backend, index, start=mark)
+    if target is None:
+        return None
+
+    filters, must_not = unseen_filters(field, mark, boundary_ids)
+    results = backend.search(target, {
+        "size": 0,
+        "query": {"bool": {"filter": filters, "must_not": must_not}},
+        "aggs": {"latest": {"max": {"field": field}}}
+    })
+    latest = results["aggregations"]["latest"]["value"]
+    if latest is None:
+        return None
+    latest = int(latest)
+
+    # The new boundary is read before the window is closed at it, so a document arriving
+    # at the new mark meanwhile is either in both or left for the next refresh
+    at_latest = ids_at(backend, target, field, latest)
+    upto_latest = [{"range": {field: {"lt": latest, "format": "epoch_millis"}}}]
+    if at_latest:
+        upto_latest.append({"ids": {"values": sorted(at_latest)}})
+
+    query = {"bool": {
+        "filter": filters + [{"bool": {"should": upto_latest, "minimum_should_match": 1}}],
+        "must_not": must_not
+    }}
+    return {"target": target, "query": query, "mark": latest, "boundary_ids": sorted(at_latest)}
@@ -0,0 +1,126 @@
+import re
+from datetime import datetime, timezone
+
+# Time-partitioned indices and the date field that picks each document's partition.
+# Partitions are monthly ("job_runs-2024.05"); the base name is a read alias over all of
+# them and "{base}-write" points at the current month for writers without their own routing.
+PARTITIONED_INDICES = {
+    "job_runs": "start_time",
+    "historical_performance": "timestamp",
+    "system_metrics": "timestamp",
+    "error_logs": "timestamp"
+}
+
+def to_datetime(value):
+    # ISO strings, datetimes and epoch millis, as naive UTC
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, timezone.utc).replace(tzinfo=None)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def partition_suffix(value):
+    # Generators emit naive ISO strings, so the month is read straight from the text
+    if isinstance(value, str) and len(value) >= 7 and value[4] == "-" and not value.endswith("Z") and "+" not in value:
+        return f"{value[:4]}.{value[5:7]}"
+    value = to_datetime(value)
+    return f"{value.year:04d}.{value.month:02d}"
+
+def partition_name(base, value):
+    return f"{base}-{partition_suffix(value)}"
+
+def write_alias(base):
+    return f"{base}-write"
+
+def install_template(backend, base, mappings):
+    # Every index matching "{base}-*" gets the mappings and joins the read alias on creation
+    backend.put_index_template(f"{base}-template", {
+        "index_patterns": [f"{base}-*"],
+        "template": {
+            "mappings": mappings["mappings"],
+            "aliases": {base: {}}
+        }
+    })
+
+def prepare_index(backend, base, mappings, partitioned=False):
+    # A monolithic index named base must be reindexed into partitions before
+    # base can be used as the read alias
+    if partitioned:
+        install_template(backend, base, mappings)
+    else:
+        backend.create_index(base, mappings)
+
+def route_actions(actions):
+    # Send each document to the partition for its date; other indices pass through
+    for action in actions:
+        field = PARTITIONED_INDICES.get(action["_index"])
+        if field is not None:
+            source = action.get("_source", action)
+            action = dict(action, _index=partition_name(action["_index"], source[field]))
+        yield action
+
+def partitions(backend, base):
+    pattern = re.compile(rf"^{re.escape(base)}-\d{{4}}\.\d{{2}}$")
+    return sorted(name for name in backend.list_indices(f"{base}-*") if pattern.match(name))
+
+def rollover(backend, base, now=None):
+    # Create the current month's partition and move the write alias onto it
+    index = partition_name(base, now or datetime.now())
+    backend.create_index(index)
+    backend.update_aliases([
+        {"remove": {"index": f"{base}-*", "alias": write_alias(base)}},
+        {"add": {"index": index, "alias": write_alias(base), "is_write_index": True}}
+    ])
+    return index
+
+def search_target(backend, base, start=None, end=None):
+    # Comma-joined partitions overlapping [start, end], base itself when the index is not
+    # partitioned, or None when no partition can hold a matching document
+    names = partitions(backend, base)
+    if not names:
+        return base
+
+    low = partition_suffix(start) if start is not None else None
+    high = partition_suffix(end) if end is not None else None
+    overlapping = [
+        name for name in names
+        if (low is None or name[-7:] >= low) and (high is None or name[-7:] <= high)
+    ]
+    return ",".join(overlapping) or None
+
+def range_query(field, start=None, end=None):
+    bounds = {}
+    if start is not None:
+        bounds["gte"] = start.isoformat() if isinstance(start, datetime) else start
+    if end is not None:
+        bounds["lte"] = end.isoformat() if isinstance(end, datetime) else end
+    if not bounds:
+        return None
+    if any(isinstance(bound, int) for bound in bounds.values()):
+        bounds["format"] = "epoch_millis"
+    return {"range": {field: bounds}}
+
+def drop_partition(backend, base, value):
+    # Retention is one index delete per month instead of a delete-by-query; value is any date in the month
+    index = partition_name(base, value)
+    backend.delete_index(index)
+    return index
+
+def expire_partitions(backend, base, keep_months, now=None):
+    # Drop every partition older than the newest keep_months months up to now
+    now = to_datetime(now or datetime.now())
+    month = now.year * 12 + now.month - 1 - (keep_months - 1)
+    cutoff = f"{month // 12:04d}.{month % 12 + 1:02d}"
+    expired = [name for name in partitions(backend, base) if name[-7:] < cutoff]
+    for name in expired:
+        backend.delete_index(name)
+    return expired
+
+if __name__ == "__main__":
+    from storage_backend import get_backend
+
+    backend = get_backend()
+    for base in PARTITIONED_INDICES:
+        print(f"{base}: {partitions(backend, base)}")
@@ -0,0 +1,196 @@
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import instrumentation
+from document_ids import assign_ids
+from storage_backend import get_backend
+
+# Defaults shared by every index_* function; override per call through **ingest_options
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_INITIAL_BACKOFF = 1
+DEFAULT_MAX_BACKOFF = 60
+# Bulk metadata line added to every document's size
+ACTION_OVERHEAD_BYTES = 64
+# One in this many documents is serialized to measure its size; the others count at the
+# running average. helpers.bulk enforces the real byte limit when it serializes the chunk,
+# so the estimate only has to be close (it also feeds IngestionStats.bytes).
+SIZE_SAMPLE_INTERVAL = 32
+
+class IngestionStats:
+    def __init__(self):
+        self.success = 0
+        self.failed = 0
+        self.errors = []
+        self.docs = 0
+        self.bytes = 0
+        self.retries = 0
+        self.skipped = 0
+        self.chunks = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, chunk_stats, errors):
+        with self.lock:
+            self.chunks.append(chunk_stats)
+            self.docs += chunk_stats["docs"]
+            self.bytes += chunk_stats["bytes"]
+            self.success += chunk_stats["success"]
+            self.failed += chunk_stats["failed"]
+            self.retries += chunk_stats["retries"]
+            self.errors.extend(errors)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def docs_per_second(self):
+        return self.docs / self.elapsed if self.elapsed > 0 else 0.0
+
+    def mb_per_second(self):
+        return self.bytes / (1024 * 1024) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return {
+            "docs": self.docs,
+            "success": self.success,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "chunks": len(self.chunks),
+            "retries": self.retries,
+            "skipped": self.skipped,
+            "seconds": round(self.elapsed, 3),
+            "docs_per_second": round(self.docs_per_second(), 1),
+            "mb_per_second": round(self.mb_per_second(), 3)
+        }
+
+def action_size(action):
+    # Request payload size: one metadata line plus the serialized source
+    source = action.get("_source", action)
+    return len(json.dumps(source, default=str)) + ACTION_OVERHEAD_BYTES
+
+def iter_chunks(actions, chunk_size=DEFAULT_CHUNK_SIZE, max_chunk_bytes=DEFAULT_MAX_CHUNK_BYTES):
+    chunk = []
+    chunk_bytes = 0
+    sampled = 0
+    sampled_bytes = 0
+    for position, action in enumerate(actions):
+        if position % SIZE_SAMPLE_INTERVAL == 0:
+            size = action_size(action)
+            sampled += 1
+            sampled_bytes += size
+        else:
+            size = sampled_bytes // sampled
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + size > max_chunk_bytes):
+            yield chunk, chunk_bytes
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(action)
+        chunk_bytes += size
+
+    if chunk:
+        yield chunk, chunk_bytes
+
+def is_too_many_requests(error):
+    return getattr(error, "status_code", None) == 429
+
+def send_chunk(backend, chunk, chunk_bytes, max_retries, initial_backoff, max_backoff):
+    # helpers.bulk already retries 429 items and requests; a 429 that still escapes
+    # (or one raised by another backend) is retried here with exponential backoff
+    started = time.perf_counter()
+    retries = 0
+    while True:
+        try:
+            success, errors = backend.bulk(
+                chunk,
+                chunk_size=len(chunk),
+                max_chunk_bytes=max(chunk_bytes * 2, DEFAULT_MAX_CHUNK_BYTES),
+                max_retries=max_retries,
+                initial_backoff=initial_backoff,
+                max_backoff=max_backoff,
+                raise_on_error=False
+            )
+            break
+        except Exception as error:
+            if not is_too_many_requests(error) or retries >= max_retries:
+                raise
+            time.sleep(min(max_backoff, initial_backoff * 2 ** retries))
+            retries += 1
+
+    elapsed = time.perf_counter() - started
+    instrumentation.observe("ingest.bulk", elapsed)
+    instrumentation.count("ingest.docs", len(chunk))
+    instrumentation.count("ingest.bytes", chunk_bytes)
+    instrumentation.count("ingest.retries", retries)
+    instrumentation.count("ingest.failed", len(errors))
+    chunk_stats = {
+        "docs": len(chunk),
+        "bytes": chunk_bytes,
+        "success": success,
+        "failed": len(errors),
+        "retries": retries,
+        "seconds": elapsed,
+        "docs_per_second": len(chunk) / elapsed if elapsed > 0 else 0.0
+    }
+    return chunk_stats, errors
+
+def ingest(actions, backend=None, chunk_size=DEFAULT_CHUNK_SIZE, max_chunk_bytes=DEFAULT_MAX_CHUNK_BYTES,
+           workers=DEFAULT_WORKERS, max_retries=DEFAULT_MAX_RETRIES, initial_backoff=DEFAULT_INITIAL_BACKOFF,
+           max_backoff=DEFAULT_MAX_BACKOFF, on_chunk=None, on_indexed=None, id_mode=None, id_seed=None,
+           hash_cache=None):
+    # Chunk actions by count and byte size and send up to `workers` chunks concurrently.
+    # At most 2 * workers chunks are in flight, so memory stays bounded for any input size.
+    # Chunks may complete out of order; don't rely on ordering between writes to the same _id.
+    # id_mode gives documents deterministic ids (see document_ids.assign_ids) so re-running
+    # an index_* function overwrites instead of appending; hash_cache (a HashCache) then
+    # skips documents already indexed with the same content. on_indexed(chunk, errors) is
+    # called in this thread once a chunk is acknowledged, with the bulk errors of that chunk.
+    backend = backend or get_backend()
+    stats = IngestionStats()
+    if id_mode is not None:
+        actions = assign_ids(actions, id_mode, id_seed)
+    if hash_cache is not None:
+        skipped_before = hash_cache.skipped
+        actions = hash_cache.filter(actions)
+
+    chunks = {}
+
+    def handle(future):
+        chunk_stats, errors = future.result()
+        chunk = chunks.pop(future)
+        stats.record(chunk_stats, errors)
+        if on_chunk is not None:
+            on_chunk(chunk_stats)
+        if on_indexed is not None:
+            on_indexed(chunk, errors)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            in_flight = set()
+            for chunk, chunk_bytes in iter_chunks(actions, chunk_size, max_chunk_bytes):
+                if len(in_flight) >= 2 * max(1, workers):
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle(future)
+                future = executor.submit(send_chunk, backend, chunk, chunk_bytes,
+                                         max_retries, initial_backoff, max_backoff)
+                chunks[future] = chunk
+                in_flight.add(future)
+
+            for future in in_flight:
+                handle(future)
+    except BaseException:
+        # Nothing pending is known to be indexed; recording it would skip those documents forever
+        if hash_cache is not None:
+            hash_cache.discard()
+        raise
+
+    if hash_cache is not None:
+        hash_cache.commit(stats.errors)
+        stats.skipped = hash_cache.skipped - skipped_before
+    return stats.finish()
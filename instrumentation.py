@@ -0,0 +1,252 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Upper bounds in seconds of the latency histogram buckets (Prometheus "le" values)
+LATENCY_BUCKETS = (0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+DEFAULT_METRICS_PATH = "metrics.prom"
+METRIC_PREFIX = "training"
+# Seconds between stack samples in sampling profile mode
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # One count per bound plus the +Inf bucket; cumulative only when exported
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation (the max for +Inf)
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 9) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(bound) for bound in self.bounds] + ["+Inf"], self.counts))
+        }
+
+class Registry:
+    def __init__(self):
+        # Off unless INSTRUMENTATION=1; every hook checks this flag first and returns immediately
+        self.enabled = os.environ.get("INSTRUMENTATION", "0") not in ("", "0")
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+registry = Registry()
+
+def enable():
+    registry.enabled = True
+
+def disable():
+    registry.enabled = False
+
+def is_enabled():
+    return registry.enabled
+
+def reset():
+    with registry.lock:
+        registry.counters = {}
+        registry.histograms = {}
+
+def count(name, value=1):
+    if not registry.enabled:
+        return
+    with registry.lock:
+        registry.counters[name] = registry.counters.get(name, 0) + value
+
+def observe(stage, seconds):
+    if not registry.enabled:
+        return
+    with registry.lock:
+        histogram = registry.histograms.get(stage)
+        if histogram is None:
+            histogram = registry.histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+class Timer:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.started)
+
+_disabled_timer = nullcontext()
+
+def timer(stage):
+    # with timer("ingest.bulk"): ...  -- a shared no-op context manager when disabled
+    return Timer(stage) if registry.enabled else _disabled_timer
+
+def timed(stage):
+    # Decorator form of timer for plain functions (generators would only time their creation)
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def snapshot():
+    with registry.lock:
+        return {
+            "enabled": registry.enabled,
+            "counters": dict(registry.counters),
+            "stages": {stage: histogram.summary() for stage, histogram in sorted(registry.histograms.items())}
+        }
+
+def metric_name(name):
+    return f"{METRIC_PREFIX}_{name.replace('.', '_').replace('-', '_')}"
+
+def prometheus_text():
+    # Text exposition format: one histogram family labelled by stage, one counter per name
+    with registry.lock:
+        histograms = sorted(registry.histograms.items())
+        counters = sorted(registry.counters.items())
+
+    family = f"{METRIC_PREFIX}_stage_seconds"
+    lines = [f"# HELP {family} Wall time per instrumented stage.", f"# TYPE {family} histogram"]
+    for stage, histogram in histograms:
+        cumulative = 0
+        for bound, bucket_count in zip(list(histogram.bounds) + ["+Inf"], histogram.counts):
+            cumulative += bucket_count
+            lines.append(f'{family}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{family}_sum{{stage="{stage}"}} {histogram.sum}')
+        lines.append(f'{family}_count{{stage="{stage}"}} {histogram.count}')
+
+    for name, value in counters:
+        lines.append(f"# TYPE {metric_name(name)}_total counter")
+        lines.append(f"{metric_name(name)}_total {value}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path=DEFAULT_METRICS_PATH, format=None):
+    # Prometheus text (e.g. for the node_exporter textfile collector) or JSON, chosen by
+    # format or the file extension
+    format = format or ("json" if path.endswith(".json") else "prometheus")
+    text = json.dumps(snapshot(), indent=2) if format == "json" else prometheus_text()
+
+    # Write to a temporary file first so a scraper never reads a truncated file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+class SamplingProfiler:
+    # Periodically records the stack of every other thread; output is in collapsed-stack
+    # format ("frame;frame;frame count"), which flamegraph.pl and speedscope read directly
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        return self
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {samples}" for stack, samples in self.stacks.most_common()) + "\n"
+
+    def write(self, path):
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+
+@contextmanager
+def profile(path=None, mode="cprofile", interval=DEFAULT_SAMPLE_INTERVAL):
+    # Capture one run: mode "cprofile" is deterministic and writes a .prof file for pstats or
+    # snakeviz; "sampling" has lower overhead and writes collapsed stacks
+    if mode == "sampling":
+        profiler = SamplingProfiler(interval).start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            if path is not None:
+                profiler.write(path)
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
+
+def print_profile(profiler, sort="cumulative", limit=25):
+    pstats.Stats(profiler).sort_stats(sort).print_stats(limit)
+
+if __name__ == "__main__":
+    from datetime import datetime
+
+    from job_run_data_generator import generate_job_runs
+
+    enable()
+    with profile("job_runs.prof") as profiler:
+        with timer("generate"):
+            job_runs = list(generate_job_runs(2000, datetime.now()))
+    count("generate.records", len(job_runs))
+
+    print(prometheus_text())
+    print_profile(profiler, limit=15)
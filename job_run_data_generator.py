@@ -1,19 +1,37 @@
 import random
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import faker
-import uuid
+import numpy as np
+import instrumentation
+from index_partitioning import prepare_index, route_actions
+from ingestion import ingest
+from sharded_generation import anchor_date, generate_sharded, random_uuid, split_count
+from storage_backend import get_backend
 
 # Initialize Faker for generating realistic data
 fake = faker.Faker()
 
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
+# Fast log path: messages are drawn from a fixed pool of Faker sentences built once per process
+LOG_LEVELS = np.array(["INFO", "WARNING", "ERROR"], dtype=object)
+LOG_MESSAGE_POOL_SIZE = 4096
+LOG_MESSAGE_POOL_SEED = 0
+_log_message_pool = None
 
-def generate_job_run():
-    job_id = str(uuid.uuid4())
-    start_time = fake.date_time_between(start_date="-6M", end_date="now")
+def get_log_message_pool():
+    # Built from a separately seeded Faker so every process (and shard) sees the same pool
+    global _log_message_pool
+    if _log_message_pool is None:
+        pool_fake = faker.Faker()
+        pool_fake.seed_instance(LOG_MESSAGE_POOL_SEED)
+        _log_message_pool = np.array([pool_fake.sentence() for _ in range(LOG_MESSAGE_POOL_SIZE)], dtype=object)
+    return _log_message_pool
+
+@instrumentation.timed("generate.job_run")
+def generate_job_run(end_date=None, strict_logs=False):
+    # Anchoring the 6-month window lets sharded runs reproduce the same timestamps
+    end_date = end_date or datetime.now()
+    job_id = str(random_uuid())
+    start_time = fake.date_time_between(start_date=end_date - timedelta(days=6 * 30.42), end_date=end_date)
     duration = timedelta(minutes=random.randint(1, 1440))  # 1 minute to 24 hours
     end_time = start_time + duration
     
@@ -24,7 +42,7 @@ def generate_job_run():
     disk_io = random.uniform(0, 500)  # MB/s
     
     log_verbosity = random.choice(["low", "medium", "high"])
-    log_entries = generate_log_entries(start_time, end_time, log_verbosity)
+    log_entries = generate_log_entries(start_time, end_time, log_verbosity, strict_logs)
     
     return {
         "job_id": job_id,
@@ -39,57 +57,81 @@ def generate_job_run():
         "logs": log_entries
     }
 
-def generate_log_entries(start_time, end_time, verbosity):
+@instrumentation.timed("generate.log_entries")
+def generate_log_entries(start_time, end_time, verbosity, strict=False):
     log_count = {
         "low": random.randint(5, 20),
         "medium": random.randint(20, 50),
         "high": random.randint(50, 200)
     }[verbosity]
     
-    log_entries = []
-    for _ in range(log_count):
-        timestamp = fake.date_time_between(start_date=start_time, end_date=end_time)
-        level = random.choice(["INFO", "WARNING", "ERROR"])
-        message = fake.sentence()
-        log_entries.append(f"{timestamp.isoformat()} [{level}] {message}")
+    if strict:
+        # Original per-line Faker output, kept for realism
+        log_entries = []
+        for _ in range(log_count):
+            timestamp = fake.date_time_between(start_date=start_time, end_date=end_time)
+            level = random.choice(["INFO", "WARNING", "ERROR"])
+            message = fake.sentence()
+            log_entries.append(f"{timestamp.isoformat()} [{level}] {message}")
+        
+        return "\n".join(log_entries)
+    
+    # Draw all timestamps, levels and messages in bulk; same "ts [LEVEL] message" format
+    span_us = int((end_time - start_time).total_seconds() * 1_000_000)
+    offsets = (np.random.random(log_count) * span_us).astype("timedelta64[us]")
+    timestamps = np.datetime_as_string(np.datetime64(start_time, "us") + offsets, unit="us")
+    levels = LOG_LEVELS[np.random.randint(0, len(LOG_LEVELS), log_count)]
+    pool = get_log_message_pool()
+    messages = pool[np.random.randint(0, len(pool), log_count)]
     
-    return "\n".join(log_entries)
+    return "\n".join(map("{} [{}] {}".format, timestamps, levels, messages))
 
-def generate_job_runs(count=10000):
+def generate_job_runs(count=10000, end_date=None, strict_logs=False):
     for _ in range(count):
-        yield generate_job_run()
+        yield generate_job_run(end_date, strict_logs)
+
+JOB_RUNS_MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "job_id": {"type": "keyword"},
+            "start_time": {"type": "date"},
+            "end_time": {"type": "date"},
+            "duration_minutes": {"type": "float"},
+            "status": {"type": "keyword"},
+            "cpu_usage": {"type": "float"},
+            "memory_usage": {"type": "float"},
+            "disk_io": {"type": "float"},
+            "log_verbosity": {"type": "keyword"},
+            "logs": {"type": "text"}
+        }
+    }
+}
 
-def index_job_runs():
+def index_job_runs(count=10000, master_seed=None, workers=1, strict_logs=False, partitioned=False, backend=None,
+                   end_date=None, **ingest_options):
+    backend = backend or get_backend()
+    # Ordinal ids follow the seed, so a re-run addresses the same documents
+    ingest_options.setdefault("id_seed", master_seed)
+    end_date = anchor_date(master_seed, end_date)
+    
     def generate_actions():
-        for job_run in generate_job_runs():
+        # Shards are seeded from master_seed (and a seeded run anchors on a fixed date),
+        # so output is reproducible for any worker count
+        shards = [(shard_count, end_date, strict_logs) for shard_count, in split_count(count)]
+        job_runs = generate_sharded("job_run_data_generator", "generate_job_runs", shards, master_seed, workers)
+        for job_run in job_runs:
             yield {
                 "_index": "job_runs",
                 "_source": job_run
             }
     
-    # Create the index with appropriate mappings
-    index_mappings = {
-        "mappings": {
-            "properties": {
-                "job_id": {"type": "keyword"},
-                "start_time": {"type": "date"},
-                "end_time": {"type": "date"},
-                "duration_minutes": {"type": "float"},
-                "status": {"type": "keyword"},
-                "cpu_usage": {"type": "float"},
-                "memory_usage": {"type": "float"},
-                "disk_io": {"type": "float"},
-                "log_verbosity": {"type": "keyword"},
-                "logs": {"type": "text"}
-            }
-        }
-    }
-    
-    es.indices.create(index="job_runs", body=index_mappings, ignore=400)
+    # Create the index (or the monthly partition template) with appropriate mappings
+    prepare_index(backend, "job_runs", JOB_RUNS_MAPPINGS, partitioned)
     
     # Bulk index the job runs
-    success, failed = bulk(es, generate_actions())
-    print(f"Indexed {success} job runs. Failed: {failed}")
+    actions = generate_actions()
+    stats = ingest(route_actions(actions) if partitioned else actions, backend, **ingest_options)
+    print(f"Indexed {stats.success} job runs. Failed: {stats.failed}")
 
 if __name__ == "__main__":
     index_job_runs()
\ No newline at end of file
@@ -1,17 +1,14 @@
 import random
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import faker
 import uuid
 import networkx as nx
+from ingestion import ingest
+from storage_backend import get_backend
 
 # Initialize Faker for generating realistic data
 fake = faker.Faker()
 
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
-
 # Job types and their average durations (in minutes)
 JOB_TYPES = {
     "ETL": 120,
@@ -24,9 +21,14 @@ JOB_TYPES = {
     "Database Maintenance": 150
 }
 
-def generate_job(job_id, start_time):
+def generate_job(job_id, start_time, predictor=None):
     job_type = random.choice(list(JOB_TYPES.keys()))
-    duration = int(random.gauss(JOB_TYPES[job_type], JOB_TYPES[job_type] / 4))
+    # Draw from the historical runtime distribution when a RuntimePredictor has seen this job type
+    predicted = predictor.sample(job_type) if predictor is not None else None
+    if predicted is not None:
+        duration = int(round(predicted))
+    else:
+        duration = int(random.gauss(JOB_TYPES[job_type], JOB_TYPES[job_type] / 4))
     duration = max(1, duration)  # Ensure duration is at least 1 minute
     end_time = start_time + timedelta(minutes=duration)
     
@@ -39,9 +41,9 @@ def generate_job(job_id, start_time):
         "status": "scheduled"
     }
 
-def generate_schedule():
+def generate_schedule(num_jobs=None, predictor=None):
     schedule_id = str(uuid.uuid4())
-    num_jobs = random.randint(10, 50)
+    num_jobs = num_jobs or random.randint(10, 50)
     
     # Create a directed acyclic graph for job dependencies
     G = nx.DiGraph()
@@ -73,7 +75,7 @@ def generate_schedule():
             dep_end_times = [job_start_times[f"{schedule_id}-{dep}"] for dep in G.predecessors(node)]
             start_time = max(dep_end_times) if dep_end_times else start_date
         
-        job = generate_job(job_id, start_time)
+        job = generate_job(job_id, start_time, predictor)
         jobs.append(job)
         job_start_times[job_id] = datetime.fromisoformat(job['planned_end_time'])
     
@@ -87,46 +89,47 @@ def generate_schedule():
                          for source, target in G.edges()]
     }
 
-def generate_schedules(count=100):
+def generate_schedules(count=100, num_jobs=None, predictor=None):
     for _ in range(count):
-        yield generate_schedule()
+        yield generate_schedule(num_jobs, predictor)
 
-def index_schedules():
-    # Create index with appropriate mappings
-    index_mappings = {
-        "mappings": {
-            "properties": {
-                "schedule_id": {"type": "keyword"},
-                "name": {"type": "text"},
-                "description": {"type": "text"},
-                "created_at": {"type": "date"},
-                "jobs": {
-                    "type": "nested",
-                    "properties": {
-                        "job_id": {"type": "keyword"},
-                        "job_type": {"type": "keyword"},
-                        "planned_start_time": {"type": "date"},
-                        "planned_end_time": {"type": "date"},
-                        "duration_minutes": {"type": "integer"},
-                        "status": {"type": "keyword"}
-                    }
-                },
-                "dependencies": {
-                    "type": "nested",
-                    "properties": {
-                        "source": {"type": "keyword"},
-                        "target": {"type": "keyword"}
-                    }
+JOB_SCHEDULES_MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "schedule_id": {"type": "keyword"},
+            "name": {"type": "text"},
+            "description": {"type": "text"},
+            "created_at": {"type": "date"},
+            "jobs": {
+                "type": "nested",
+                "properties": {
+                    "job_id": {"type": "keyword"},
+                    "job_type": {"type": "keyword"},
+                    "planned_start_time": {"type": "date"},
+                    "planned_end_time": {"type": "date"},
+                    "duration_minutes": {"type": "integer"},
+                    "status": {"type": "keyword"}
+                }
+            },
+            "dependencies": {
+                "type": "nested",
+                "properties": {
+                    "source": {"type": "keyword"},
+                    "target": {"type": "keyword"}
                 }
             }
         }
     }
+}
+
+def index_schedules(predictor=None, backend=None, **ingest_options):
+    backend = backend or get_backend()
     
-    es.indices.create(index="job_schedules", body=index_mappings, ignore=400)
+    backend.create_index("job_schedules", JOB_SCHEDULES_MAPPINGS)
     
     # Bulk index the schedules
-    success, failed = bulk(es, ({"_index": "job_schedules", "_source": schedule} for schedule in generate_schedules(100)))
-    print(f"Indexed {success} job schedules. Failed: {failed}")
+    stats = ingest(({"_index": "job_schedules", "_source": schedule} for schedule in generate_schedules(100, predictor=predictor)), backend, **ingest_options)
+    print(f"Indexed {stats.success} job schedules. Failed: {stats.failed}")
 
 if __name__ == "__main__":
     index_schedules()
\ No newline at end of file
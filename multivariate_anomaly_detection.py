@@ -0,0 +1,303 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from incremental_refresh import next_window
+
+# Default location of the on-disk covariance cache
+DEFAULT_COVARIANCE_PATH = "covariance_cache.json"
+# Joint vector scored per (job_type, system_config)
+MV_METRICS = ["runtime_minutes", "cpu_usage_percent", "memory_usage_percent", "io_operations"]
+# Tail probability below which a run is flagged
+DEFAULT_ALPHA = 0.001
+# Keys with fewer runs than this are treated as having no baseline
+MIN_COUNT = 2 * len(MV_METRICS)
+# Ridge added to each variance, relative to its size, so near-singular groups stay invertible
+RIDGE = 1e-9
+ANOMALY_TYPES = ["runtime", "cpu", "memory", "io", "failure"]
+
+def chi2_sf(x, df):
+    # Survival function of the chi-square distribution. Exact for even df (a finite Poisson
+    # sum); Wilson-Hilferty cube-root normal approximation for odd df.
+    x = np.asarray(x, dtype=float)
+    half = x / 2
+    if df % 2 == 0:
+        term = np.ones_like(half)
+        total = np.ones_like(half)
+        for i in range(1, df // 2):
+            term = term * half / i
+            total = total + term
+        return np.exp(-half) * total
+    z = (np.cbrt(x / df) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+    return 0.5 * np.vectorize(math.erfc)(z / math.sqrt(2))
+
+def chi2_threshold(df, alpha=DEFAULT_ALPHA):
+    # Squared distance whose tail probability is alpha, by bisection on chi2_sf
+    low, high = 0.0, 1.0
+    while chi2_sf(high, df) > alpha:
+        high *= 2
+    for _ in range(100):
+        middle = (low + high) / 2
+        if chi2_sf(middle, df) > alpha:
+            low = middle
+        else:
+            high = middle
+    return high
+
+def merge_comoments(a, b):
+    # Chan et al. update of (count, mean vector, co-moment matrix) triples
+    count_a, mean_a, c_a = a
+    count_b, mean_b, c_b = b
+    count = count_a + count_b
+    if count == 0:
+        return a
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    comoment = c_a + c_b + np.outer(delta, delta) * count_a * count_b / count
+    return count, mean, comoment
+
+def records_to_block(jobs, metrics=MV_METRICS):
+    block = {
+        "job_type": np.array([job["job_type"] for job in jobs]),
+        "system_config": np.array([job["system_config"] for job in jobs])
+    }
+    for metric in metrics:
+        block[metric] = np.array([job[metric] for job in jobs], dtype=float)
+    return block
+
+def group_block(block):
+    # Integer code per (job_type, system_config) pair plus the pairs themselves
+    job_types, job_type_codes = np.unique(np.asarray(block["job_type"]), return_inverse=True)
+    configs, config_codes = np.unique(np.asarray(block["system_config"]), return_inverse=True)
+    pairs, codes = np.unique(job_type_codes.ravel() * len(configs) + config_codes.ravel(), return_inverse=True)
+    keys = [(str(job_types[pair // len(configs)]), str(configs[pair % len(configs)])) for pair in pairs.tolist()]
+    return keys, codes.ravel()
+
+class CovarianceStore:
+    def __init__(self, metrics=MV_METRICS, path=DEFAULT_COVARIANCE_PATH):
+        self.metrics = list(metrics)
+        self.path = path
+        # (job_type, system_config) -> (count, mean vector, co-moment matrix)
+        self.moments = {}
+        # Latest timestamp (epoch millis) folded in by refresh(), and the _ids of the documents
+        # at exactly that timestamp (see next_window)
+        self.high_water_mark = None
+        self.boundary_ids = []
+
+    @classmethod
+    def load(cls, path=DEFAULT_COVARIANCE_PATH):
+        store = cls(path=path)
+        if not os.path.exists(path):
+            return store
+
+        with open(path) as f:
+            data = json.load(f)
+
+        store.metrics = data["metrics"]
+        store.high_water_mark = data["high_water_mark"]
+        store.boundary_ids = data.get("boundary_ids", [])
+        for group in data["groups"]:
+            store.moments[(group["job_type"], group["system_config"])] = (
+                group["count"], np.array(group["mean"]), np.array(group["comoment"])
+            )
+        return store
+
+    def save(self):
+        data = {
+            "metrics": self.metrics,
+            "high_water_mark": self.high_water_mark,
+            "boundary_ids": self.boundary_ids,
+            "groups": [
+                {
+                    "job_type": job_type,
+                    "system_config": system_config,
+                    "count": count,
+                    "mean": mean.tolist(),
+                    "comoment": comoment.tolist()
+                }
+                for (job_type, system_config), (count, mean, comoment) in self.moments.items()
+            ]
+        }
+
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def merge(self, key, count, mean, comoment):
+        empty = (0, np.zeros(len(self.metrics)), np.zeros((len(self.metrics), len(self.metrics))))
+        self.moments[key] = merge_comoments(self.moments.get(key, empty), (count, mean, comoment))
+
+    def update_block(self, block, mask=None):
+        # Fold a columnar batch in; two-pass per group, so each batch is numerically stable
+        keys, codes = group_block(block)
+        values = np.column_stack([np.asarray(block[metric], dtype=float) for metric in self.metrics])
+        if mask is not None:
+            values, codes = values[mask], codes[mask]
+
+        order = np.argsort(codes, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0]) if len(order) else []
+        for start, end in zip(starts, list(starts[1:]) + [len(order)]):
+            rows = order[start:end]
+            group_values = values[rows]
+            mean = group_values.mean(axis=0)
+            centered = group_values - mean
+            self.merge(keys[codes[rows[0]]], len(rows), mean, centered.T @ centered)
+
+    def refresh(self, backend, index="historical_performance"):
+        # matrix_stats per group over documents not folded in yet (see next_window)
+        window = next_window(backend, index, self.high_water_mark, self.boundary_ids)
+        if window is None:
+            return 0
+
+        aggs = {"matrix": {"matrix_stats": {"fields": self.metrics}}}
+        new_docs = 0
+        for bucket in backend.aggregate(window["target"], ["job_type", "system_config"], aggs=aggs,
+                                        query=window["query"]):
+            matrix = bucket["matrix"]
+            count = matrix["doc_count"]
+            if count == 0:
+                continue
+            fields = {field["name"]: field for field in matrix["fields"]}
+            mean = np.array([fields[metric]["mean"] for metric in self.metrics])
+            if count < 2:
+                # A single document has no spread; Elasticsearch reports a non-finite covariance
+                comoment = np.zeros((len(self.metrics), len(self.metrics)))
+            else:
+                covariance = np.array([[fields[a]["covariance"][b] for b in self.metrics] for a in self.metrics])
+                # Sample covariance, so the co-moment is covariance * (n - 1)
+                comoment = covariance * (count - 1)
+            self.merge((bucket["key"]["job_type"], bucket["key"]["system_config"]), count, mean, comoment)
+            new_docs += count
+
+        self.high_water_mark, self.boundary_ids = window["mark"], window["boundary_ids"]
+        return new_docs
+
+    def model(self, alpha=DEFAULT_ALPHA, min_count=MIN_COUNT):
+        # Arrays for scoring: per-key mean and inverse covariance, keys coded like group_block
+        dims = len(self.metrics)
+        keys = [key for key, (count, _, _) in self.moments.items() if count >= min_count]
+        means = np.zeros((len(keys), dims))
+        inverses = np.zeros((len(keys), dims, dims))
+        for code, key in enumerate(keys):
+            count, mean, comoment = self.moments[key]
+            covariance = comoment / (count - 1)
+            covariance = covariance + np.diag(RIDGE * np.maximum(np.diag(covariance), 1e-12))
+            means[code] = mean
+            inverses[code] = np.linalg.inv(covariance)
+        return {
+            "metrics": self.metrics,
+            "keys": keys,
+            "codes": {key: code for code, key in enumerate(keys)},
+            "means": means,
+            "inverses": inverses,
+            "threshold": chi2_threshold(dims, alpha),
+            "alpha": alpha
+        }
+
+def score_block(block, model):
+    # Squared Mahalanobis distance per row, evaluated group by group with einsum
+    keys, codes = group_block(block)
+    key_codes = np.array([model["codes"].get(key, -1) for key in keys], dtype=np.int64)
+    model_codes = key_codes[codes] if len(keys) else np.zeros(0, dtype=np.int64)
+    values = np.column_stack([np.asarray(block[metric], dtype=float) for metric in model["metrics"]])
+
+    distances = np.zeros(len(values))
+    contributions = np.zeros_like(values)
+    for code in np.unique(model_codes[model_codes >= 0]):
+        rows = np.flatnonzero(model_codes == code)
+        diff = values[rows] - model["means"][code]
+        weighted = np.einsum("ij,jk->ik", diff, model["inverses"][code])
+        # Per-metric terms sum to the distance; the largest one names the driving metric
+        contributions[rows] = diff * weighted
+        distances[rows] = contributions[rows].sum(axis=1)
+
+    has_baseline = model_codes >= 0
+    return {
+        "distances": distances,
+        "p_values": np.where(has_baseline, chi2_sf(distances, len(model["metrics"])), 1.0),
+        "contributions": contributions,
+        "is_anomaly": has_baseline & (distances > model["threshold"]),
+        "has_baseline": has_baseline
+    }
+
+def fit_robust(block, metrics=MV_METRICS, trim_alpha=0.025, iterations=3):
+    # Refit after dropping rows beyond the trim_alpha chi-square tail of the previous fit, so
+    # contaminating anomalies stop inflating the covariance they are judged against
+    store = CovarianceStore(metrics)
+    store.update_block(block)
+    for _ in range(iterations):
+        model = store.model(alpha=trim_alpha)
+        mask = ~score_block(block, model)["is_anomaly"]
+        store = CovarianceStore(metrics)
+        store.update_block(block, mask)
+    return store
+
+def score_details(scores, metrics=MV_METRICS):
+    details = []
+    for row, is_anomaly in enumerate(scores["is_anomaly"].tolist()):
+        if not scores["has_baseline"][row]:
+            details.append("No baseline for this job type and system configuration")
+        elif is_anomaly:
+            driver = metrics[int(np.argmax(scores["contributions"][row]))]
+            details.append(f"Mahalanobis D2 {scores['distances'][row]:.2f} (p={scores['p_values'][row]:.2e}), "
+                           f"driven by {driver}")
+        else:
+            details.append("No anomalies detected")
+    return details
+
+def precision_recall(flags, labels):
+    # labels: anomaly_type per row, None for normal runs
+    labelled = np.array([label is not None for label in labels])
+    true_positives = int((flags & labelled).sum())
+    precision = true_positives / int(flags.sum()) if flags.any() else 0.0
+    recall = true_positives / int(labelled.sum()) if labelled.any() else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    per_type = {}
+    for anomaly_type in ANOMALY_TYPES:
+        rows = np.array([label == anomaly_type for label in labels])
+        if rows.any():
+            per_type[anomaly_type] = round(float(flags[rows].mean()), 3)
+    return {"precision": round(precision, 3), "recall": round(recall, 3), "f1": round(f1, 3),
+            "flagged": int(flags.sum()), "recall_by_type": per_type}
+
+if __name__ == "__main__":
+    import time
+
+    from anomaly_detection import METRIC_FIELDS, detect_anomalies_batch
+    from data_generator_anomalies import generate_dataset
+    from sharded_generation import seed_generators
+
+    # Seeded so the precision/recall figures below are reproducible
+    seed_generators(0)
+    jobs = generate_dataset(total_jobs=100000, num_anomalies=1000)
+    labels = [job.get("anomaly_type") for job in jobs]
+    block = records_to_block(jobs)
+
+    for name, store in (("co-moments", None), ("robust", fit_robust(block))):
+        if store is None:
+            store = CovarianceStore()
+            store.update_block(block)
+        model = store.model()
+        started = time.perf_counter()
+        scores = score_block(block, model)
+        elapsed = time.perf_counter() - started
+        print(f"multivariate ({name}): {precision_recall(scores['is_anomaly'], labels)}, "
+              f"{len(jobs) / elapsed:,.0f} rows/s")
+
+    # Univariate baseline for comparison, fitted on the same runs
+    univariate = {}
+    keys, codes = group_block(block)
+    for code, key in enumerate(keys):
+        rows = codes == code
+        univariate[key] = {
+            metric: (block[field][rows].mean(), block[field][rows].std())
+            for metric, field in zip(["runtime", "cpu_usage", "memory_usage"], METRIC_FIELDS)
+        }
+    started = time.perf_counter()
+    result = detect_anomalies_batch(block, univariate)
+    elapsed = time.perf_counter() - started
+    print(f"univariate: {precision_recall(result['is_anomaly'], labels)}, {len(jobs) / elapsed:,.0f} rows/s")
@@ -1,15 +1,12 @@
 import random
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import faker
 import json
+from ingestion import ingest
+from storage_backend import get_backend
 
 # Initialize Faker for generating realistic data
 fake = faker.Faker()
 
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
-
 # Define query templates and their corresponding answer templates
 QUERY_TEMPLATES = [
     {
@@ -87,7 +84,9 @@ def generate_query_answer_pair():
 def generate_dataset(size=500):
     return [generate_query_answer_pair() for _ in range(size)]
 
-def index_dataset(dataset):
+def index_dataset(dataset, backend=None, **ingest_options):
+    backend = backend or get_backend()
+    
     # Create index with appropriate mappings
     index_mappings = {
         "mappings": {
@@ -101,11 +100,11 @@ def index_dataset(dataset):
         }
     }
     
-    es.indices.create(index="nl_queries", body=index_mappings, ignore=400)
+    backend.create_index("nl_queries", index_mappings)
     
     # Bulk index the dataset
-    success, failed = bulk(es, ({"_index": "nl_queries", "_source": item} for item in dataset))
-    print(f"Indexed {success} query-answer pairs. Failed: {failed}")
+    stats = ingest(({"_index": "nl_queries", "_source": item} for item in dataset), backend, **ingest_options)
+    print(f"Indexed {stats.success} query-answer pairs. Failed: {stats.failed}")
 
 if __name__ == "__main__":
     dataset = generate_dataset(500)
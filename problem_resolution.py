@@ -1,15 +1,13 @@
 import random
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import faker
 import uuid
+from index_partitioning import prepare_index, route_actions
+from ingestion import ingest
+from storage_backend import get_backend
 
 # Initialize Faker for generating realistic data
 fake = faker.Faker()
 
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
-
 # Define common error types and their resolutions
 ERROR_TYPES = [
     {
@@ -81,22 +79,24 @@ def generate_troubleshooting_guides():
     for error_type in ERROR_TYPES:
         yield generate_troubleshooting_guide(error_type)
 
-def index_data():
-    # Create indices with appropriate mappings
-    error_logs_mapping = {
-        "mappings": {
-            "properties": {
-                "error_type": {"type": "keyword"},
-                "error_message": {"type": "text"},
-                "timestamp": {"type": "date"},
-                "job_id": {"type": "keyword"},
-                "possible_causes": {"type": "text"},
-                "resolution_steps": {"type": "text"},
-                "additional_context": {"type": "text"}
-            }
+ERROR_LOGS_MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "error_type": {"type": "keyword"},
+            "error_message": {"type": "text"},
+            "timestamp": {"type": "date"},
+            "job_id": {"type": "keyword"},
+            "possible_causes": {"type": "text"},
+            "resolution_steps": {"type": "text"},
+            "additional_context": {"type": "text"}
         }
     }
+}
+
+def index_data(partitioned=False, backend=None, **ingest_options):
+    backend = backend or get_backend()
     
+    # Create indices with appropriate mappings
     troubleshooting_guides_mapping = {
         "mappings": {
             "properties": {
@@ -121,16 +121,17 @@ def index_data():
         }
     }
     
-    es.indices.create(index="error_logs", body=error_logs_mapping, ignore=400)
-    es.indices.create(index="troubleshooting_guides", body=troubleshooting_guides_mapping, ignore=400)
+    prepare_index(backend, "error_logs", ERROR_LOGS_MAPPINGS, partitioned)
+    backend.create_index("troubleshooting_guides", troubleshooting_guides_mapping)
     
     # Bulk index the error logs
-    success, failed = bulk(es, ({"_index": "error_logs", "_source": log} for log in generate_error_logs()))
-    print(f"Indexed {success} error logs. Failed: {failed}")
+    actions = ({"_index": "error_logs", "_source": log} for log in generate_error_logs())
+    stats = ingest(route_actions(actions) if partitioned else actions, backend, **ingest_options)
+    print(f"Indexed {stats.success} error logs. Failed: {stats.failed}")
     
     # Bulk index the troubleshooting guides
-    success, failed = bulk(es, ({"_index": "troubleshooting_guides", "_source": guide} for guide in generate_troubleshooting_guides()))
-    print(f"Indexed {success} troubleshooting guides. Failed: {failed}")
+    stats = ingest(({"_index": "troubleshooting_guides", "_source": guide} for guide in generate_troubleshooting_guides()), backend, **ingest_options)
+    print(f"Indexed {stats.success} troubleshooting guides. Failed: {stats.failed}")
 
 if __name__ == "__main__":
     index_data()
\ No newline at end of file
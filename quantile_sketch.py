@@ -0,0 +1,306 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from baseline_store import BASELINE_METRICS
+from incremental_refresh import next_window
+from index_partitioning import partitions
+from multivariate_anomaly_detection import group_block
+from storage_backend import DEFAULT_SCAN_PAGE_SIZE
+
+# Default location of the persisted sketches
+DEFAULT_SKETCH_PATH = "quantile_sketches.npz"
+# t-digest compression: at most ~compression / 2 centroids per digest (two float64 arrays,
+# so ~1.6 KB at 200) however many values were added
+DEFAULT_COMPRESSION = 200
+# Values buffered per digest before they are merged into the centroids
+BUFFER_FACTOR = 20
+# Scale factor turning a MAD into a standard-deviation estimate for normal data
+MAD_TO_STD = 1.4826
+# Readers building sketches in parallel, one partition (or slice) each
+DEFAULT_WORKERS = 4
+
+def compress_centroids(means, weights, compression):
+    # Merging t-digest pass, vectorized: sort, then give every centroid the cluster of its
+    # left edge on the k1 scale k(q) = compression / 2pi * asin(2q - 1). Clusters are narrow
+    # near q = 0 and q = 1, so the tails keep their precision.
+    order = np.argsort(means, kind="stable")
+    means, weights = means[order], weights[order]
+    left = (np.cumsum(weights) - weights) / weights.sum()
+    clusters = np.floor(compression * (np.arcsin(2 * left - 1) / np.pi + 0.5) / 2)
+    starts = np.flatnonzero(np.r_[True, np.diff(clusters) != 0])
+    merged_weights = np.add.reduceat(weights, starts)
+    merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+    return merged_means, merged_weights
+
+class TDigest:
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = np.inf
+        self.max = -np.inf
+        self.buffer = []
+        self.buffered = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.buffer.append(values)
+        self.buffered += len(values)
+        if self.buffered >= BUFFER_FACTOR * self.compression:
+            self.compress()
+
+    def compress(self):
+        if not self.buffer:
+            return
+        means = np.concatenate([self.means] + self.buffer)
+        weights = np.concatenate([self.weights, np.ones(self.buffered)])
+        self.means, self.weights = compress_centroids(means, weights, self.compression)
+        self.buffer = []
+        self.buffered = 0
+
+    def merge(self, other):
+        # Digests are mergeable: sketches built on separate partitions combine into one
+        other.compress()
+        self.compress()
+        if len(other.weights) == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.means, self.weights = compress_centroids(np.concatenate([self.means, other.means]),
+                                                      np.concatenate([self.weights, other.weights]),
+                                                      self.compression)
+        return self
+
+    def count(self):
+        self.compress()
+        return float(self.weights.sum())
+
+    def _curve(self):
+        # Centroid means against the cumulative weight at their midpoints, anchored at min and max
+        self.compress()
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return np.r_[0.0, centers, total], np.r_[self.min, self.means, self.max], total
+
+    def quantile(self, q):
+        if len(self.weights) == 0 and not self.buffer:
+            return np.nan
+        ranks, values, total = self._curve()
+        return np.interp(np.asarray(q) * total, ranks, values)
+
+    def cdf(self, x):
+        if len(self.weights) == 0 and not self.buffer:
+            return np.nan
+        ranks, values, total = self._curve()
+        return np.interp(x, values, ranks) / total
+
+    def median_mad(self, iterations=60):
+        # MAD is the half-width m with CDF(median + m) - CDF(median - m) = 1/2, found by bisection
+        median = float(self.quantile(0.5))
+        low, high = 0.0, self.max - self.min
+        for _ in range(iterations):
+            middle = (low + high) / 2
+            if self.cdf(median + middle) - self.cdf(median - middle) < 0.5:
+                low = middle
+            else:
+                high = middle
+        return median, (low + high) / 2
+
+    def nbytes(self):
+        self.compress()
+        return self.means.nbytes + self.weights.nbytes
+
+class SketchStore:
+    def __init__(self, fields=tuple(BASELINE_METRICS.values()), compression=DEFAULT_COMPRESSION,
+                 path=DEFAULT_SKETCH_PATH):
+        self.fields = list(fields)
+        self.compression = compression
+        self.path = path
+        # (job_type, system_config, field) -> TDigest
+        self.digests = {}
+        # Latest timestamp (epoch millis) folded in by refresh(), and the _ids of the documents
+        # at exactly that timestamp (see next_window)
+        self.high_water_mark = None
+        self.boundary_ids = []
+
+    def digest(self, key):
+        digest = self.digests.get(key)
+        if digest is None:
+            digest = self.digests[key] = TDigest(self.compression)
+        return digest
+
+    def update_block(self, block):
+        keys, codes = group_block(block)
+        order = np.argsort(codes, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0]) if len(order) else []
+        for start, end in zip(starts, list(starts[1:]) + [len(order)]):
+            rows = order[start:end]
+            job_type, system_config = keys[codes[rows[0]]]
+            for field in self.fields:
+                self.digest((job_type, system_config, field)).update(np.asarray(block[field], dtype=float)[rows])
+
+    def merge(self, other):
+        for key, digest in other.digests.items():
+            self.digest(key).merge(digest)
+        return self
+
+    @classmethod
+    def load(cls, path=DEFAULT_SKETCH_PATH):
+        store = cls(path=path)
+        if not os.path.exists(path):
+            return store
+
+        with np.load(path) as data:
+            store.fields = data["fields"].tolist()
+            store.compression = int(data["compression"])
+            mark = int(data["high_water_mark"])
+            store.high_water_mark = None if mark < 0 else mark
+            store.boundary_ids = data["boundary_ids"].tolist() if "boundary_ids" in data.files else []
+            # Every NpzFile lookup decompresses the whole array, so read each one once
+            offsets = data["offsets"].tolist()
+            means, weights = data["means"], data["weights"]
+            mins, maxs = data["mins"].tolist(), data["maxs"].tolist()
+            keys = data["keys"].tolist()
+        for i, key in enumerate(keys):
+            digest = store.digest(tuple(key))
+            digest.means = means[offsets[i]:offsets[i + 1]].copy()
+            digest.weights = weights[offsets[i]:offsets[i + 1]].copy()
+            digest.min, digest.max = mins[i], maxs[i]
+        return store
+
+    def save(self):
+        # All digests in flat arrays with offsets; a few KB per group
+        keys = list(self.digests)
+        digests = [self.digests[key] for key in keys]
+        for digest in digests:
+            digest.compress()
+        offsets = np.cumsum([0] + [len(digest.means) for digest in digests])
+
+        # Write to a temporary file first so a crash never leaves a truncated file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                fields=np.array(self.fields),
+                compression=self.compression,
+                high_water_mark=-1 if self.high_water_mark is None else self.high_water_mark,
+                boundary_ids=np.array(self.boundary_ids, dtype=str),
+                keys=np.array(keys, dtype=str).reshape(len(keys), 3),
+                offsets=offsets,
+                means=np.concatenate([digest.means for digest in digests]) if digests else np.zeros(0),
+                weights=np.concatenate([digest.weights for digest in digests]) if digests else np.zeros(0),
+                mins=np.array([digest.min for digest in digests]),
+                maxs=np.array([digest.max for digest in digests])
+            )
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, backend, index="historical_performance", workers=DEFAULT_WORKERS,
+                page_size=DEFAULT_SCAN_PAGE_SIZE):
+        # Sketch documents not folded in yet (see next_window) in parallel (one reader per
+        # partition, or per slice of an unpartitioned index), then merge the partial sketches
+        window = next_window(backend, index, self.high_water_mark, self.boundary_ids)
+        if window is None:
+            return 0
+
+        target, query = window["target"], window["query"]
+        if partitions(backend, index):
+            tasks = [(name, 0, 1) for name in target.split(",")]
+        else:
+            tasks = [(target, slice_id, workers) for slice_id in range(workers)]
+        source = ["job_type", "system_config"] + self.fields
+
+        def build(task):
+            name, slice_id, slices = task
+            partial = SketchStore(self.fields, self.compression)
+            docs = 0
+            snapshot = backend.open_scan(name)
+            try:
+                for hits in backend.scan(snapshot, query, source, slice_id, slices, page_size):
+                    docs += len(hits)
+                    records = [hit["_source"] for hit in hits]
+                    partial.update_block({field: np.array([record[field] for record in records]) for field in source})
+            finally:
+                backend.close_scan(snapshot)
+            return partial, docs
+
+        new_docs = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for partial, docs in executor.map(build, tasks):
+                self.merge(partial)
+                new_docs += docs
+        self.high_water_mark, self.boundary_ids = window["mark"], window["boundary_ids"]
+        return new_docs
+
+    def robust_baselines(self):
+        # Same shape as calculate_baselines, with (median, 1.4826 * MAD) in place of (mean, std),
+        # so detect_anomaly and detect_anomalies_batch score robust z-scores unchanged
+        baselines = {}
+        for metric, field in BASELINE_METRICS.items():
+            for (job_type, system_config, digest_field), digest in self.digests.items():
+                if digest_field == field:
+                    median, mad = digest.median_mad()
+                    baselines.setdefault((job_type, system_config), {})[metric] = (median, MAD_TO_STD * mad)
+        return baselines
+
+    def percentile_thresholds(self, lower=0.005, upper=0.995):
+        # {(job_type, system_config): {metric: (low, high)}}; values outside are anomalous
+        thresholds = {}
+        for metric, field in BASELINE_METRICS.items():
+            for (job_type, system_config, digest_field), digest in self.digests.items():
+                if digest_field == field:
+                    low, high = digest.quantile([lower, upper])
+                    thresholds.setdefault((job_type, system_config), {})[metric] = (float(low), float(high))
+        return thresholds
+
+def detect_outside_thresholds(block, thresholds):
+    # Vectorized percentile check; rows without thresholds are never flagged
+    from anomaly_detection import METRIC_FIELDS, METRICS, encode_baseline_keys
+
+    keys = list(thresholds)
+    index = {"codes": {key: code for code, key in enumerate(keys)}}
+    codes = encode_baseline_keys(block["job_type"], block["system_config"], index)
+    has_baseline = codes >= 0
+    bounds = np.array([[thresholds[key][metric] for metric in METRICS] for key in keys]).reshape(len(keys), len(METRICS), 2)
+    values = np.column_stack([np.asarray(block[field], dtype=float) for field in METRIC_FIELDS])
+
+    if len(keys) == 0:
+        flags = np.zeros(values.shape, dtype=bool)
+    else:
+        selected = bounds[np.where(has_baseline, codes, 0)]
+        flags = ((values < selected[:, :, 0]) | (values > selected[:, :, 1])) & has_baseline[:, None]
+    return {"flags": flags, "is_anomaly": flags.any(axis=1), "has_baseline": has_baseline}
+
+def load_robust_baselines(backend, path=DEFAULT_SKETCH_PATH, refresh=True):
+    # Load persisted sketches and, optionally, fold in anything indexed since the last refresh
+    store = SketchStore.load(path)
+    if refresh:
+        if store.refresh(backend) > 0 or not os.path.exists(path):
+            store.save()
+    return store.robust_baselines()
+
+if __name__ == "__main__":
+    from anomaly_detection import detect_anomaly
+    from storage_backend import get_backend
+
+    store = SketchStore.load()
+    print(f"Sketched {store.refresh(get_backend())} new documents")
+    store.save()
+
+    baselines = store.robust_baselines()
+    new_job = {
+        "job_type": "ETL",
+        "system_config": "Standard",
+        "runtime_minutes": 100,
+        "cpu_usage_percent": 80,
+        "memory_usage_percent": 70
+    }
+    print(detect_anomaly(new_job, baselines))
+    sizes = [digest.nbytes() for digest in store.digests.values()]
+    print(f"{len(sizes)} digests, largest {max(sizes, default=0)} bytes")
@@ -0,0 +1,159 @@
+import json
+import os
+import random
+from datetime import timedelta
+
+import numpy as np
+
+from incremental_refresh import next_window
+
+# Default location of the on-disk runtime histogram cache
+DEFAULT_PREDICTOR_PATH = "runtime_predictor_cache.json"
+# Width of one runtime histogram bin in minutes
+DEFAULT_BIN_MINUTES = 1.0
+# Quantiles precomputed for every key so common lookups are a single dict access
+TABLE_QUANTILES = {"p10": 0.1, "p25": 0.25, "p50": 0.5, "p75": 0.75, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+
+class RuntimePredictor:
+    def __init__(self, path=DEFAULT_PREDICTOR_PATH, bin_minutes=DEFAULT_BIN_MINUTES):
+        self.path = path
+        self.bin_minutes = bin_minutes
+        # (job_type, system_config) -> {bin start (minutes): count}
+        self.counts = {}
+        # Latest historical_performance timestamp (epoch millis) folded into the histograms, and
+        # the _ids of the documents at exactly that timestamp (see next_window)
+        self.high_water_mark = None
+        self.boundary_ids = []
+        # key -> (bin edges, cumulative fractions); system_config None pools every config
+        self.distributions = {}
+        self.table = {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_PREDICTOR_PATH):
+        predictor = cls(path)
+        if not os.path.exists(path):
+            return predictor
+
+        with open(path) as f:
+            data = json.load(f)
+
+        predictor.bin_minutes = data["bin_minutes"]
+        predictor.high_water_mark = data["high_water_mark"]
+        predictor.boundary_ids = data.get("boundary_ids", [])
+        for group in data["groups"]:
+            key = (group["job_type"], group["system_config"])
+            predictor.counts[key] = {float(start): count for start, count in group["bins"]}
+        predictor.build()
+        return predictor
+
+    def save(self):
+        data = {
+            "bin_minutes": self.bin_minutes,
+            "high_water_mark": self.high_water_mark,
+            "boundary_ids": self.boundary_ids,
+            "groups": [
+                {"job_type": job_type, "system_config": system_config, "bins": sorted(bins.items())}
+                for (job_type, system_config), bins in self.counts.items()
+            ]
+        }
+
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, backend, index="historical_performance"):
+        # Histogram counts are additive, so only documents not folded in yet are aggregated
+        window = next_window(backend, index, self.high_water_mark, self.boundary_ids)
+        if window is None:
+            return 0
+
+        sources = [
+            "job_type",
+            "system_config",
+            {"runtime_bin": {"histogram": {"field": "runtime_minutes", "interval": self.bin_minutes}}}
+        ]
+
+        new_docs = 0
+        for bucket in backend.aggregate(window["target"], sources, query=window["query"]):
+            key = (bucket["key"]["job_type"], bucket["key"]["system_config"])
+            bins = self.counts.setdefault(key, {})
+            start = float(bucket["key"]["runtime_bin"])
+            bins[start] = bins.get(start, 0) + bucket["doc_count"]
+            new_docs += bucket["doc_count"]
+
+        self.high_water_mark, self.boundary_ids = window["mark"], window["boundary_ids"]
+        if new_docs:
+            self.build()
+        return new_docs
+
+    def build(self):
+        # Turn bin counts into cumulative distributions, per key and pooled per job type
+        pooled = {}
+        for (job_type, _), bins in self.counts.items():
+            merged = pooled.setdefault((job_type, None), {})
+            for start, count in bins.items():
+                merged[start] = merged.get(start, 0) + count
+
+        self.distributions = {}
+        self.table = {}
+        for key, bins in list(self.counts.items()) + list(pooled.items()):
+            starts = np.array(sorted(bins))
+            counts = np.array([bins[start] for start in starts], dtype=float)
+            edges = np.r_[starts, starts[-1] + self.bin_minutes]
+            cumulative = np.r_[0.0, np.cumsum(counts)] / counts.sum()
+            self.distributions[key] = (edges, cumulative)
+
+            row = {name: float(np.interp(q, cumulative, edges)) for name, q in TABLE_QUANTILES.items()}
+            row["mean"] = float(np.dot(starts + self.bin_minutes / 2, counts) / counts.sum())
+            row["count"] = int(counts.sum())
+            self.table[key] = row
+
+    def lookup_key(self, job_type, system_config=None):
+        # Fall back to the job type pooled over configs when the pair has no history
+        if (job_type, system_config) in self.table:
+            return job_type, system_config
+        if (job_type, None) in self.table:
+            return job_type, None
+        return None
+
+    def predict(self, job_type, system_config=None):
+        key = self.lookup_key(job_type, system_config)
+        return self.table[key] if key is not None else None
+
+    def quantile(self, job_type, system_config=None, q=0.5):
+        # Linear interpolation inside the bin holding the q-th fraction of runs
+        key = self.lookup_key(job_type, system_config)
+        if key is None:
+            return None
+        edges, cumulative = self.distributions[key]
+        return float(np.interp(q, cumulative, edges))
+
+    def sample(self, job_type, system_config=None, rng=random):
+        # Inverse-CDF draw from the historical distribution
+        return self.quantile(job_type, system_config, rng.random())
+
+    def estimate_completion(self, job_type, start_time, system_config=None, quantile="p50"):
+        row = self.predict(job_type, system_config)
+        if row is None:
+            return None
+        return start_time + timedelta(minutes=row[quantile])
+
+def load_predictor(backend, path=DEFAULT_PREDICTOR_PATH, refresh=True):
+    # Load cached histograms and, optionally, fold in anything indexed since the last refresh
+    predictor = RuntimePredictor.load(path)
+    if refresh:
+        if predictor.refresh(backend) > 0 or not os.path.exists(path):
+            predictor.save()
+    return predictor
+
+if __name__ == "__main__":
+    from datetime import datetime
+
+    from storage_backend import get_backend
+
+    predictor = load_predictor(get_backend())
+    for (job_type, system_config), row in sorted(predictor.table.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+        print(f"{job_type} / {system_config or 'all'}: p50 {row['p50']:.1f} min, p95 {row['p95']:.1f} min ({row['count']} runs)")
+    print(f"ETL started now finishes by {predictor.estimate_completion('ETL', datetime.now(), quantile='p95')} (p95)")
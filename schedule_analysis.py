@@ -0,0 +1,164 @@
+import numpy as np
+
+from storage_backend import get_backend
+
+def build_csr(n, sources, targets):
+    # Compressed sparse row adjacency: the successors of node i are indices[indptr[i]:indptr[i + 1]]
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return indptr, targets[order]
+
+def gather_rows(indptr, indices, nodes):
+    # Concatenated CSR rows of `nodes`, plus the row length of each node
+    starts = indptr[nodes]
+    lengths = indptr[nodes + 1] - starts
+    row_offsets = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - row_offsets, lengths) + np.arange(lengths.sum())
+    return indices[positions], lengths
+
+def schedules_to_graph(schedules):
+    # Pack any number of schedules into one disjoint graph with contiguous node ranges,
+    # so a single pass analyses all of them at once
+    schedule_ids = []
+    job_ids = []
+    job_types = []
+    durations = []
+    sources = []
+    targets = []
+    offsets = [0]
+
+    for schedule in schedules:
+        base = len(job_ids)
+        position = {job["job_id"]: base + i for i, job in enumerate(schedule["jobs"])}
+        job_ids.extend(job["job_id"] for job in schedule["jobs"])
+        job_types.extend(job["job_type"] for job in schedule["jobs"])
+        durations.extend(job["duration_minutes"] for job in schedule["jobs"])
+        for dependency in schedule["dependencies"]:
+            sources.append(position[dependency["source"]])
+            targets.append(position[dependency["target"]])
+        schedule_ids.append(schedule["schedule_id"])
+        offsets.append(len(job_ids))
+
+    return {
+        "schedule_ids": schedule_ids,
+        "job_ids": job_ids,
+        "job_types": job_types,
+        "offsets": np.array(offsets, dtype=np.int64),
+        "durations": np.array(durations, dtype=float),
+        "sources": np.array(sources, dtype=np.int64),
+        "targets": np.array(targets, dtype=np.int64)
+    }
+
+def analyze_graph(graph):
+    # Critical path method over the whole graph in O(jobs + dependencies). Nodes are
+    # processed one topological level at a time (Kahn's algorithm), each level as array ops.
+    durations = graph["durations"]
+    offsets = graph["offsets"]
+    n = len(durations)
+    indptr, successors = build_csr(n, graph["sources"], graph["targets"])
+    remaining = np.bincount(graph["targets"], minlength=n)
+
+    earliest_start = np.zeros(n)
+    levels = []
+    frontier = np.flatnonzero(remaining == 0)
+    while frontier.size:
+        levels.append(frontier)
+        children, lengths = gather_rows(indptr, successors, frontier)
+        if not children.size:
+            break
+        np.maximum.at(earliest_start, children, np.repeat(earliest_start[frontier] + durations[frontier], lengths))
+        unique, counts = np.unique(children, return_counts=True)
+        remaining[unique] -= counts
+        frontier = unique[remaining[unique] == 0]
+
+    if sum(len(level) for level in levels) != n:
+        raise ValueError("Schedule dependencies contain a cycle")
+
+    earliest_finish = earliest_start + durations
+    schedule_of = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    makespan = np.zeros(len(offsets) - 1)
+    np.maximum.at(makespan, schedule_of, earliest_finish)
+
+    # Backward pass in reverse level order: successors are always final before their parents
+    latest_finish = makespan[schedule_of]
+    for frontier in reversed(levels):
+        children, lengths = gather_rows(indptr, successors, frontier)
+        if not children.size:
+            continue
+        has_children = lengths > 0
+        row_starts = (np.cumsum(lengths) - lengths)[has_children]
+        child_latest_start = latest_finish[children] - durations[children]
+        nodes = frontier[has_children]
+        latest_finish[nodes] = np.minimum(latest_finish[nodes], np.minimum.reduceat(child_latest_start, row_starts))
+
+    latest_start = latest_finish - durations
+    slack = latest_start - earliest_start
+
+    return {
+        "earliest_start": earliest_start,
+        "earliest_finish": earliest_finish,
+        "latest_start": latest_start,
+        "slack": slack,
+        "critical": slack <= 1e-9,
+        "makespan": makespan,
+        "depth": len(levels),
+        "successors": (indptr, successors)
+    }
+
+def critical_path(graph, analysis, schedule_index):
+    # Walk one zero-slack chain from a critical start job to a job finishing at the makespan
+    indptr, successors = analysis["successors"]
+    first, last = graph["offsets"][schedule_index], graph["offsets"][schedule_index + 1]
+    if first == last:
+        return []
+
+    critical = analysis["critical"]
+    starts = np.flatnonzero(critical[first:last] & (analysis["earliest_start"][first:last] == 0)) + first
+    current = int(starts[0])
+    path = [current]
+    while True:
+        children = successors[indptr[current]:indptr[current + 1]]
+        chained = children[critical[children] &
+                           (analysis["earliest_start"][children] == analysis["earliest_finish"][current])]
+        if not chained.size:
+            break
+        current = int(chained[0])
+        path.append(current)
+
+    return [graph["job_ids"][node] for node in path]
+
+def schedule_summaries(graph, analysis):
+    for i, schedule_id in enumerate(graph["schedule_ids"]):
+        first, last = graph["offsets"][i], graph["offsets"][i + 1]
+        path = critical_path(graph, analysis, i)
+        yield {
+            "schedule_id": schedule_id,
+            "jobs": int(last - first),
+            "makespan_minutes": float(analysis["makespan"][i]),
+            "critical_jobs": int(analysis["critical"][first:last].sum()),
+            "total_slack_minutes": float(analysis["slack"][first:last].sum()),
+            "critical_path": path
+        }
+
+def analyze_schedules(schedules):
+    graph = schedules_to_graph(schedules)
+    return graph, analyze_graph(graph)
+
+def load_schedules(backend=None, index="job_schedules", page_size=500):
+    # Point-in-time scan: no max_result_window limit and constant cost per page. Documents
+    # come back in index order, not by schedule_id.
+    backend = backend or get_backend()
+    snapshot = backend.open_scan(index)
+    try:
+        for hits in backend.scan(snapshot, source=["schedule_id", "jobs", "dependencies"], page_size=page_size):
+            for hit in hits:
+                yield hit["_source"]
+    finally:
+        backend.close_scan(snapshot)
+
+if __name__ == "__main__":
+    graph, analysis = analyze_schedules(load_schedules())
+    for summary in schedule_summaries(graph, analysis):
+        print(f"{summary['schedule_id']}: {summary['jobs']} jobs, makespan {summary['makespan_minutes']:.0f} min, "
+              f"{summary['critical_jobs']} critical, path length {len(summary['critical_path'])}")
@@ -0,0 +1,90 @@
+import importlib
+import random
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import instrumentation
+from ingestion import ingest
+
+# Records per count-based shard; shard boundaries never depend on the worker count
+DEFAULT_SHARD_SIZE = 10000
+DEFAULT_DAYS_PER_SHARD = 30
+# Seeded runs anchor their time window here instead of on datetime.now(), so the same
+# master_seed regenerates identical documents (and ordinal ids) on every run
+SEEDED_ANCHOR_DATE = datetime(2024, 1, 1)
+
+def random_uuid():
+    # uuid4 drawn from the (seedable) random module instead of os.urandom
+    return uuid.UUID(int=random.getrandbits(128), version=4)
+
+def shard_seed(master_seed, shard_index):
+    # Independent, reproducible seed per shard derived from the master seed
+    return int(np.random.SeedSequence(master_seed, spawn_key=(shard_index,)).generate_state(1, np.uint64)[0])
+
+def seed_generators(seed, module=None):
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    fake = getattr(module, "fake", None)
+    if fake is not None:
+        fake.seed_instance(seed)
+
+def anchor_date(master_seed, anchor=None):
+    if anchor is not None:
+        return anchor
+    return SEEDED_ANCHOR_DATE if master_seed is not None else datetime.now()
+
+def split_count(count, shard_size=DEFAULT_SHARD_SIZE):
+    return [(min(shard_size, count - start),) for start in range(0, count, shard_size)]
+
+def split_date_range(start_date, end_date, days_per_shard=DEFAULT_DAYS_PER_SHARD):
+    # Generators iterate whole days with `current <= end`, so shards cover disjoint day runs
+    shards = []
+    shard_start = start_date
+    while shard_start <= end_date:
+        shard_end = min(shard_start + timedelta(days=days_per_shard - 1), end_date)
+        shards.append((shard_start, shard_end))
+        shard_start = shard_end + timedelta(days=1)
+    return shards
+
+def run_shard(task):
+    module_name, function_name, args, seed = task
+    module = importlib.import_module(module_name)
+    seed_generators(seed, module)
+    # Recorded in the process that runs the shard, so only in-process (workers=1) runs show up
+    with instrumentation.timer("generate.shard"):
+        records = list(getattr(module, function_name)(*args))
+    instrumentation.count("generate.records", len(records))
+    return records
+
+def generate_sharded(module_name, function_name, shard_args, master_seed=None, workers=1):
+    # Run module.function(*args) once per shard, each seeded from master_seed and the shard
+    # index, and yield records in shard order. Output is identical for any worker count.
+    # At most 2 * workers shards are buffered, so results stream straight into ingestion.
+    if master_seed is None:
+        master_seed = random.randrange(2 ** 63)
+    tasks = [(module_name, function_name, tuple(args), shard_seed(master_seed, i)) for i, args in enumerate(shard_args)]
+
+    if workers <= 1:
+        for task in tasks:
+            yield from run_shard(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(run_shard, task))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def index_sharded(index, module_name, function_name, shard_args, master_seed=None, workers=1,
+                  backend=None, **ingest_options):
+    records = generate_sharded(module_name, function_name, shard_args, master_seed, workers)
+    # Ordinal ids follow the seed, so a re-run addresses the same documents
+    ingest_options.setdefault("id_seed", master_seed)
+    return ingest(({"_index": index, "_source": record} for record in records), backend, **ingest_options)
@@ -1,42 +1,38 @@
-from elasticsearch import Elasticsearch
 import numpy as np
+import instrumentation
+from baseline_store import load_baselines
+from index_partitioning import range_query, search_target
+from storage_backend import get_backend
 
-es = Elasticsearch(["http://localhost:9200"])
-
-def calculate_baselines():
-    query = {
-        "size": 0,
-        "aggs": {
-            "job_types": {
-                "terms": {"field": "job_type"},
-                "aggs": {
-                    "configs": {
-                        "terms": {"field": "system_config"},
-                        "aggs": {
-                            "runtime_stats": {"extended_stats": {"field": "runtime_minutes"}},
-                            "cpu_stats": {"extended_stats": {"field": "cpu_usage_percent"}},
-                            "memory_stats": {"extended_stats": {"field": "memory_usage_percent"}}
-                        }
-                    }
-                }
-            }
-        }
+@instrumentation.timed("aggregate.baselines")
+def calculate_baselines(backend=None, start=None, end=None):
+    backend = backend or get_backend()
+    
+    # Only partitions overlapping the window are searched
+    index = search_target(backend, "historical_performance", start, end)
+    if index is None:
+        return {}
+    
+    aggs = {
+        "runtime_stats": {"extended_stats": {"field": "runtime_minutes"}},
+        "cpu_stats": {"extended_stats": {"field": "cpu_usage_percent"}},
+        "memory_stats": {"extended_stats": {"field": "memory_usage_percent"}}
     }
     
-    results = es.search(index="historical_performance", body=query)
+    # Composite paging returns every (job_type, system_config) group, not just the top 10 terms
     baselines = {}
-    
-    for job_type in results["aggregations"]["job_types"]["buckets"]:
-        for config in job_type["configs"]["buckets"]:
-            key = (job_type["key"], config["key"])
-            baselines[key] = {
-                "runtime": (config["runtime_stats"]["avg"], config["runtime_stats"]["std_deviation"]),
-                "cpu_usage": (config["cpu_stats"]["avg"], config["cpu_stats"]["std_deviation"]),
-                "memory_usage": (config["memory_stats"]["avg"], config["memory_stats"]["std_deviation"])
-            }
+    for bucket in backend.aggregate(index, ["job_type", "system_config"], aggs=aggs,
+                                    query=range_query("timestamp", start, end)):
+        key = (bucket["key"]["job_type"], bucket["key"]["system_config"])
+        baselines[key] = {
+            "runtime": (bucket["runtime_stats"]["avg"], bucket["runtime_stats"]["std_deviation"]),
+            "cpu_usage": (bucket["cpu_stats"]["avg"], bucket["cpu_stats"]["std_deviation"]),
+            "memory_usage": (bucket["memory_stats"]["avg"], bucket["memory_stats"]["std_deviation"])
+        }
     
     return baselines
 
+@instrumentation.timed("score.record")
 def detect_anomaly(job, baselines, threshold=3):
     key = (job["job_type"], job["system_config"])
     if key not in baselines:
@@ -58,18 +54,21 @@ def detect_anomaly(job, baselines, threshold=3):
     
     return is_anomaly, details
 
-# Usage
-baselines = calculate_baselines()
+if __name__ == "__main__":
+    # Usage
+    # Cached baselines are refreshed with new historical_performance documents only;
+    # calculate_baselines() still recomputes them from the full index
+    baselines = load_baselines(get_backend())
 
-# Example job run
-new_job = {
-    "job_type": "ETL",
-    "system_config": "Standard",
-    "runtime_minutes": 100,
-    "cpu_usage_percent": 80,
-    "memory_usage_percent": 70
-}
+    # Example job run
+    new_job = {
+        "job_type": "ETL",
+        "system_config": "Standard",
+        "runtime_minutes": 100,
+        "cpu_usage_percent": 80,
+        "memory_usage_percent": 70
+    }
 
-is_anomaly, details = detect_anomaly(new_job, baselines)
-print(f"Anomaly detected: {is_anomaly}")
-print(f"Details: {details}")
\ No newline at end of file
+    is_anomaly, details = detect_anomaly(new_job, baselines)
+    print(f"Anomaly detected: {is_anomaly}")
+    print(f"Details: {details}")
@@ -0,0 +1,911 @@
+import fnmatch
+import json
+import os
+import re
+import threading
+import time
+import warnings
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+from elasticsearch.exceptions import NotFoundError
+from elasticsearch.helpers import BulkIndexError, bulk
+
+from composite_aggregation import DEFAULT_PAGE_SIZE, iter_composite_buckets
+from es_client import get_client
+
+# Mapping types stored as float64 columns in the columnar store
+NUMERIC_TYPES = {"float", "double", "half_float", "scaled_float", "long", "integer", "short", "byte"}
+INTEGER_TYPES = {"long", "integer", "short", "byte"}
+
+# Default percentiles reported by the percentiles aggregation, as in Elasticsearch
+DEFAULT_PERCENTS = [1, 5, 25, 50, 75, 95, 99]
+
+DATE_MATH_UNITS_MS = {"s": 1000, "m": 60000, "h": 3600000, "d": 86400000, "w": 604800000}
+DATE_MATH_PATTERN = re.compile(r"^now(?:([+-])(\d+)([smhdw]))?$")
+
+# Sorted composite groupings kept for paging; each entry holds row indices for one query
+COMPOSITE_CACHE_SIZE = 8
+
+# Default page size and point-in-time keep-alive for full-index scans
+DEFAULT_SCAN_PAGE_SIZE = 5000
+DEFAULT_KEEP_ALIVE = "5m"
+
+class StorageBackend:
+    # Operations every generator and detector needs from a document store
+    def create_index(self, index, body=None):
+        raise NotImplementedError
+
+    def bulk(self, actions, **kwargs):
+        raise NotImplementedError
+
+    def search(self, index, body):
+        raise NotImplementedError
+
+    def mget(self, index, ids, source=None):
+        # Realtime lookup by _id (sees documents not yet refreshed): {_id: _source} of those found
+        raise NotImplementedError
+
+    def aggregate(self, index, group_by, aggs=None, query=None, page_size=DEFAULT_PAGE_SIZE):
+        # Stream every group of a composite aggregation; backends answer the same search
+        # bodies, so the pager works unchanged for both
+        return iter_composite_buckets(self, index, group_by, aggs=aggs, query=query, page_size=page_size)
+
+    def open_scan(self, index, keep_alive=DEFAULT_KEEP_ALIVE):
+        # Consistent snapshot of an index that any number of slices can then read
+        raise NotImplementedError
+
+    def scan(self, snapshot, query=None, source=None, slice_id=0, slices=1, page_size=DEFAULT_SCAN_PAGE_SIZE):
+        # Yield pages of hits for one slice of a snapshot
+        raise NotImplementedError
+
+    def close_scan(self, snapshot):
+        pass
+
+    def put_index_template(self, name, body):
+        # Composable template: {"index_patterns": [...], "template": {"mappings": ..., "aliases": ...}}
+        raise NotImplementedError
+
+    def update_aliases(self, actions):
+        raise NotImplementedError
+
+    def delete_index(self, index):
+        raise NotImplementedError
+
+    def list_indices(self, pattern):
+        raise NotImplementedError
+
+class ElasticsearchBackend(StorageBackend):
+    def __init__(self, es=None):
+        self._es = es
+
+    @property
+    def es(self):
+        # Without an explicit client, always use the current shared one (see es_client.configure)
+        return self._es if self._es is not None else get_client()
+
+    def create_index(self, index, body=None):
+        self.es.indices.create(index=index, body=body, ignore=400)
+
+    def bulk(self, actions, **kwargs):
+        return bulk(self.es, actions, **kwargs)
+
+    def search(self, index, body):
+        return self.es.search(index=index, body=body)
+
+    def mget(self, index, ids, source=None):
+        if not ids:
+            return {}
+        results = self.es.mget(index=index, body={"ids": list(ids)}, _source_includes=source)
+        return {doc["_id"]: doc["_source"] for doc in results["docs"] if doc.get("found")}
+
+    def aggregate(self, index, group_by, aggs=None, query=None, page_size=DEFAULT_PAGE_SIZE):
+        return iter_composite_buckets(self.es, index, group_by, aggs=aggs, query=query, page_size=page_size)
+
+    def open_scan(self, index, keep_alive=DEFAULT_KEEP_ALIVE):
+        pit = self.es.open_point_in_time(index=index, keep_alive=keep_alive)
+        return {"id": pit["id"], "keep_alive": keep_alive}
+
+    def scan(self, snapshot, query=None, source=None, slice_id=0, slices=1, page_size=DEFAULT_SCAN_PAGE_SIZE):
+        # Point-in-time + search_after in _shard_doc order (7.12+); no scroll contexts to clean up
+        body = {
+            "size": page_size,
+            "pit": {"id": snapshot["id"], "keep_alive": snapshot["keep_alive"]},
+            "sort": ["_shard_doc"],
+            "track_total_hits": False
+        }
+        if query is not None:
+            body["query"] = query
+        if source is not None:
+            body["_source"] = source
+        if slices > 1:
+            body["slice"] = {"id": slice_id, "max": slices}
+
+        while True:
+            results = self.es.search(body=body)
+            hits = results["hits"]["hits"]
+            if not hits:
+                break
+            yield hits
+            body["search_after"] = hits[-1]["sort"]
+            # The PIT id can change between requests; always continue with the latest one
+            body["pit"]["id"] = results.get("pit_id", body["pit"]["id"])
+
+    def close_scan(self, snapshot):
+        self.es.close_point_in_time(body={"id": snapshot["id"]})
+
+    def put_index_template(self, name, body):
+        self.es.indices.put_index_template(name=name, body=body)
+
+    def update_aliases(self, actions):
+        self.es.indices.update_aliases(body={"actions": actions})
+
+    def delete_index(self, index):
+        self.es.indices.delete(index=index, ignore=[400, 404])
+
+    def list_indices(self, pattern):
+        return sorted(self.es.indices.get(index=pattern, allow_no_indices=True, ignore_unavailable=True))
+
+def flatten_mapping(properties, prefix=""):
+    # Flatten object properties into dotted field names; nested fields stay opaque
+    fields = {}
+    for name, spec in properties.items():
+        field = f"{prefix}{name}"
+        if "properties" in spec and spec.get("type", "object") == "object":
+            fields.update(flatten_mapping(spec["properties"], f"{field}."))
+        else:
+            fields[field] = spec.get("type", "object")
+    return fields
+
+def get_path(source, field):
+    value = source
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def parse_date(value):
+    if value is None:
+        return np.datetime64("NaT", "ms")
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return np.datetime64(int(value), "ms")
+    if isinstance(value, str):
+        match = DATE_MATH_PATTERN.match(value)
+        if match:
+            now_ms = int(time.time() * 1000)
+            if match.group(1):
+                offset = int(match.group(2)) * DATE_MATH_UNITS_MS[match.group(3)]
+                now_ms += offset if match.group(1) == "+" else -offset
+            return np.datetime64(now_ms, "ms")
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "ms")
+
+def to_datetime64(values):
+    # Fast path for naive ISO strings and datetimes; fall back per value for offsets and epochs
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            return np.array(values, dtype="datetime64[ms]")
+    except (ValueError, TypeError, UserWarning, DeprecationWarning):
+        return np.array([parse_date(value) for value in values], dtype="datetime64[ms]")
+
+def to_epoch_millis(values):
+    return values.astype("datetime64[ms]").astype(np.int64)
+
+def format_date(epoch_millis):
+    return f"{np.datetime_as_string(np.datetime64(int(epoch_millis), 'ms'), unit='ms')}Z"
+
+def infer_type(values):
+    # Rough equivalent of Elasticsearch dynamic mapping for unmapped fields
+    sample = next((value for value in values if value is not None), None)
+    if isinstance(sample, bool):
+        return "boolean"
+    if isinstance(sample, (int, float)):
+        return "double"
+    if isinstance(sample, str):
+        try:
+            datetime.fromisoformat(sample.replace("Z", "+00:00"))
+            return "date"
+        except ValueError:
+            return "keyword"
+    return None if sample is None else "object"
+
+def native(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+class ColumnarIndex:
+    # Documents are kept as _source dicts (for hits) and materialized lazily into
+    # per-field NumPy columns that are extended incrementally as documents arrive
+    def __init__(self, name, mappings=None):
+        self.name = name
+        self.field_types = flatten_mapping((mappings or {}).get("properties", {}))
+        self.sources = []
+        self.ids = []
+        self.id_positions = {}
+        self.columns = {}
+        self.live = np.zeros(0, dtype=bool)
+        self.deleted = 0
+        self.next_id = 0
+        # Bumped on every write so cached results over this index can be recognised as stale
+        self.version = 0
+        # Guards documents and materialized columns; searches read while bulk writers append
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.sources)
+
+    def field_type(self, field):
+        with self.lock:
+            if field not in self.field_types:
+                inferred = infer_type(get_path(source, field) for source in self.sources if source is not None)
+                if inferred is None:
+                    return "object"
+                self.field_types[field] = inferred
+            return self.field_types[field]
+
+    def _convert(self, field, values):
+        field_type = self.field_type(field)
+        if field_type in NUMERIC_TYPES:
+            return np.array([np.nan if value is None else value for value in values], dtype=float)
+        if field_type == "date":
+            return to_datetime64(values)
+        if field_type == "boolean":
+            return np.array([None if value is None else bool(value) for value in values], dtype=object)
+        return np.fromiter(values, dtype=object, count=len(values))
+
+    def column(self, field, length=None):
+        # The first `length` rows (all by default), extending the cached column as needed
+        with self.lock:
+            cached = self.columns.get(field)
+            start = 0 if cached is None else len(cached)
+            if cached is None or start < len(self.sources):
+                values = [None if source is None else get_path(source, field) for source in self.sources[start:]]
+                converted = self._convert(field, values)
+                cached = converted if cached is None else np.concatenate([cached, converted])
+                self.columns[field] = cached
+            return cached if length is None else cached[:length]
+
+    def live_mask(self, length=None):
+        with self.lock:
+            if len(self.live) < len(self.sources):
+                self.live = np.concatenate([self.live, np.ones(len(self.sources) - len(self.live), dtype=bool)])
+            return self.live if length is None else self.live[:length]
+
+    def _patch(self, position, source):
+        # An overwrite or delete only replaces its own row in the columns materialized so far
+        for field, column in self.columns.items():
+            if position < len(column):
+                value = None if source is None else get_path(source, field)
+                column[position] = self._convert(field, [value])[0]
+
+    def write(self, doc_id, source, op_type="index"):
+        with self.lock:
+            return self._write(doc_id, source, op_type)
+
+    def _write(self, doc_id, source, op_type):
+        self.version += 1
+        if doc_id is None:
+            doc_id = f"{self.name}-{self.next_id}"
+            self.next_id += 1
+
+        position = self.id_positions.get(doc_id)
+
+        if op_type == "delete":
+            if position is None:
+                return False
+            self.sources[position] = None
+            self.live_mask()[position] = False
+            self.deleted += 1
+            del self.id_positions[doc_id]
+            self._patch(position, None)
+            return True
+
+        if op_type == "create" and position is not None:
+            return False
+
+        if op_type == "update":
+            if position is None:
+                if not source.get("doc_as_upsert"):
+                    return False
+                source = source["doc"]
+            else:
+                merged = dict(self.sources[position])
+                merged.update(source["doc"])
+                source = merged
+
+        if position is None:
+            self.id_positions[doc_id] = len(self.sources)
+            self.sources.append(source)
+            self.ids.append(doc_id)
+        else:
+            self.sources[position] = source
+            self._patch(position, source)
+        return True
+
+class IndexView:
+    # Read-only concatenation of one or more indices (comma lists and wildcard patterns),
+    # pinned to the documents present when it was created, so every column of a search
+    # has the same rows while writers keep appending
+    def __init__(self, indices):
+        self.indices = indices
+        self.lengths = []
+        self.versions = []
+        for index in indices:
+            with index.lock:
+                self.lengths.append(len(index))
+                self.versions.append(index.version)
+
+    def __len__(self):
+        return sum(self.lengths)
+
+    def field_type(self, field):
+        field_types = [index.field_type(field) for index in self.indices]
+        return next((field_type for field_type in field_types if field_type != "object"), "object")
+
+    def column(self, field):
+        if len(self.indices) == 1:
+            return self.indices[0].column(field, self.lengths[0])
+        return np.concatenate([index.column(field, length) for index, length in zip(self.indices, self.lengths)])
+
+    def live_mask(self):
+        if len(self.indices) == 1:
+            return self.indices[0].live_mask(self.lengths[0])
+        return np.concatenate([index.live_mask(length) for index, length in zip(self.indices, self.lengths)]
+                              or [np.zeros(0, dtype=bool)])
+
+    def ids(self):
+        return [doc_id for index, length in zip(self.indices, self.lengths) for doc_id in index.ids[:length]]
+
+    def hit(self, row, includes=None):
+        for index, length in zip(self.indices, self.lengths):
+            if row < length:
+                source = index.sources[row]
+                if includes is not None:
+                    source = {field: get_path(source, field) for field in includes}
+                return {"_index": index.name, "_id": index.ids[row], "_source": source}
+            row -= length
+
+    def present(self, field):
+        column = self.column(field)
+        if column.dtype == object:
+            return np.array([value is not None for value in column], dtype=bool)
+        if column.dtype.kind == "M":
+            return ~np.isnat(column)
+        return ~np.isnan(column)
+
+def coerce(view, field, value):
+    field_type = view.field_type(field)
+    if field_type == "date":
+        return parse_date(value)
+    if field_type in NUMERIC_TYPES:
+        return float(value)
+    if field_type == "boolean" and isinstance(value, str):
+        return value == "true"
+    return value
+
+def evaluate_query(view, query):
+    live = view.live_mask()
+    if not query:
+        return live.copy()
+
+    kind, spec = next(iter(query.items()))
+    if kind == "match_all":
+        return live.copy()
+
+    if kind == "term":
+        field, value = next(iter(spec.items()))
+        if isinstance(value, dict):
+            value = value["value"]
+        return live & (view.column(field) == coerce(view, field, value))
+
+    if kind == "terms":
+        field, values = next(iter(spec.items()))
+        column = view.column(field)
+        mask = np.zeros(len(column), dtype=bool)
+        for value in values:
+            mask |= column == coerce(view, field, value)
+        return live & mask
+
+    if kind == "range":
+        field, bounds = next(iter(spec.items()))
+        column = view.column(field)
+        mask = view.present(field)
+        for op, compare in (("gt", np.greater), ("gte", np.greater_equal), ("lt", np.less), ("lte", np.less_equal)):
+            if op in bounds:
+                bound = bounds[op]
+                if view.field_type(field) == "date":
+                    bound = parse_date(int(bound) if bounds.get("format") == "epoch_millis" else bound)
+                else:
+                    bound = float(bound)
+                mask &= compare(column, bound)
+        return live & mask
+
+    if kind == "exists":
+        return live & view.present(spec["field"])
+
+    if kind == "ids":
+        wanted = set(spec["values"])
+        ids = view.ids()
+        return live & np.array([doc_id in wanted for doc_id in ids], dtype=bool)
+
+    if kind == "bool":
+        mask = live.copy()
+        for clause in spec.get("must", []) + spec.get("filter", []):
+            mask &= evaluate_query(view, clause)
+        should = spec.get("should", [])
+        if should:
+            required = spec.get("minimum_should_match", 0 if ("must" in spec or "filter" in spec) else 1)
+            matches = sum(evaluate_query(view, clause).astype(int) for clause in should)
+            mask &= matches >= required
+        for clause in spec.get("must_not", []):
+            mask &= ~evaluate_query(view, clause)
+        return mask
+
+    raise NotImplementedError(f"Unsupported query in columnar backend: {kind}")
+
+def numeric_values(view, field, rows):
+    column = view.column(field)[rows]
+    if column.dtype.kind == "M":
+        column = column[~np.isnat(column)]
+        return to_epoch_millis(column).astype(float), True
+    if column.dtype == object:
+        column = np.array([value for value in column if value is not None], dtype=float)
+    return column[~np.isnan(column)], False
+
+def metric_result(is_date, value):
+    result = {"value": value}
+    if is_date and value is not None:
+        result["value_as_string"] = format_date(value)
+    return result
+
+def group_keys(view, source, rows):
+    kind, spec = next(iter(source.items()))
+    column = view.column(spec["field"])[rows]
+    field_type = view.field_type(spec["field"])
+
+    if column.dtype.kind == "M":
+        present = ~np.isnat(column)
+        keys = to_epoch_millis(column)
+    elif column.dtype == object:
+        present = np.array([value is not None for value in column], dtype=bool)
+        keys = column
+    else:
+        present = ~np.isnan(column)
+        keys = column
+
+    if kind == "histogram":
+        keys = np.floor(keys.astype(float) / spec["interval"]) * spec["interval"]
+    elif kind == "date_histogram":
+        interval = spec.get("fixed_interval") or spec.get("calendar_interval") or spec.get("interval")
+        interval_ms = parse_interval(interval)
+        keys = (keys // interval_ms) * interval_ms
+    elif field_type in INTEGER_TYPES:
+        keys = np.where(present, keys, 0).astype(np.int64)
+
+    return keys, present
+
+def parse_interval(interval):
+    named = {"second": "1s", "minute": "1m", "hour": "1h", "day": "1d", "week": "1w"}
+    interval = named.get(interval, interval)
+    return int(interval[:-1]) * DATE_MATH_UNITS_MS[interval[-1]]
+
+def factorize(keys):
+    values, codes = np.unique(keys, return_inverse=True)
+    return values, codes.ravel()
+
+def grouped_rows(view, sources, rows):
+    # Factorize each source, combine the codes and split rows per group, in key order
+    present = np.ones(len(rows), dtype=bool)
+    per_source = []
+    for name, source in sources:
+        keys, source_present = group_keys(view, source, rows)
+        present &= source_present
+        per_source.append(keys)
+
+    rows = rows[present]
+    if len(rows) == 0:
+        return []
+
+    uniques = []
+    codes = []
+    for keys in per_source:
+        values, source_codes = factorize(keys[present])
+        uniques.append(values)
+        codes.append(source_codes)
+
+    combined = np.ravel_multi_index(codes, [len(values) for values in uniques]) if len(codes) > 1 else codes[0]
+    group_codes, inverse = np.unique(combined, return_inverse=True)
+    order = np.argsort(inverse.ravel(), kind="stable")
+    boundaries = np.cumsum(np.bincount(inverse.ravel(), minlength=len(group_codes)))[:-1]
+
+    groups = []
+    for group_code, group_rows in zip(group_codes, np.split(rows[order], boundaries)):
+        indices = np.unravel_index(group_code, [len(values) for values in uniques]) if len(codes) > 1 else (group_code,)
+        key = {name: native(values[i]) for (name, _), values, i in zip(sources, uniques, indices)}
+        groups.append((key, group_rows))
+    return groups
+
+_composite_cache = OrderedDict()
+_composite_cache_lock = threading.Lock()
+
+def composite_groups(view, sources, rows, query_key=None):
+    # Every composite page is a new search over the same rows, so the sorted grouping is
+    # cached per (indices and their versions, sources, query); a page is then a bisect
+    cache_key = None
+    if query_key is not None:
+        cache_key = (tuple((index.name, id(index), version) for index, version in zip(view.indices, view.versions)),
+                     json.dumps(sources, sort_keys=True, default=str), query_key)
+        with _composite_cache_lock:
+            cached = _composite_cache.get(cache_key)
+            if cached is not None:
+                _composite_cache.move_to_end(cache_key)
+                return cached
+
+    groups = grouped_rows(view, sources, rows)
+    cached = (groups, [tuple(key[name] for name, _ in sources) for key, _ in groups])
+    if cache_key is not None:
+        with _composite_cache_lock:
+            _composite_cache[cache_key] = cached
+            while len(_composite_cache) > COMPOSITE_CACHE_SIZE:
+                _composite_cache.popitem(last=False)
+    return cached
+
+def run_aggregations(view, aggs, rows, query_key=None):
+    # query_key identifies the rows of a top-level search; sub-aggregations run without one
+    return {name: run_aggregation(view, agg, rows, query_key) for name, agg in (aggs or {}).items()}
+
+def run_aggregation(view, agg, rows, query_key=None):
+    sub_aggs = agg.get("aggs") or agg.get("aggregations")
+    kind = next(key for key in agg if key not in ("aggs", "aggregations"))
+    spec = agg[kind]
+
+    if kind == "value_count":
+        return {"value": int(view.present(spec["field"])[rows].sum())}
+
+    if kind == "cardinality":
+        present = view.present(spec["field"])[rows]
+        return {"value": len({native(value) for value in view.column(spec["field"])[rows][present]})}
+
+    if kind in ("avg", "sum", "min", "max"):
+        values, is_date = numeric_values(view, spec["field"], rows)
+        if len(values) == 0:
+            return metric_result(is_date, 0.0 if kind == "sum" else None)
+        value = {"avg": np.mean, "sum": np.sum, "min": np.min, "max": np.max}[kind](values)
+        return metric_result(is_date, float(value))
+
+    if kind in ("stats", "extended_stats"):
+        values, _ = numeric_values(view, spec["field"], rows)
+        count = len(values)
+        if count == 0:
+            result = {"count": 0, "min": None, "max": None, "avg": None, "sum": 0.0}
+            if kind == "extended_stats":
+                result.update({"sum_of_squares": None, "variance": None, "variance_population": None,
+                               "variance_sample": None, "std_deviation": None,
+                               "std_deviation_population": None, "std_deviation_sample": None})
+            return result
+
+        result = {"count": count, "min": float(values.min()), "max": float(values.max()),
+                  "avg": float(values.mean()), "sum": float(values.sum())}
+        if kind == "extended_stats":
+            variance = float(values.var())
+            variance_sample = float(values.var(ddof=1)) if count > 1 else 0.0
+            sigma = spec.get("sigma", 2)
+            result.update({
+                "sum_of_squares": float(np.dot(values, values)),
+                "variance": variance,
+                "variance_population": variance,
+                "variance_sample": variance_sample,
+                "std_deviation": variance ** 0.5,
+                "std_deviation_population": variance ** 0.5,
+                "std_deviation_sample": variance_sample ** 0.5,
+                "std_deviation_bounds": {
+                    "upper": result["avg"] + sigma * variance ** 0.5,
+                    "lower": result["avg"] - sigma * variance ** 0.5
+                }
+            })
+        return result
+
+    if kind == "matrix_stats":
+        # Documents missing any of the fields are skipped; variance and covariance are
+        # sample statistics (n - 1), as in Elasticsearch
+        fields = spec["fields"]
+        present = np.ones(len(rows), dtype=bool)
+        for field in fields:
+            present &= view.present(field)[rows]
+        selected = rows[present]
+        count = len(selected)
+        if count == 0:
+            return {"doc_count": 0}
+
+        values = np.column_stack([numeric_values(view, field, selected)[0] for field in fields])
+        means = values.mean(axis=0)
+        centered = values - means
+        covariance = centered.T @ centered / (count - 1) if count > 1 else np.zeros((len(fields), len(fields)))
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = covariance / np.outer(std, std)
+            population = np.diag(centered.T @ centered) / count
+            skewness = (centered ** 3).mean(axis=0) / population ** 1.5
+            kurtosis = (centered ** 4).mean(axis=0) / population ** 2
+        return {
+            "doc_count": count,
+            "fields": [
+                {
+                    "name": field,
+                    "count": count,
+                    "mean": float(means[i]),
+                    "variance": float(covariance[i, i]),
+                    "skewness": float(skewness[i]),
+                    "kurtosis": float(kurtosis[i]),
+                    "covariance": {other: float(covariance[i, j]) for j, other in enumerate(fields)},
+                    "correlation": {other: float(correlation[i, j]) for j, other in enumerate(fields)}
+                }
+                for i, field in enumerate(fields)
+            ]
+        }
+
+    if kind == "percentiles":
+        values, _ = numeric_values(view, spec["field"], rows)
+        percents = spec.get("percents", DEFAULT_PERCENTS)
+        if len(values) == 0:
+            return {"values": {str(float(p)): None for p in percents}}
+        results = np.percentile(values, percents)
+        return {"values": {str(float(p)): float(v) for p, v in zip(percents, results)}}
+
+    if kind == "filter":
+        mask = evaluate_query(view, spec)
+        filtered = rows[mask[rows]]
+        result = {"doc_count": len(filtered)}
+        result.update(run_aggregations(view, sub_aggs, filtered))
+        return result
+
+    if kind in ("terms", "histogram", "date_histogram"):
+        name = spec["field"]
+        groups = grouped_rows(view, [(name, {kind: spec})], rows)
+        buckets = []
+        for key, group_rows in groups:
+            bucket = {"key": key[name], "doc_count": len(group_rows)}
+            if kind == "date_histogram":
+                bucket["key_as_string"] = format_date(bucket["key"])
+            bucket.update(run_aggregations(view, sub_aggs, group_rows))
+            buckets.append(bucket)
+        if kind != "terms":
+            return {"buckets": buckets}
+
+        # Same truncation semantics as Elasticsearch: top `size` terms by doc count
+        buckets.sort(key=lambda bucket: -bucket["doc_count"])
+        size = spec.get("size", 10)
+        return {
+            "doc_count_error_upper_bound": 0,
+            "sum_other_doc_count": sum(bucket["doc_count"] for bucket in buckets[size:]),
+            "buckets": buckets[:size]
+        }
+
+    if kind == "composite":
+        sources = [next(iter(source.items())) for source in spec["sources"]]
+        groups, group_keys_sorted = composite_groups(view, sources, rows, query_key)
+        after = spec.get("after")
+        first = 0
+        if after is not None:
+            first = bisect_right(group_keys_sorted, tuple(after[name] for name, _ in sources))
+
+        buckets = []
+        for key, group_rows in groups[first:first + spec.get("size", 10)]:
+            bucket = {"key": key, "doc_count": len(group_rows)}
+            bucket.update(run_aggregations(view, sub_aggs, group_rows))
+            buckets.append(bucket)
+
+        result = {"buckets": buckets}
+        if buckets:
+            result["after_key"] = buckets[-1]["key"]
+        return result
+
+    raise NotImplementedError(f"Unsupported aggregation in columnar backend: {kind}")
+
+class ColumnarBackend(StorageBackend):
+    # In-process store answering the subset of the search API used by this project
+    def __init__(self):
+        self.indices = {}
+        self.templates = {}
+        # alias -> {index: is_write_index}
+        self.aliases = {}
+        # Serializes writers so concurrent ingestion workers can share one store
+        self.lock = threading.Lock()
+
+    def create_index(self, index, body=None):
+        if index in self.indices or index in self.aliases:
+            return
+
+        # Like Elasticsearch, a new index picks up the highest-priority matching template
+        template = {}
+        matching = [t for t in self.templates.values()
+                    if any(fnmatch.fnmatchcase(index, pattern) for pattern in t["index_patterns"])]
+        if matching:
+            template = max(matching, key=lambda t: t.get("priority", 0)).get("template", {})
+
+        mappings = (body or {}).get("mappings") or template.get("mappings")
+        self.indices[index] = ColumnarIndex(index, mappings)
+        for alias, options in template.get("aliases", {}).items():
+            self.aliases.setdefault(alias, {})[index] = options.get("is_write_index", False)
+
+    def put_index_template(self, name, body):
+        self.templates[name] = body
+
+    def update_aliases(self, actions):
+        with self.lock:
+            for action in actions:
+                kind, spec = next(iter(action.items()))
+                indices = [name for name in self.indices if fnmatch.fnmatchcase(name, spec["index"])]
+                members = self.aliases.setdefault(spec["alias"], {})
+                for name in indices:
+                    if kind == "add":
+                        members[name] = spec.get("is_write_index", False)
+                    elif kind == "remove":
+                        members.pop(name, None)
+                if not members:
+                    self.aliases.pop(spec["alias"])
+
+    def delete_index(self, index):
+        with self.lock:
+            for name in [name for name in self.indices if fnmatch.fnmatchcase(name, index)]:
+                del self.indices[name]
+                for alias in list(self.aliases):
+                    self.aliases[alias].pop(name, None)
+                    if not self.aliases[alias]:
+                        del self.aliases[alias]
+
+    def list_indices(self, pattern):
+        return sorted(name for name in self.indices if fnmatch.fnmatchcase(name, pattern))
+
+    def write_index(self, index):
+        # Writes to an alias go to its write index (or its only index)
+        if index not in self.aliases:
+            return index
+        members = self.aliases[index]
+        writable = [name for name, is_write in members.items() if is_write]
+        if writable:
+            return writable[0]
+        if len(members) == 1:
+            return next(iter(members))
+        raise ValueError(f"Alias [{index}] has more than one index and no write index")
+
+    def resolve(self, index):
+        # Writers may add indices and aliases meanwhile; list() copies the keys atomically
+        names = []
+        for pattern in index.split(","):
+            matches = sorted(name for name in list(self.indices) if fnmatch.fnmatchcase(name, pattern))
+            for alias in sorted(alias for alias in list(self.aliases) if fnmatch.fnmatchcase(alias, pattern)):
+                matches.extend(sorted(self.aliases.get(alias, {})))
+            if not matches:
+                raise NotFoundError(404, "index_not_found_exception", {"index": pattern})
+            names.extend(name for name in matches if name not in names)
+        return IndexView([self.indices[name] for name in names])
+
+    def bulk(self, actions, **kwargs):
+        with self.lock:
+            success, errors = self._write_actions(actions)
+
+        # Mirror elasticsearch.helpers.bulk, which raises on item errors unless told otherwise
+        if errors and kwargs.get("raise_on_error", True):
+            raise BulkIndexError(f"{len(errors)} document(s) failed to index.", errors)
+        return success, len(errors) if kwargs.get("stats_only") else errors
+
+    def mget(self, index, ids, source=None):
+        found = {}
+        with self.lock:
+            target = self.indices.get(self.write_index(index))
+            if target is None:
+                raise NotFoundError(404, "index_not_found_exception", {"index": index})
+            for doc_id in ids:
+                position = target.id_positions.get(doc_id)
+                if position is not None:
+                    doc = target.sources[position]
+                    found[doc_id] = doc if source is None else {field: get_path(doc, field) for field in source}
+        return found
+
+    def _write_actions(self, actions):
+        success = 0
+        errors = []
+        for action in actions:
+            action = dict(action)
+            index = action.pop("_index")
+            op_type = action.pop("_op_type", "index")
+            doc_id = action.pop("_id", None)
+            if op_type == "update":
+                source = action.get("_source", action)
+            else:
+                source = action.pop("_source", action)
+
+            index = self.write_index(index)
+            self.create_index(index)
+            if self.indices[index].write(doc_id, source, op_type):
+                success += 1
+            else:
+                errors.append({op_type: {"_index": index, "_id": doc_id, "status": 404 if op_type != "create" else 409}})
+        return success, errors
+
+    def open_scan(self, index, keep_alive=DEFAULT_KEEP_ALIVE):
+        # Rows live at open time; later deletes and new documents are not seen by the scan
+        view = self.resolve(index)
+        rows = np.flatnonzero(view.live_mask())
+        return {"view": view, "rows": rows}
+
+    def scan(self, snapshot, query=None, source=None, slice_id=0, slices=1, page_size=DEFAULT_SCAN_PAGE_SIZE):
+        view = snapshot["view"]
+        rows = snapshot["rows"]
+        if query is not None:
+            rows = rows[evaluate_query(view, query)[rows]]
+        rows = rows[slice_id::slices]
+
+        includes = source.get("includes") if isinstance(source, dict) else source
+        includes = includes if isinstance(includes, list) else None
+        for start in range(0, len(rows), page_size):
+            yield [view.hit(row, includes) for row in rows[start:start + page_size].tolist()]
+
+    def search(self, index, body):
+        start = time.perf_counter()
+        body = body or {}
+        view = self.resolve(index)
+        mask = evaluate_query(view, body.get("query"))
+        rows = np.flatnonzero(mask)
+
+        response = {"hits": {"total": {"value": len(rows), "relation": "eq"}, "hits": []}}
+
+        size = body.get("size", 10)
+        if size:
+            for sort in reversed(body.get("sort", [])):
+                field, order = (sort, "asc") if isinstance(sort, str) else next(iter(sort.items()))
+                if field == "_doc":
+                    continue
+                if isinstance(order, dict):
+                    order = order.get("order", "asc")
+                keys = view.column(field)[rows]
+                order_rows = np.argsort(keys, kind="stable")
+                rows = rows[order_rows[::-1] if order == "desc" else order_rows]
+
+            includes = body.get("_source")
+            if isinstance(includes, dict):
+                includes = includes.get("includes")
+            if includes is True:
+                includes = None
+
+            offset = body.get("from", 0)
+            response["hits"]["hits"] = [
+                view.hit(row, includes if isinstance(includes, list) else None)
+                for row in rows[offset:offset + size]
+            ]
+
+        aggs = body.get("aggs") or body.get("aggregations")
+        if aggs:
+            # Queries with "now" date math match different rows over time, so they are not cached
+            query_key = json.dumps(body.get("query"), sort_keys=True, default=str)
+            response["aggregations"] = run_aggregations(view, aggs, np.flatnonzero(mask),
+                                                        None if "now" in query_key else query_key)
+
+        response["took"] = int((time.perf_counter() - start) * 1000)
+        return response
+
+# Process-wide default backend, selected with STORAGE_BACKEND=elasticsearch|columnar
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+def get_backend():
+    # Created on first use; the Elasticsearch backend uses the shared es_client client
+    global _default_backend
+    if _default_backend is None:
+        with _default_backend_lock:
+            if _default_backend is None:
+                if os.environ.get("STORAGE_BACKEND", "elasticsearch") == "columnar":
+                    _default_backend = ColumnarBackend()
+                else:
+                    _default_backend = ElasticsearchBackend()
+    return _default_backend
+
+def set_backend(backend):
+    global _default_backend
+    _default_backend = backend
@@ -1,11 +1,8 @@
-import random
-from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+from datetime import datetime
 import numpy as np
-
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
+from index_partitioning import prepare_index, route_actions
+from ingestion import ingest
+from storage_backend import get_backend
 
 # Define the start and end dates for our data
 START_DATE = datetime(2023, 1, 1)
@@ -21,62 +18,108 @@ METRICS = [
     {"name": "network_out", "unit": "Mbps", "min": 0, "max": 1000},
 ]
 
-def generate_metric_value(metric, timestamp):
-    # Generate a base value using a sine wave for some periodicity
-    base_value = np.sin(timestamp.hour / 24 * 2 * np.pi) * 0.5 + 0.5
+# Default sampling interval and number of timestamps generated per block
+DEFAULT_RESOLUTION_SECONDS = 300
+DEFAULT_BLOCK_SIZE = 100000
+
+def generate_metric_block(metric, base_value, noise):
+    # Scale the shared periodic base to the metric's range and add noise
+    value_range = metric["max"] - metric["min"]
+    values = base_value * value_range + metric["min"] + noise * value_range
+    
+    # Ensure the values are within the defined range
+    return np.round(np.clip(values, metric["min"], metric["max"]), 2)
+
+def iter_metric_blocks(start=START_DATE, end=END_DATE, resolution_seconds=DEFAULT_RESOLUTION_SECONDS,
+                       hosts=None, block_size=DEFAULT_BLOCK_SIZE):
+    # Yield (timestamps, host, {metric: values}) arrays covering start..end inclusive,
+    # block_size timestamps at a time per host
+    total = int((end - start).total_seconds() // resolution_seconds) + 1
+    start_seconds = np.datetime64(start, "s").astype(np.int64)
     
-    # Add some random noise
-    noise = np.random.normal(0, 0.1)
+    # Seeded from the global NumPy state so seed_generators() still makes runs reproducible
+    rng = np.random.default_rng(np.random.randint(2 ** 63, dtype=np.int64))
     
-    # Scale to the metric's range and add noise
-    value = base_value * (metric["max"] - metric["min"]) + metric["min"] + noise * (metric["max"] - metric["min"])
+    # Generate a base value using a sine wave over the hour of day for some periodicity
+    base_by_hour = np.sin(np.arange(24) / 24 * 2 * np.pi) * 0.5 + 0.5
     
-    # Ensure the value is within the defined range
-    return max(metric["min"], min(metric["max"], value))
+    for host in hosts or [None]:
+        for offset in range(0, total, block_size):
+            seconds = start_seconds + np.arange(offset, min(offset + block_size, total), dtype=np.int64) * resolution_seconds
+            base_value = base_by_hour[(seconds // 3600) % 24]
+            
+            # Add some random noise
+            noise = rng.standard_normal((len(METRICS), len(seconds)))
+            noise *= 0.1
+            values = {
+                metric["name"]: generate_metric_block(metric, base_value, noise[i])
+                for i, metric in enumerate(METRICS)
+            }
+            yield seconds.astype("datetime64[s]"), host, values
 
-def generate_metrics(timestamp):
-    return {
-        metric["name"]: round(generate_metric_value(metric, timestamp), 2)
-        for metric in METRICS
-    }
+def block_documents(timestamps, host, values):
+    # Convert one block into a batch of documents ready for ingestion
+    names = [metric["name"] for metric in METRICS]
+    iso_timestamps = np.datetime_as_string(timestamps, unit="s").tolist()
+    rows = zip(*(values[name].tolist() for name in names))
+    batch = [
+        {"timestamp": timestamp, "metrics": dict(zip(names, row))}
+        for timestamp, row in zip(iso_timestamps, rows)
+    ]
+    if host is not None:
+        for doc in batch:
+            doc["host"] = host
+    return batch
 
-def generate_system_metrics():
-    current_time = START_DATE
-    while current_time <= END_DATE:
-        yield {
-            "timestamp": current_time.isoformat(),
-            "metrics": generate_metrics(current_time)
-        }
-        current_time += timedelta(minutes=5)  # Generate data every 5 minutes
+def generate_system_metric_batches(start=START_DATE, end=END_DATE, resolution_seconds=DEFAULT_RESOLUTION_SECONDS,
+                                   hosts=None, block_size=DEFAULT_BLOCK_SIZE):
+    for timestamps, host, values in iter_metric_blocks(start, end, resolution_seconds, hosts, block_size):
+        yield block_documents(timestamps, host, values)
+
+def generate_system_metrics(start=START_DATE, end=END_DATE, resolution_seconds=DEFAULT_RESOLUTION_SECONDS, hosts=None):
+    for batch in generate_system_metric_batches(start, end, resolution_seconds, hosts):
+        yield from batch
 
-def index_system_metrics():
-    # Create index with appropriate mappings
-    index_mappings = {
-        "mappings": {
-            "properties": {
-                "timestamp": {"type": "date"},
-                "metrics": {
-                    "properties": {
-                        metric["name"]: {"type": "float"}
-                        for metric in METRICS
-                    }
+SYSTEM_METRICS_MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "timestamp": {"type": "date"},
+            "host": {"type": "keyword"},
+            "metrics": {
+                "properties": {
+                    metric["name"]: {"type": "float"}
+                    for metric in METRICS
                 }
             }
         }
     }
+}
+
+def index_system_metrics(start=START_DATE, end=END_DATE, resolution_seconds=DEFAULT_RESOLUTION_SECONDS, hosts=None,
+                         rollup=None, partitioned=False, backend=None, **ingest_options):
+    backend = backend or get_backend()
     
-    es.indices.create(index="system_metrics", body=index_mappings, ignore=400)
+    prepare_index(backend, "system_metrics", SYSTEM_METRICS_MAPPINGS, partitioned)
     
     # Bulk index the system metrics
     def generate_actions():
-        for data in generate_system_metrics():
-            yield {
-                "_index": "system_metrics",
-                "_source": data
-            }
+        for timestamps, host, values in iter_metric_blocks(start, end, resolution_seconds, hosts):
+            # Feed the rollup tiers from the same arrays while they are still in memory
+            if rollup is not None:
+                rollup.update_block(timestamps, host, values)
+            for data in block_documents(timestamps, host, values):
+                yield {
+                    "_index": "system_metrics",
+                    "_source": data
+                }
     
-    success, failed = bulk(es, generate_actions())
-    print(f"Indexed {success} system metric records. Failed: {failed}")
+    actions = generate_actions()
+    stats = ingest(route_actions(actions) if partitioned else actions, backend, **ingest_options)
+    print(f"Indexed {stats.success} system metric records. Failed: {stats.failed}")
+
+    if rollup is not None:
+        written = rollup.write(backend, **ingest_options)
+        print(f"Wrote {written} system metric rollup buckets.")
 
 if __name__ == "__main__":
     index_system_metrics()
@@ -0,0 +1,336 @@
+import json
+import os
+
+import numpy as np
+
+from index_partitioning import search_target
+from ingestion import ingest
+from storage_backend import get_backend
+from system_metrics_generator import DEFAULT_RESOLUTION_SECONDS, METRICS
+
+# Rollup tiers, finest first: name -> bucket width in seconds
+ROLLUP_TIERS = {"1h": 3600, "1d": 86400}
+RAW_INDEX = "system_metrics"
+# Sampling interval of the raw index, used to tell whether raw data fits a point budget
+RAW_RESOLUTION_SECONDS = DEFAULT_RESOLUTION_SECONDS
+# Open buckets carried between runs so a boundary bucket is never overwritten with partial data
+DEFAULT_ROLLUP_STATE_PATH = "system_metrics_rollup.json"
+
+def rollup_index(tier):
+    return f"system_metrics_{tier}"
+
+def rollup_mappings():
+    return {
+        "mappings": {
+            "properties": {
+                "timestamp": {"type": "date"},
+                "host": {"type": "keyword"},
+                "count": {"type": "long"},
+                "metrics": {
+                    "properties": {
+                        metric["name"]: {
+                            "properties": {
+                                "min": {"type": "float"},
+                                "max": {"type": "float"},
+                                "avg": {"type": "float"},
+                                "p95": {"type": "float"}
+                            }
+                        }
+                        for metric in METRICS
+                    }
+                }
+            }
+        }
+    }
+
+def grouped_stats(buckets, values):
+    # Per-bucket count/sum/min/max/p95 for one metric, buckets given as a non-decreasing array
+    order = np.lexsort((values, buckets))
+    buckets = buckets[order]
+    values = values[order]
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+
+    # Linear interpolation between order statistics, as np.percentile(..., 95)
+    position = starts + 0.95 * (counts - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, starts + counts - 1)
+    fraction = position - lower
+
+    return {
+        "bucket": buckets[starts],
+        "count": counts,
+        "sum": np.add.reduceat(values, starts),
+        "min": values[starts],
+        "max": values[starts + counts - 1],
+        "p95": values[lower] + (values[upper] - values[lower]) * fraction
+    }
+
+def merge_stats(a, b):
+    # count/sum/min/max stay exact; p95 becomes a count-weighted blend of the two parts
+    count = a[0] + b[0]
+    return [count, a[1] + b[1], min(a[2], b[2]), max(a[3], b[3]), (a[4] * a[0] + b[4] * b[0]) / count]
+
+def document_id(host, bucket_start):
+    return f"{host or '_'}|{bucket_start}"
+
+class RollupTier:
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        # (host, bucket_start) -> {metric: [count, sum, min, max, p95]} for buckets not yet written
+        self.rows = {}
+        # host -> (bucket_start, {metric: raw values}) for the bucket still receiving data
+        self.open = {}
+        # (host, bucket_start) -> stats already in the tier index from an earlier run, combined
+        # with rows on write; keys in needs_base have their existing document fetched first
+        self.base = {}
+        self.needs_base = set()
+        self.dirty = set()
+
+    def update(self, seconds, host, values):
+        buckets = (seconds // self.seconds) * self.seconds
+        open_bucket = self.open.pop(host, None)
+
+        if open_bucket is not None:
+            open_start, open_values = open_bucket
+
+            # Late data for buckets that were already closed is merged approximately
+            late = buckets < open_start
+            if late.any():
+                self._merge_late(host, buckets[late], {name: column[late] for name, column in values.items()})
+                buckets = buckets[~late]
+                values = {name: column[~late] for name, column in values.items()}
+            if len(buckets) == 0:
+                self.open[host] = open_bucket
+                return
+
+            # Fold the buffered raw values of the open bucket back in so its p95 stays exact
+            count = len(next(iter(open_values.values())))
+            buckets = np.r_[np.full(count, open_start), buckets]
+            values = {name: np.r_[open_values[name], values[name]] for name in values}
+
+        # Buckets must be non-decreasing for grouped_stats; raw blocks normally already are
+        if np.any(buckets[1:] < buckets[:-1]):
+            order = np.argsort(buckets, kind="stable")
+            buckets = buckets[order]
+            values = {name: column[order] for name, column in values.items()}
+
+        stats = {name: grouped_stats(buckets, column) for name, column in values.items()}
+        bucket_starts = next(iter(stats.values()))["bucket"]
+        for i, bucket_start in enumerate(bucket_starts.tolist()):
+            key = (host, bucket_start)
+            # Nothing is known about this host yet, so an earlier run may have written part
+            # of these buckets already
+            if open_bucket is None and key not in self.rows and key not in self.base:
+                self.needs_base.add(key)
+            self.rows[key] = {
+                name: [int(s["count"][i]), float(s["sum"][i]), float(s["min"][i]), float(s["max"][i]), float(s["p95"][i])]
+                for name, s in stats.items()
+            }
+            self.dirty.add(key)
+
+        # Keep the raw values of the newest bucket until a later bucket shows it is complete
+        last = int(bucket_starts[-1])
+        in_last = buckets == last
+        self.open[host] = (last, {name: column[in_last] for name, column in values.items()})
+
+    def _merge_late(self, host, buckets, values):
+        stats = {name: grouped_stats(*self._sorted(buckets, column)) for name, column in values.items()}
+        bucket_starts = next(iter(stats.values()))["bucket"]
+        for i, bucket_start in enumerate(bucket_starts.tolist()):
+            key = (host, bucket_start)
+            row = self.rows.get(key)
+            if row is None:
+                # Already written and evicted; the late values are combined with the stored document
+                row = self.rows[key] = {}
+                if key not in self.base:
+                    self.needs_base.add(key)
+            for name, s in stats.items():
+                new = [int(s["count"][i]), float(s["sum"][i]), float(s["min"][i]), float(s["max"][i]), float(s["p95"][i])]
+                row[name] = merge_stats(row[name], new) if name in row else new
+            self.dirty.add(key)
+
+    @staticmethod
+    def _sorted(buckets, column):
+        order = np.argsort(buckets, kind="stable")
+        return buckets[order], column[order]
+
+    def fetch_base(self, backend, index):
+        # Read the stored documents of needs_base keys by id, in realtime so buckets written
+        # moments ago are seen (missing documents leave no base)
+        ids = {document_id(*key): key for key in self.needs_base}
+        for doc_id, doc in backend.mget(index, list(ids)).items():
+            self.base[ids[doc_id]] = {
+                name: [doc["count"], stats["avg"] * doc["count"], stats["min"], stats["max"], stats["p95"]]
+                for name, stats in doc["metrics"].items()
+            }
+        self.needs_base = set()
+
+    def documents(self, keys):
+        for host, bucket_start in sorted(keys, key=lambda key: (key[0] or "", key[1])):
+            row = dict(self.rows[(host, bucket_start)])
+            for name, stats in self.base.get((host, bucket_start), {}).items():
+                row[name] = merge_stats(stats, row[name]) if name in row else stats
+            doc = {
+                "timestamp": str(np.datetime64(bucket_start, "s")),
+                "count": max(stats[0] for stats in row.values()),
+                "metrics": {
+                    name: {"min": low, "max": high, "avg": total / count, "p95": p95}
+                    for name, (count, total, low, high, p95) in row.items()
+                }
+            }
+            if host is not None:
+                doc["host"] = host
+            # Stable ids make every rewrite of a bucket an overwrite
+            yield document_id(host, bucket_start), doc
+
+    def evict(self):
+        # Written buckets only stay in memory while they are still open
+        open_keys = {(host, bucket_start) for host, (bucket_start, _) in self.open.items()}
+        self.rows = {key: row for key, row in self.rows.items() if key in open_keys}
+        self.base = {key: stats for key, stats in self.base.items() if key in open_keys}
+
+class SystemMetricsRollup:
+    def __init__(self, tiers=ROLLUP_TIERS, path=DEFAULT_ROLLUP_STATE_PATH):
+        self.path = path
+        self.tiers = [RollupTier(name, seconds) for name, seconds in tiers.items()]
+
+    @classmethod
+    def load(cls, path=DEFAULT_ROLLUP_STATE_PATH, tiers=ROLLUP_TIERS):
+        rollup = cls(tiers, path)
+        if not os.path.exists(path):
+            return rollup
+
+        with open(path) as f:
+            data = json.load(f)
+
+        for tier in rollup.tiers:
+            state = data["tiers"].get(tier.name, {"open": [], "base": []})
+            for host, bucket_start, values in state["open"]:
+                tier.open[host] = (bucket_start, {name: np.array(column, dtype=float) for name, column in values.items()})
+            for host, bucket_start, stats in state["base"]:
+                tier.base[(host, bucket_start)] = stats
+        return rollup
+
+    def save(self):
+        # Only the open buckets (and what an earlier run stored for them) are kept, so the
+        # state stays one bucket per host and tier; call after write() so nothing is dirty
+        data = {
+            "tiers": {
+                tier.name: {
+                    "open": [
+                        [host, bucket_start, {name: column.tolist() for name, column in values.items()}]
+                        for host, (bucket_start, values) in tier.open.items()
+                    ],
+                    "base": [[host, bucket_start, stats] for (host, bucket_start), stats in tier.base.items()]
+                }
+                for tier in self.tiers
+            }
+        }
+
+        # Write to a temporary file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def update_block(self, timestamps, host, values):
+        # Accepts the (timestamps, host, {metric: values}) blocks from iter_metric_blocks
+        seconds = timestamps.astype("datetime64[s]").astype(np.int64)
+        for tier in self.tiers:
+            tier.update(seconds, host, values)
+
+    def update_documents(self, docs):
+        # Raw system_metrics documents, e.g. read back from the index
+        by_host = {}
+        for doc in docs:
+            by_host.setdefault(doc.get("host"), []).append(doc)
+        for host, host_docs in by_host.items():
+            timestamps = np.array([doc["timestamp"] for doc in host_docs], dtype="datetime64[s]")
+            values = {
+                metric["name"]: np.array([doc["metrics"][metric["name"]] for doc in host_docs], dtype=float)
+                for metric in METRICS
+            }
+            self.update_block(timestamps, host, values)
+
+    def write(self, backend=None, **ingest_options):
+        # Upsert every bucket changed since the last write into its tier index
+        backend = backend or get_backend()
+        written = 0
+        for tier in self.tiers:
+            if not tier.dirty:
+                continue
+            index = rollup_index(tier.name)
+            backend.create_index(index, rollup_mappings())
+            if tier.needs_base:
+                tier.fetch_base(backend, index)
+            stats = ingest(({"_index": index, "_id": doc_id, "_source": doc}
+                            for doc_id, doc in tier.documents(tier.dirty)), backend, **ingest_options)
+            written += stats.success
+            # On failures everything stays dirty so the next write retries the whole tier
+            if not stats.failed:
+                tier.dirty = set()
+                tier.evict()
+        return written
+
+def choose_tier(start, end, resolution_seconds=None, max_points=None):
+    # None means raw data. With resolution_seconds, the coarsest tier whose bucket width
+    # still meets the requested resolution; with max_points, the finest data that keeps
+    # the point count (per host) within the budget
+    if resolution_seconds is not None:
+        for name, seconds in sorted(ROLLUP_TIERS.items(), key=lambda item: -item[1]):
+            if seconds <= resolution_seconds:
+                return name
+        return None
+    if not max_points:
+        return None
+
+    # Bucket starts within [start, end] number at most span / width + 1
+    wanted = (end - start).total_seconds() / max(max_points - 1, 1)
+    if RAW_RESOLUTION_SECONDS >= wanted:
+        return None
+    tiers = sorted(ROLLUP_TIERS.items(), key=lambda item: item[1])
+    for name, seconds in tiers:
+        if seconds >= wanted:
+            return name
+    # Even the coarsest tier exceeds the budget; it is still the closest
+    return tiers[-1][0]
+
+def query_system_metrics(start, end, resolution_seconds=None, max_points=None, host=None, backend=None):
+    backend = backend or get_backend()
+    tier = choose_tier(start, end, resolution_seconds, max_points)
+    index = search_target(backend, RAW_INDEX, start, end) if tier is None else rollup_index(tier)
+    if index is None:
+        return "raw", []
+    filters = [{"range": {"timestamp": {"gte": start.isoformat(), "lte": end.isoformat()}}}]
+    if host is not None:
+        filters.append({"term": {"host": host}})
+
+    # Paged with a point-in-time scan, so long raw windows are not cut off at
+    # index.max_result_window; scan order is arbitrary, hence the sort afterwards
+    points = []
+    snapshot = backend.open_scan(index)
+    try:
+        for hits in backend.scan(snapshot, {"bool": {"filter": filters}}):
+            points.extend(hit["_source"] for hit in hits)
+    finally:
+        backend.close_scan(snapshot)
+    points.sort(key=lambda point: (np.datetime64(point["timestamp"], "ms"), point.get("host") or ""))
+    return tier or "raw", points
+
+if __name__ == "__main__":
+    from datetime import datetime, timedelta
+
+    from system_metrics_generator import index_system_metrics
+
+    rollup = SystemMetricsRollup.load()
+    end = datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=90)
+    index_system_metrics(start, end, rollup=rollup)
+    rollup.save()
+
+    for resolution in (None, 3600, 86400):
+        tier, points = query_system_metrics(start, end, resolution_seconds=resolution)
+        print(f"resolution={resolution}: tier {tier}, {len(points)} points")
@@ -0,0 +1,36 @@
+import os
+import random
+import sys
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from historical_performance_data_generator import HISTORICAL_PERFORMANCE_MAPPINGS, generate_performance_data
+from ingestion import ingest
+from storage_backend import ColumnarBackend
+
+@pytest.fixture
+def backend():
+    return ColumnarBackend()
+
+@pytest.fixture
+def performance_docs():
+    # Two months of history; every document of a day shares the day's timestamp
+    random.seed(0)
+    np.random.seed(0)
+    return list(generate_performance_data(datetime(2024, 1, 1), datetime(2024, 2, 29)))
+
+def index_performance(backend, docs):
+    backend.create_index("historical_performance", HISTORICAL_PERFORMANCE_MAPPINGS)
+    ingest(({"_index": "historical_performance", "_source": doc} for doc in docs), backend)
+
+def split_in_day(docs):
+    # Cut halfway through, in the middle of one day, so the second part starts with
+    # documents at the same timestamp as the last ones of the first part
+    middle = len(docs) // 2
+    assert docs[middle - 1]["timestamp"] == docs[middle]["timestamp"]
+    return docs[:middle], docs[middle:]
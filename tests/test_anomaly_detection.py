@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from anomaly_detection import (batch_details, build_baseline_index, calculate_baselines, detect_anomalies_batch,
+                               detect_anomaly, jobs_to_block)
+from conftest import index_performance
+
+def scoring_jobs(performance_docs):
+    # Historical runs, the same runs pushed far out, and runs of keys that have no baseline
+    jobs = [dict(doc) for doc in performance_docs[::7]]
+    rng = random.Random(1)
+    for job in jobs[:50]:
+        jobs.append(dict(job, runtime_minutes=job["runtime_minutes"] * rng.uniform(2, 5),
+                         cpu_usage_percent=rng.uniform(0, 100)))
+    jobs.append(dict(jobs[0], job_type="Unknown"))
+    jobs.append(dict(jobs[1], system_config="Unknown"))
+    return jobs
+
+@pytest.mark.parametrize("threshold", [1, 2, 3])
+def test_batch_matches_single_job_scoring(backend, performance_docs, threshold):
+    index_performance(backend, performance_docs)
+    baselines = calculate_baselines(backend)
+    # Drop one key so its historical runs have no baseline, and give another zero spread
+    dropped = sorted(baselines)[0]
+    del baselines[dropped]
+    flat = sorted(baselines)[0]
+    baselines[flat] = dict(baselines[flat], cpu_usage=(baselines[flat]["cpu_usage"][0], 0.0))
+
+    jobs = scoring_jobs(performance_docs)
+    assert any((job["job_type"], job["system_config"]) == dropped for job in jobs)
+
+    result = detect_anomalies_batch(jobs_to_block(jobs), baselines, threshold, build_baseline_index(baselines))
+    expected = [detect_anomaly(job, baselines, threshold) for job in jobs]
+
+    assert result["is_anomaly"].any()
+    assert result["is_anomaly"].tolist() == [is_anomaly for is_anomaly, _ in expected]
+    assert batch_details(result) == [details for _, details in expected]
+    assert result["has_baseline"].tolist() == [(job["job_type"], job["system_config"]) in baselines for job in jobs]
+
+def test_batch_without_any_baselines(performance_docs):
+    jobs = scoring_jobs(performance_docs)
+    result = detect_anomalies_batch(jobs_to_block(jobs), {})
+    assert batch_details(result) == [detect_anomaly(job, {})[1] for job in jobs]
+    assert not result["is_anomaly"].any()
@@ -0,0 +1,38 @@
+import pytest
+
+from anomaly_detection import calculate_baselines
+from baseline_store import BaselineStore
+from conftest import index_performance, split_in_day
+
+def assert_same_baselines(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, metrics in expected.items():
+        for metric, (mean, std) in metrics.items():
+            assert actual[key][metric][0] == pytest.approx(mean, rel=1e-9)
+            assert actual[key][metric][1] == pytest.approx(std, rel=1e-9, abs=1e-9)
+
+def test_incremental_refresh_matches_full_calculation(backend, performance_docs, tmp_path):
+    first, second = split_in_day(performance_docs)
+    store = BaselineStore(path=str(tmp_path / "baselines.json"))
+
+    index_performance(backend, first)
+    assert store.refresh(backend) == len(first)
+    index_performance(backend, second)
+    assert store.refresh(backend) == len(second)
+    assert store.refresh(backend) == 0
+
+    assert_same_baselines(store.baselines(), calculate_baselines(backend))
+
+def test_boundary_survives_save_and_load(backend, performance_docs, tmp_path):
+    first, second = split_in_day(performance_docs)
+    path = str(tmp_path / "baselines.json")
+
+    index_performance(backend, first)
+    store = BaselineStore(path=path)
+    store.refresh(backend)
+    store.save()
+
+    index_performance(backend, second)
+    store = BaselineStore.load(path)
+    assert store.refresh(backend) == len(second)
+    assert_same_baselines(store.baselines(), calculate_baselines(backend))
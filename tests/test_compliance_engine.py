@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import numpy as np
+
+import compliance_policies_generator
+from compliance_engine import PolicyEngine, records_to_block
+from compliance_policies_generator import COMPLIANCE_POLICIES, generate_job_run
+from sharded_generation import seed_generators
+
+# The checks the declarative rules replaced, as they were written against single jobs
+ORIGINAL_CHECKS = {
+    "POL003": lambda job: job["duration_minutes"] <= 60,
+    "POL004": lambda job: "audit_log" in job,
+    "POL005": lambda job: job["job_type"] == "Backup"
+}
+
+def generated_jobs(count=2000):
+    seed_generators(5, compliance_policies_generator)
+    jobs = [generate_job_run(datetime(2024, 6, 30)) for _ in range(count)]
+    # Some runs without an audit log entry at all
+    for job in jobs[::10]:
+        del job["audit_log"]
+    return jobs
+
+def test_engine_matches_original_checks():
+    engine = PolicyEngine(COMPLIANCE_POLICIES)
+    jobs = generated_jobs()
+    matrix = engine.evaluate_records(jobs, np.random.default_rng(0))
+
+    for i, policy_id in enumerate(engine.policy_ids):
+        if policy_id in ORIGINAL_CHECKS:
+            assert matrix[i].tolist() == [ORIGINAL_CHECKS[policy_id](job) for job in jobs]
+        else:
+            # Simulated checks: compliant about half of the time
+            assert 0.45 < matrix[i].mean() < 0.55
+
+    for job, column in zip(jobs, matrix.T):
+        for result, policy in zip(engine.expand(column), COMPLIANCE_POLICIES):
+            state = "Compliant" if result["is_compliant"] else "Non-compliant"
+            assert result["details"] == f"{state} with {policy['name']}"
+
+def test_bitmap_round_trips():
+    # Eleven policies, so the bitmap spans two bytes per job
+    policies = [{"id": f"P{i}", "name": f"Policy {i}", "rule": {"random": 0.3}} for i in range(11)]
+    engine = PolicyEngine(policies)
+    matrix = engine.evaluate({"size": 500}, np.random.default_rng(1))
+    bitmap = engine.bitmap(matrix)
+
+    assert bitmap.shape == (500, 2)
+    np.testing.assert_array_equal(engine.unpack(bitmap), matrix)
+    for row in range(500):
+        assert engine.expand(bitmap[row]) == engine.expand(matrix[:, row])
+
+def rule_engine(*rules):
+    return PolicyEngine([{"id": f"R{i}", "name": f"Rule {i}", "rule": rule} for i, rule in enumerate(rules)])
+
+def test_empty_all_and_any():
+    engine = rule_engine({"all": []}, {"any": []}, {"not": {"all": []}}, {"not": {"any": []}})
+    matrix = engine.evaluate({"size": 4})
+    assert matrix.tolist() == [[True] * 4, [False] * 4, [False] * 4, [True] * 4]
+
+def test_missing_values_match_neither_in_nor_not_in():
+    engine = rule_engine(
+        {"field": "job_type", "op": "in", "value": ["ETL", "Backup"]},
+        {"field": "job_type", "op": "not_in", "value": ["ETL", "Backup"]},
+        {"field": "duration_minutes", "op": "in", "value": [30, 60]},
+        {"field": "duration_minutes", "op": "not_in", "value": [30, 60]}
+    )
+    records = [
+        {"job_type": "ETL", "duration_minutes": 30},
+        {"job_type": "Reporting", "duration_minutes": 45},
+        {"job_type": None, "duration_minutes": None},
+        {}
+    ]
+    matrix = engine.evaluate(records_to_block(records, engine.fields))
+    assert matrix.T.tolist() == [
+        [True, False, True, False],
+        [False, True, False, True],
+        [False, False, False, False],
+        [False, False, False, False]
+    ]
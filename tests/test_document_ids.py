@@ -0,0 +1,27 @@
+from document_ids import HashCache
+from historical_performance_data_generator import index_performance_data
+from job_run_data_generator import index_job_runs
+
+def test_reingesting_seeded_job_runs_writes_nothing(backend, tmp_path):
+    cache = HashCache(path=str(tmp_path / "hashes.json"))
+    index_job_runs(count=300, master_seed=7, backend=backend, id_mode="ordinal", hash_cache=cache)
+    assert cache.skipped == 0
+    assert backend.search("job_runs", {"size": 0})["hits"]["total"]["value"] == 300
+
+    written = []
+    index_job_runs(count=300, master_seed=7, backend=backend, id_mode="ordinal", hash_cache=cache,
+                   on_chunk=lambda chunk_stats: written.append(chunk_stats["docs"]))
+    assert cache.skipped == 300
+    assert sum(written) == 0
+    assert backend.search("job_runs", {"size": 0})["hits"]["total"]["value"] == 300
+
+def test_reingesting_seeded_performance_data_writes_nothing(backend, tmp_path):
+    cache = HashCache(path=str(tmp_path / "hashes.json"))
+    index_performance_data(master_seed=3, backend=backend, id_mode="ordinal", hash_cache=cache)
+    indexed = backend.search("historical_performance", {"size": 0})["hits"]["total"]["value"]
+
+    written = []
+    index_performance_data(master_seed=3, backend=backend, id_mode="ordinal", hash_cache=cache,
+                           on_chunk=lambda chunk_stats: written.append(chunk_stats["docs"]))
+    assert cache.skipped == indexed
+    assert sum(written) == 0
@@ -0,0 +1,16 @@
+import json
+
+from ingestion import ACTION_OVERHEAD_BYTES, iter_chunks
+
+def test_chunks_keep_order_and_limits():
+    actions = [{"_index": "test", "_source": {"id": i, "name": "x" * (i % 50)}} for i in range(2000)]
+    chunks = list(iter_chunks(iter(actions), chunk_size=300, max_chunk_bytes=8000))
+
+    assert [action for chunk, _ in chunks for action in chunk] == actions
+    for chunk, _ in chunks:
+        assert len(chunk) <= 300
+
+    # Sizes are estimated from a sample, so the total is close to, not exactly, the payload
+    actual = sum(len(json.dumps(action["_source"])) + ACTION_OVERHEAD_BYTES for action in actions)
+    estimated = sum(chunk_bytes for _, chunk_bytes in chunks)
+    assert abs(estimated - actual) < 0.1 * actual
@@ -0,0 +1,22 @@
+import numpy as np
+
+from conftest import index_performance, split_in_day
+from multivariate_anomaly_detection import CovarianceStore
+
+def test_incremental_refresh_matches_single_refresh(backend, performance_docs, tmp_path):
+    first, second = split_in_day(performance_docs)
+    store = CovarianceStore(path=str(tmp_path / "covariance.json"))
+
+    index_performance(backend, first)
+    assert store.refresh(backend) == len(first)
+    index_performance(backend, second)
+    assert store.refresh(backend) == len(second)
+    assert store.refresh(backend) == 0
+
+    full = CovarianceStore(path=str(tmp_path / "full.json"))
+    assert full.refresh(backend) == len(performance_docs)
+    assert store.moments.keys() == full.moments.keys()
+    for key, (count, mean, comoment) in full.moments.items():
+        assert store.moments[key][0] == count
+        np.testing.assert_allclose(store.moments[key][1], mean, rtol=1e-9)
+        np.testing.assert_allclose(store.moments[key][2], comoment, rtol=1e-7, atol=1e-6)
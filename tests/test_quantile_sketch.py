@@ -0,0 +1,28 @@
+import numpy as np
+
+from conftest import index_performance, split_in_day
+from quantile_sketch import SketchStore
+
+def test_incremental_refresh_counts_every_document(backend, performance_docs, tmp_path):
+    first, second = split_in_day(performance_docs)
+    path = str(tmp_path / "sketches.npz")
+
+    index_performance(backend, first)
+    store = SketchStore(path=path)
+    assert store.refresh(backend, workers=2) == len(first)
+    store.save()
+
+    index_performance(backend, second)
+    store = SketchStore.load(path)
+    assert store.refresh(backend, workers=2) == len(second)
+    assert store.refresh(backend, workers=2) == 0
+
+    for field in store.fields:
+        values = {}
+        for doc in performance_docs:
+            values.setdefault((doc["job_type"], doc["system_config"], field), []).append(doc[field])
+        for key, group in values.items():
+            digest = store.digests[key]
+            assert digest.count() == len(group)
+            assert (digest.min, digest.max) == (min(group), max(group))
+            assert np.isclose(np.dot(digest.means, digest.weights), sum(group))
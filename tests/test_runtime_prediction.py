@@ -0,0 +1,17 @@
+from conftest import index_performance, split_in_day
+from runtime_prediction import RuntimePredictor
+
+def test_incremental_refresh_matches_single_refresh(backend, performance_docs, tmp_path):
+    first, second = split_in_day(performance_docs)
+    predictor = RuntimePredictor(path=str(tmp_path / "predictor.json"))
+
+    index_performance(backend, first)
+    assert predictor.refresh(backend) == len(first)
+    index_performance(backend, second)
+    assert predictor.refresh(backend) == len(second)
+    assert predictor.refresh(backend) == 0
+
+    full = RuntimePredictor(path=str(tmp_path / "full.json"))
+    assert full.refresh(backend) == len(performance_docs)
+    assert predictor.counts == full.counts
+    assert predictor.table == full.table
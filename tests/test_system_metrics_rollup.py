@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from system_metrics_generator import index_system_metrics
+from system_metrics_rollup import SystemMetricsRollup, choose_tier, query_system_metrics
+
+END = datetime(2024, 3, 31)
+
+def test_choose_tier_for_max_points():
+    start = END - timedelta(days=90)
+    assert choose_tier(start, END, max_points=1000) == "1d"
+    assert choose_tier(start, END, max_points=5000) == "1h"
+    assert choose_tier(start, END, max_points=30000) is None
+    # Nothing fits 10 points over 90 days; the coarsest tier comes closest
+    assert choose_tier(start, END, max_points=10) == "1d"
+
+def test_choose_tier_for_resolution():
+    start = END - timedelta(days=90)
+    assert choose_tier(start, END, resolution_seconds=7200) == "1h"
+    assert choose_tier(start, END, resolution_seconds=86400) == "1d"
+    assert choose_tier(start, END, resolution_seconds=300) is None
+
+@pytest.mark.parametrize("days, max_points", [(90, 1000), (90, 3000), (7, 200), (2, 1000)])
+def test_query_stays_within_max_points(backend, tmp_path, days, max_points):
+    np.random.seed(0)
+    start = END - timedelta(days=days)
+    rollup = SystemMetricsRollup(path=str(tmp_path / "rollup.json"))
+    index_system_metrics(start, END, rollup=rollup, backend=backend)
+
+    tier, points = query_system_metrics(start, END, max_points=max_points, backend=backend)
+    assert tier == (choose_tier(start, END, max_points=max_points) or "raw")
+    assert 0 < len(points) <= max_points
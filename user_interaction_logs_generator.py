@@ -1,16 +1,13 @@
 import random
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
 import faker
 import uuid
+from ingestion import ingest
+from storage_backend import get_backend
 
 # Initialize Faker for generating realistic data
 fake = faker.Faker()
 
-# Initialize Elasticsearch client
-es = Elasticsearch(["http://localhost:9200"])
-
 # Define application pages and features
 PAGES = [
     "Dashboard", "Job List", "Job Details", "System Metrics", 
@@ -67,34 +64,35 @@ def generate_session():
 def generate_sessions(count=1000):
     return [generate_session() for _ in range(count)]
 
-def index_user_interactions(sessions):
-    # Create index with appropriate mappings
-    index_mappings = {
-        "mappings": {
-            "properties": {
-                "session_id": {"type": "keyword"},
-                "user_id": {"type": "keyword"},
-                "start_time": {"type": "date"},
-                "duration_minutes": {"type": "integer"},
-                "interactions": {
-                    "type": "nested",
-                    "properties": {
-                        "timestamp": {"type": "date"},
-                        "action": {"type": "keyword"},
-                        "page": {"type": "keyword"},
-                        "feature": {"type": "keyword"},
-                        "duration_seconds": {"type": "integer"}
-                    }
+USER_INTERACTIONS_MAPPINGS = {
+    "mappings": {
+        "properties": {
+            "session_id": {"type": "keyword"},
+            "user_id": {"type": "keyword"},
+            "start_time": {"type": "date"},
+            "duration_minutes": {"type": "integer"},
+            "interactions": {
+                "type": "nested",
+                "properties": {
+                    "timestamp": {"type": "date"},
+                    "action": {"type": "keyword"},
+                    "page": {"type": "keyword"},
+                    "feature": {"type": "keyword"},
+                    "duration_seconds": {"type": "integer"}
                 }
             }
         }
     }
+}
+
+def index_user_interactions(sessions, backend=None, **ingest_options):
+    backend = backend or get_backend()
     
-    es.indices.create(index="user_interactions", body=index_mappings, ignore=400)
+    backend.create_index("user_interactions", USER_INTERACTIONS_MAPPINGS)
     
     # Bulk index the sessions
-    success, failed = bulk(es, ({"_index": "user_interactions", "_source": session} for session in sessions))
-    print(f"Indexed {success} user interaction sessions. Failed: {failed}")
+    stats = ingest(({"_index": "user_interactions", "_source": session} for session in sessions), backend, **ingest_options)
+    print(f"Indexed {stats.success} user interaction sessions. Failed: {stats.failed}")
 
 def generate_user_behavior_summary(sessions):
     summaries = []
@@ -123,7 +121,9 @@ def generate_user_behavior_summary(sessions):
     
     return summaries
 
-def index_user_behavior_summaries(summaries):
+def index_user_behavior_summaries(summaries, backend=None, **ingest_options):
+    backend = backend or get_backend()
+    
     # Create index with appropriate mappings
     index_mappings = {
         "mappings": {
@@ -140,11 +140,11 @@ def index_user_behavior_summaries(summaries):
         }
     }
     
-    es.indices.create(index="user_behavior_summaries", body=index_mappings, ignore=400)
+    backend.create_index("user_behavior_summaries", index_mappings)
     
     # Bulk index the summaries
-    success, failed = bulk(es, ({"_index": "user_behavior_summaries", "_source": summary} for summary in summaries))
-    print(f"Indexed {success} user behavior summaries. Failed: {failed}")
+    stats = ingest(({"_index": "user_behavior_summaries", "_source": summary} for summary in summaries), backend, **ingest_options)
+    print(f"Indexed {stats.success} user behavior summaries. Failed: {stats.failed}")
 
 if __name__ == "__main__":
     sessions = generate_sessions(1000)